@@ -1,5 +1,7 @@
 # region ----- Import packages -----
 import keithley_smu236
+from instrument_group import InstrumentGroup
+from ramp import Ramp, RampScheduler
 import pyvisa
 from Objects.measurement import *
 import os
@@ -96,6 +98,13 @@ try:
     print("Found smu for Vds biasing: {}".format(smu_vds.read_model()))
 except pyvisa.VisaIOError as e:
     exit("Cannot find smu Vds biasing... Execution terminated.")
+# read gate and drain-source smu concurrently
+smu_group = InstrumentGroup([smu_vgs.read, smu_vds.read])
+# ramp gate and drain-source smu concurrently, at the rate of the settings
+ramps = RampScheduler({"vgs": Ramp(smu_vgs.set_bias_level, rate=settings.smu_vgs.ramp_step / settings.smu_vgs.ramp_delay, step=settings.smu_vgs.ramp_step),
+                       "vds": Ramp(smu_vds.set_bias_level, rate=settings.smu_vds.ramp_step / settings.smu_vds.ramp_delay, step=settings.smu_vds.ramp_step)})
+# Vds returns to 0 V after sweep 1 and 2 one ramp step every smu_vds.delay, as fast as during the sweep
+vds_return_rate = settings.smu_vds.ramp_step / settings.smu_vds.delay
 # endregion
 
 # region ----- Configure instrumentation -----
@@ -210,11 +219,10 @@ if sweep == 0:
             # endregion
 
             # region ----- Get data -----
-            fet.data[j, i, 0], fet.data[j, i, 1] = smu_vgs.read()  # return source, measure
-            fet.data[j, i, 2], fet.data[j, i, 3] = smu_vds.read()  # return source, measure
+            t, (fet.data[j, i, 0], fet.data[j, i, 1]), (fet.data[j, i, 2], fet.data[j, i, 3]) = smu_group.read()  # return timestamp, (source, measure) of each smu
             fet.data[j, i, 4] = floor(j / (len(fet.vgs) / vgs[5]))  # store number of iteration, starting from 0
             fet.data[j, i, 5] = floor(i / (len(fet.vds) / vds[5]))  # store number of iteration, starting from 0
-            fet.data[j, i, 6] = datetime.datetime.now().timestamp() - t0  # store datetime
+            fet.data[j, i, 6] = t - t0  # store datetime
             # endregion
 
             # region ----- Update figure -----
@@ -259,16 +267,9 @@ if sweep == 0:
                 comments="# "+fet.comment+"\n", footer='', encoding=None)
         print("Done.")  # endregion
 
-    # region ----- Set Vds to 0 V -----
-    print("Sweeping Vds from {} V to 0 V... ".format(fet.vds[-1]), end="")
-    for x in linspace(fet.vds[-1], 0, int(ceil(abs(fet.vds[-1]) / settings.smu_vds.ramp_step) + 1)):
-        smu_vds.set_bias_level(bias=x, delay=settings.smu_vds.ramp_delay)
-    print("Done.")  # endregion
-
-    # region ----- Set Vgs to 0 V -----
-    print("Sweeping Vgs from {} V to 0 V... ".format(fet.vgs[-1]), end="")
-    for x in linspace(fet.vgs[-1], 0, int(ceil(abs(fet.vgs[-1]) / settings.smu_vgs.ramp_step) + 1)):
-        smu_vgs.set_bias_level(bias=x, delay=settings.smu_vgs.ramp_delay)
+    # region ----- Set Vds and Vgs to 0 V -----
+    print("Sweeping Vds from {} V and Vgs from {} V to 0 V... ".format(fet.vds[-1], fet.vgs[-1]), end="")
+    ramps.zero(starts={"vds": fet.vds[-1], "vgs": fet.vgs[-1]})
     print("Done.")  # endregion
 
 if sweep == 1:
@@ -326,12 +327,10 @@ if sweep == 1:
             # endregion
 
             # region ----- Get data -----
-            if sweep == 1:
-                fet.data[i, j, 0], fet.data[i, j, 1] = smu_vgs.read()  # return source, measure
-            fet.data[i, j, 2], fet.data[i, j, 3] = smu_vds.read()  # return source, measure
+            t, (fet.data[i, j, 0], fet.data[i, j, 1]), (fet.data[i, j, 2], fet.data[i, j, 3]) = smu_group.read()  # return timestamp, (source, measure) of each smu
             fet.data[i, j, 4] = floor(i / (len(fet.vgs) / vgs[5]))  # store number of vgs iteration, starting from 0
             fet.data[i, j, 5] = floor(j / (len(fet.vds) / vds[5]))  # store number of vds iteration, starting from 0
-            fet.data[i, j, 6] = datetime.datetime.now().timestamp() - t0  # store datetime
+            fet.data[i, j, 6] = t - t0  # store datetime
             # endregion
 
             # region ----- Update figure -----
@@ -378,16 +377,9 @@ if sweep == 1:
                 header="vgs,igs,vds,ids,vgs cycle,vds cycle, time", comments="# "+fet.comment+"\n", footer='', encoding=None)
         print("Done.")  # endregion
 
-    # region ----- Set Vds to 0 V -----
-    print(f"Sweeping Vds from {fet.vds[-1]:.3f} V to 0 V... ", end="")
-    for x in linspace(fet.vds[-1], 0, int(ceil(abs(fet.vds[-1]) / settings.smu_vds.ramp_step) + 1)):
-        smu_vds.set_bias_level(bias=x, delay=settings.smu_vds.delay)
-    print("Done.")  # endregion
-
-    # region ----- Set Vgs to 0 V -----
-    print(f"Sweeping Vgs from {fet.vgs[-1]:.3f} V to 0 V... ", end="")
-    for x in linspace(fet.vgs[-1], 0, int(ceil(abs(fet.vgs[-1]) / settings.smu_vgs.ramp_step) + 1)):
-        smu_vgs.set_bias_level(bias=x, delay=settings.smu_vgs.ramp_delay)
+    # region ----- Set Vds and Vgs to 0 V -----
+    print(f"Sweeping Vds from {fet.vds[-1]:.3f} V and Vgs from {fet.vgs[-1]:.3f} V to 0 V... ", end="")
+    ramps.zero(starts={"vds": fet.vds[-1], "vgs": fet.vgs[-1]}, rates={"vds": vds_return_rate})
     print("Done.")  # endregion
 
 if sweep == 2:
@@ -455,8 +447,7 @@ if sweep == 2:
 
     # region ----- Set Vds to 0 V -----
     print(f"Sweeping Vds from {fet.vds[-1]:.3f} V to 0 V... ", end="")
-    for x in linspace(fet.vds[-1], 0, int(ceil(abs(fet.vds[-1]) / settings.smu_vds.ramp_step) + 1)):
-        smu_vds.set_bias_level(bias=x, delay=settings.smu_vds.delay)
+    ramps.run({"vds": 0.0}, starts={"vds": fet.vds[-1]}, rates={"vds": vds_return_rate})
     print("Done.")  # endregion
 
 # region ----- Turn SMU(s) off -----
@@ -464,6 +455,8 @@ print("Switching off SMU(s)... ", end="")
 if sweep == 0 or sweep == 1:
     smu_vgs.switch_off()
 smu_vds.switch_off()
+smu_group.close()
+ramps.close()
 print("Done")
 # endregion
 
@@ -1,6 +1,10 @@
-from numpy import zeros, array, ndarray, ceil
+import hashlib
+import numpy as np
+import threading
 import time
 import ADwin
+import completion
+from ring_buffer import RingBuffer
 
 
 class ADwinGoldII:
@@ -21,6 +25,9 @@ class ADwinGoldII:
             vt_measurement_time: float = 1.0,
             sweep_step: float = 0.01,
             process: list[str] = None,
+            ao_calibration: dict = None,
+            ai_calibration: dict = None,
+            lazy_load: bool = True,
     ):
         self.adw = ADwin.ADwin(0x1, 1)
         self.adwin_boot_dir = adwin_boot_dir  # Directory including ADwin Boot Files
@@ -36,8 +43,29 @@ class ADwinGoldII:
         self.vt_settling_time = vt_settling_time  # [float] measurement time (in s). The number of samples is: vt_time / (n_plc / line_freq)
         self.vt_measurement_time = vt_measurement_time  # [float] measurement time (in s). The number of samples is: vt_time / (n_plc / line_freq)
         self.sweep_step = sweep_step  # [float] voltage sweep step (in V)
-        self.delay = 1
-        self.process = process
+        self.process = process if process is not None else []
+        self.lazy_load = lazy_load  # [bool] load the routines of 'process' on first start instead of at configuration
+        self.routines = {}  # [dict] {process number: routine file} of the routines of 'process' (configured, not changed by loads)
+        self.loaded = {}  # [dict] {process number: (path, sha256)} of the routine loaded in each process slot
+        self.process_delays = {}  # [dict] {process number: process delay (in clock cycles)}, applied again after loading
+        self.ao_calibration = ao_calibration if ao_calibration is not None else {}  # [dict] {channel: (gain, offset)}: the output voltage is gain * v + offset
+        self.ai_calibration = ai_calibration if ai_calibration is not None else {}  # [dict] {channel: (gain, offset)}: the input reads gain * v + offset
+        self.interleaved_routine = "read_ai_interleaved.TB8"  # [str] routine file of the interleaved recording (process 8)
+        self.stream_routine = "stream_ai_fifo.TB9"  # [str] routine file of the FIFO streaming process (process 9)
+        self.sweep_routine = "sweep_ao_read_ai.TBA"  # [str] routine file of the generic sweep and record process (process 10)
+        self.sweep_size = 200000  # [int] length of the AO waveform arrays of sweep_ao_read_ai (DATA_32, DATA_33)
+        self.record_size = 800000  # [int] length of the interleaved AI array of sweep_ao_read_ai and read_ai_interleaved (DATA_20)
+        self.raster_routine = "raster_ao_read_ai.TB8"  # [str] routine file of the 2-D raster process (process 8, shared with read_ai_interleaved)
+        self.raster_size = 10000  # [int] maximum number of points of each raster axis (DATA_34, DATA_35)
+        self.record_channels = []  # [list] analog inputs recorded by the last sweep / record
+        self.record_points = 0  # [int] number of points of the last sweep / record
+        self.stream_buffer = None  # Ring buffer of the streamed scans (see "start_stream")
+        self.stream_channels = []
+        self.stream_process = None
+        self.stream_thread = None
+        self.stream_error = None
+        self.stream_dropped = 0  # [int] number of scans dropped by the ADwin because the FIFO was full
+        self.streaming = threading.Event()
 
         # Boot ADwin Gold II
         self.adw.Boot(self.adwin_boot_dir)
@@ -50,10 +78,13 @@ class ADwinGoldII:
         self.configure()
 
     def configure(self):
-        """ Configure ADwin. """
-        for i in range(0, len(self.process)):
-            self.load_process(self.process[i])
-            self.set_process_delay(i + 1)
+        """ Configure ADwin. The routines of 'process' are loaded now, or on their first start if 'lazy_load' is True. """
+        for routine in self.process:
+            process_number = self.process_slot(routine)
+            self.routines[process_number] = routine
+            if not self.lazy_load:
+                self.load_process(routine)
+            self.set_process_delay(process_number)
         self.set_number_of_readings_per_sample()
         self.set_output_settling_time()
         self.set_number_of_samples_to_read()
@@ -62,21 +93,23 @@ class ADwinGoldII:
 
     def set_process_delay(self, process_n):
         """ Set 'process_number' delay in seconds. """
-        self.adw.Set_Processdelay(process_n, int(ceil(self.clock_freq / self.scan_rate)))
+        self.process_delays[process_n] = int(np.ceil(self.clock_freq / self.scan_rate))
+        if process_n in self.loaded:
+            self.adw.Set_Processdelay(process_n, self.process_delays[process_n])
 
     def set_number_of_readings_per_sample(self):
         """ N. samples to average in hardware = n_plc / line freq * scan_rate """
-        n_samples = int(ceil(self.n_plc / self.line_freq * self.scan_rate))
+        n_samples = int(np.ceil(self.n_plc / self.line_freq * self.scan_rate))
         self.adw.Set_Par(33, n_samples)
 
     def set_output_settling_time(self):
         """ Settling time: no. of loops to wait after setting the output. """
-        n_loops = int(ceil(self.iv_settling_time * self.scan_rate))
+        n_loops = int(np.ceil(self.iv_settling_time * self.scan_rate))
         self.adw.Set_Par(34, n_loops)
 
     def set_number_of_samples_to_read(self):
         """ N. samples = measurement_time / n_plc * line_freq"""
-        n_samples = int(ceil(self.vt_settling_time + self.vt_measurement_time) / (self.n_plc / self.line_freq))
+        n_samples = int(np.ceil(self.vt_settling_time + self.vt_measurement_time) / (self.n_plc / self.line_freq))
         self.adw.Set_Par(71, n_samples)
 
     def set_ao_to_zero(self, ao: int = 1):
@@ -89,9 +122,12 @@ class ADwinGoldII:
             self.adw.Set_Par(52, self.voltage2bin(0, bits=self.output_resolution))
 
     def start_process(self, process_number):
-        """ Start 'process_number'. The process number starts from 1. """
+        """ Start 'process_number'. The process number starts from 1. If a routine of 'process' is configured for this
+        slot, it is loaded first unless it is the one in the slot (e.g. after a library routine took the slot over). """
         if not isinstance(process_number, int):
             raise ADwin.ADwinError("Process number must be type integer.")
+        if process_number in self.routines:
+            self.load_process(self.routines[process_number])
         self.adw.Start_Process(process_number)
 
     def process_status(self, process_number):
@@ -102,76 +138,312 @@ class ADwinGoldII:
         elif status == 1:
             return True
 
+    def process_slot(self, process):
+        """ Return the process number of the routine file 'process' from its extension (.TB1 ... .TB9, .TBA for 10). """
+        extension = process.rsplit(".", 1)[-1].upper()
+        if not extension.startswith("TB") or len(extension) != 3:
+            raise ADwin.ADwinError(f"{process} is not a compiled ADbasic routine (.TB1 ... .TBA).")
+        return int(extension[2], 16)
+
     def load_process(self, process):
-        """ Load process into ADwin. """
-        self.adw.Load_Process(f"{self.adwin_routines_dir}/{process}")
+        """ Load process into ADwin, unless the same file (same path and content) is already loaded in its process slot.
+        Return True if the process was loaded. """
+        path = f"{self.adwin_routines_dir}/{process}"
+        with open(path, "rb") as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        process_number = self.process_slot(process)
+        if self.loaded.get(process_number) == (path, digest):
+            return False
+        self.adw.Load_Process(path)
+        self.loaded[process_number] = (path, digest)
+        if process_number in self.process_delays:
+            # loading restores the initial process delay of the routine
+            self.adw.Set_Processdelay(process_number, self.process_delays[process_number])
+        return True
+
+    def run_routine(self, routine):
+        """ Load the library routine file 'routine' (unless already loaded) and start it in the process slot of its
+        extension, whatever routine is registered for that slot. Return the process number. """
+        process_number = self.process_slot(routine)
+        self.load_process(routine)
+        self.adw.Start_Process(process_number)
+        return process_number
 
     def get_par(self, number):
         if isinstance(number, int):
-            val = self.adw.Get_Par(number)
-            time.sleep(self.delay)
-            return val
+            return self.adw.Get_Par(number)
+
+    def wait_for_process(self, process_number, timeout=None, idle=None):
+        """ Wait until 'process_number' has stopped. Raise TimeoutError after 'timeout' (in s). 'idle' is called while
+        waiting, e.g. lambda: plt.pause(1e-3). """
+        completion.wait_for_process(self.adw, process_number, timeout, idle=idle)
 
     def get_data(self, data_number, start_index, count):
         """ Get data from ADwin. """
-        return self.adw.GetData_Float(data_number, start_index, count)
-
-    def voltage2bin(self, v, v_ref=-10, v_range=9.99969-(-10), bits=16):
-        """Convert a scalar or array of voltages into bins"""
-        if isinstance(v, ndarray):
-            bins = zeros(len(v), dtype=int)
-            for idx in range(len(v)):
-                bins[idx] = self.voltage2bin(v[idx], v_ref, v_range, bits)
-            return array(bins, dtype=int)
-        else:
-            return int((v - v_ref) / v_range * 2**bits)
-
-    def bin2voltage(self, bin, v_ref=-10, v_range=9.99969-(-10), bits=16):
-        """Convert a scalar or array of bins into voltage values"""
-        if isinstance(bin, ndarray):
-            v = zeros(len(bin), dtype=float)
-            for idx in range(len(bin)):
-                v[idx] = self.bin2voltage(bin[idx], v_ref, v_range, bits)
-            return v
-        else:
-            return v_ref + bin * v_range / 2**bits
+        return self.get_data_float(data_number, start_index, count)
 
-    def make_iv(self, v, points2average):
-        """Make iv: sweep AO1 and read AI1. """
-        # Validate input
-        if not isinstance(v, list):
-            raise ValueError("v must be a list of voltage values, in Volt.")
+    def get_data_float(self, data_number, start_index, count):
+        """ Return 'count' values of FLOAT array Data_'data_number', from 'start_index' (starting from 1), as a numpy
+        array sharing the memory of the ctypes array returned by ADwin (no intermediate list). """
+        return np.ctypeslib.as_array(self.adw.GetData_Float(data_number, start_index, count))
 
-        self.adw.Load_Process(f"{self.adwin_routines_dir}/sweep_ao1_read_ai1.TB1")
-        time.sleep(self.delay)
+    def get_data_long(self, data_number, start_index, count):
+        """ Return 'count' values of LONG array Data_'data_number', from 'start_index' (starting from 1), as a numpy
+        array sharing the memory of the ctypes array returned by ADwin (no intermediate list). """
+        return np.ctypeslib.as_array(self.adw.GetData_Long(data_number, start_index, count))
 
-        bin = self.voltage2bin(v)
+    def set_data_long(self, data_number, values, start_index=1):
+        """ Write the integer array 'values' to LONG array Data_'data_number', from 'start_index' (starting from 1). The
+        values are passed as a contiguous int32 ctypes array, without intermediate list. """
+        values = np.ascontiguousarray(values, dtype=np.int32)
+        self.adw.SetData_Long(np.ctypeslib.as_ctypes(values), data_number, start_index, len(values))
 
-        self.adw.SetData_Long(list(bin), 1, 1, len(bin))  # len(bin) if isinstance(bin, ndarray) else 1)
-        self.set_process_delay(1)
-        self.set_number_of_readings_per_sample()
-        self.set_output_settling_time()
-        self.adw.Set_Par(23, len(v))                # length of the voltage array
+    def channel_mask(self, channels):
+        """ Return the bit mask of the analog inputs 'channels' (bit n-1 set for input n), as expected in PAR_1. """
+        return sum(1 << (x - 1) for x in set(channels))
+
+    def read_channels(self, channels, start_index, count, out=None):
+        """ Read 'count' samples from 'start_index' of the AI data arrays of 'channels' (Data_n holds input n) into a
+        (channels, samples) array. Pass the array returned by the previous poll as 'out' to reuse it. Each channel
+        costs one transfer: use 'read_interleaved' when the process stores the inputs interleaved. """
+        if out is None:
+            out = np.empty((len(channels), count))
+        for row, channel in enumerate(channels):
+            out[row] = self.get_data_float(channel, start_index, count)
+        return out
+
+    def read_interleaved(self, channels, start_index, count, data_number=20, out=None):
+        """ Read 'count' scans from 'start_index' of the active inputs 'channels' from the interleaved array
+        Data_'data_number' (see read_ai_interleaved.bas), with one transfer whatever the number of channels, into a
+        (channels, samples) array with the channels in ascending order. Pass the array returned by the previous poll as
+        'out' to reuse it. """
+        n_channels = len(set(channels))
+        data = self.get_data_float(data_number, (start_index - 1) * n_channels + 1, count * n_channels)
+        if out is None:
+            out = np.empty((n_channels, count))
+        out[:] = data.reshape(count, n_channels).T
+        return out
 
-        self.adw.Set_Par(8, int(output_channel))  # set output
-        self.adw.Set_Par(10, 18)  # set ADC input resolution
+    def start_interleaved_recording(self, channels, n_scans):
+        """ Start the process read_ai_interleaved ('interleaved_routine'), recording 'n_scans' averaged scans of the
+        analog inputs 'channels'. PAR_35 - 1 is the number of scans completed. Return the process number. """
+        if int(n_scans) * len(set(channels)) > self.record_size:
+            raise ValueError(f"{n_scans} scans of {len(set(channels))} inputs exceed the {self.record_size} values of DATA_20.")
+        self.adw.Set_Par(1, self.channel_mask(channels))
+        self.adw.Set_Par(41, int(n_scans))
+        return self.run_routine(self.interleaved_routine)
 
-        self.adw.Start_Process(1)                   # run process
-        while self.adw.Process_Status(1) == 1:
-            pass
+    def calibration(self, calibrations, channel):
+        """ Return the (gain, offset) of 'channel' in 'calibrations' ((1, 0) if not calibrated). If 'channel' is a list,
+        return columns of gains and offsets, to convert a (channels, samples) array at once. """
+        if channel is None:
+            return 1.0, 0.0
+        if np.ndim(channel) == 0:
+            return calibrations.get(channel, (1.0, 0.0))
+        gain, offset = np.array([calibrations.get(x, (1.0, 0.0)) for x in channel], dtype=float).T
+        return gain[:, None], offset[:, None]
 
-        data1 = self.adw.GetData_Float(2, 1, len(v))     # get averaged MUX1 current values
-        # data5 = self.adw.GetData_Float(5, len(v))     # get averaged MUX2 current values
-        return array(data1)
+    def voltage2bin(self, v, v_ref=-10, v_range=9.99969-(-10), bits=16, channel=None):
+        """Convert a scalar or array of voltages into bins, correcting for the calibration of output 'channel' (a
+        channel or a list of channels, one per row of 'v'). Bins are clipped to the output range."""
+        gain, offset = self.calibration(self.ao_calibration, channel)
+        bins = np.trunc(((np.asarray(v, dtype=float) - offset) / gain - v_ref) / v_range * 2**bits)
+        bins = np.clip(bins, 0, 2**bits - 1).astype(np.int32)
+        return int(bins) if bins.ndim == 0 else bins
+
+    def bin2voltage(self, bin, v_ref=-10, v_range=9.99969-(-10), bits=16, channel=None):
+        """Convert a scalar or array of bins into voltage values, correcting for the calibration of input 'channel' (a
+        channel or a list of channels, one per row of 'bin')."""
+        gain, offset = self.calibration(self.ai_calibration, channel)
+        v = ((v_ref + np.asarray(bin, dtype=float) * v_range / 2**bits) - offset) / gain
+        return float(v) if v.ndim == 0 else v
+
+    def make_iv(self, v, points2average, output_channel=1, input_channel=1):
+        """Make iv: sweep 'output_channel' through the voltages 'v' (in V) and return the averaged voltage of
+        'input_channel' at each point (in V). """
+        return self.sweep_ao_record_ai(v, [output_channel], [input_channel], settling_time=self.iv_settling_time,
+                                       points2average=points2average)[0]
+
+    def set_event_period(self, process_number, process_delay=None):
+        """ Set the period of the events of 'process_number' to 'process_delay' (in s, 1 / scan_rate if None) and return
+        the actual period, a whole number of clock cycles. """
+        cycles = int(np.ceil(self.clock_freq * (1 / self.scan_rate if process_delay is None else process_delay)))
+        self.adw.Set_Processdelay(process_number, cycles)
+        self.process_delays[process_number] = cycles
+        return cycles / self.clock_freq
+
+    def sweep_ao_record_ai(self, v, output_channels, input_channels, process_delay=None, settling_time=0.0,
+                           points2average=1, n_points=None, wait=True):
+        """ Step the analog outputs 'output_channels' through the waveforms 'v' (in V, one row per output, or a 1-D array
+        for one output) and record the average of 'points2average' samples of the analog inputs 'input_channels' at each
+        point, after waiting 'settling_time' (in s). The sweep runs on the ADwin (process sweep_ao_read_ai) with an
+        event every 'process_delay' (in s). Without outputs, 'n_points' scans are recorded. If 'wait' is True, return
+        the recorded voltages as a (inputs, points) array, inputs in ascending order; otherwise return None at once
+        and read the data with 'read_buffer' when the process of 'sweep_routine' has stopped. """
+        output_channels = list(output_channels)
+        if output_channels:
+            v = np.atleast_2d(np.asarray(v, dtype=float))
+            if len(v) != len(output_channels) or not set(output_channels) <= {1, 2}:
+                raise ValueError("v must have one row per analog output (1 or 2).")
+            n_points = v.shape[1]
+            if n_points > self.sweep_size:
+                raise ValueError(f"{n_points} points exceed the {self.sweep_size} points of the AO waveform arrays.")
+        if int(n_points) * len(set(input_channels)) > self.record_size:
+            raise ValueError(f"{n_points} points of {len(set(input_channels))} inputs exceed the {self.record_size} values of DATA_20.")
+        if output_channels:
+            for channel, row in zip(output_channels, v):
+                self.set_data_long(31 + channel, self.voltage2bin(row, bits=self.output_resolution, channel=channel))
+        self.record_channels = sorted(set(input_channels))
+        self.record_points = int(n_points)
+        process_number = self.process_slot(self.sweep_routine)
+        self.load_process(self.sweep_routine)
+        period = self.set_event_period(process_number, process_delay)
+        self.adw.Set_Par(1, self.channel_mask(self.record_channels))
+        self.adw.Set_Par(2, self.channel_mask(output_channels))
+        self.adw.Set_Par(33, max(1, int(points2average)))
+        self.adw.Set_Par(34, int(np.ceil(settling_time / period)))
+        self.adw.Set_Par(41, self.record_points)
+        self.run_routine(self.sweep_routine)
+        if not wait:
+            return None
+        self.wait_for_process(process_number)
+        return self.read_buffer()
 
     def sweep_ao(self, process_number, v, output_channel, process_delay, settling_time, points2average):
-        """ Sweep Analog Output """
-        raise ADwin.ADwinError("Process not yet implemented")
+        """ Sweep Analog Output 'output_channel' through the voltages 'v' (in V), waiting 'settling_time' (in s) and
+        'points2average' events at each point. The sweep runs in the process slot of 'sweep_routine', which
+        'process_number' must match. """
+        if process_number != self.process_slot(self.sweep_routine):
+            raise ADwin.ADwinError(f"The sweep runs in process {self.process_slot(self.sweep_routine)} ({self.sweep_routine}), not {process_number}.")
+        self.sweep_ao_record_ai(v, [output_channel], [], process_delay, settling_time, points2average)
+
+    def record_ai(self, input_channel, process_delay, settling_time, points2average, n_samples=1):
+        """ Read analog input 'input_channel' (a channel or a list of channels): return 'n_samples' averages of
+        'points2average' samples, after waiting 'settling_time' (in s), as a (inputs, samples) array (in V). """
+        channels = [input_channel] if np.ndim(input_channel) == 0 else list(input_channel)
+        return self.sweep_ao_record_ai(None, [], channels, process_delay, settling_time, points2average,
+                                       n_points=n_samples)
+
+    def read_buffer(self, buffer_number=20):
+        """ Read data stored in ADwinGoldII buffer 'buffer_number'. The interleaved AI buffer (20) of the last sweep /
+        record is returned as a (inputs, points) array of voltages (the points completed so far, if still running);
+        any other buffer as a 1-D array of its first 'record_points' values. """
+        if buffer_number != 20:
+            return self.get_data_float(buffer_number, 1, self.record_points)
+        completed = min(self.adw.Get_Par(35) - 1, self.record_points)
+        if not self.record_channels or completed < 1:
+            return np.zeros((len(self.record_channels), 0))
+        bins = self.read_interleaved(self.record_channels, 1, completed)
+        return self.bin2voltage(bins, bits=self.input_resolution, channel=self.record_channels)
+
+    def start_stream(self, channels, buffer_size=2 ** 20, callback=None, n_scans=0, interval=0.01):
+        """ Stream the averaged scans of the analog inputs 'channels' (process stream_ai_fifo, 'stream_routine') into the ring buffer 'stream_buffer', one column per input in ascending order, in V. A
+        background thread drains the ADwin FIFO every 'interval' (in s) and calls 'callback(scans)' with each block.
+        With 'n_scans' = 0 the record has no length limit, until 'stop_stream'. Back-pressure is reported by
+        'stream_dropped' (scans dropped by the ADwin, FIFO full) and 'stream_buffer.overflows' (scans overwritten in the
+        host buffer before being read). """
+        self.adw.Set_Par(1, self.channel_mask(channels))
+        self.adw.Set_Par(41, int(n_scans))
+        process_number = self.run_routine(self.stream_routine)
+        self.start_reader(channels, process_number, buffer_size, callback, interval)
+
+    def start_reader(self, channels, process_number, buffer_size=2 ** 20, callback=None, interval=0.01):
+        """ Start the thread draining the FIFO filled by the running 'process_number' with scans of 'channels' (see
+        'start_stream'). """
+        self.stream_channels = sorted(set(channels))
+        self.stream_process = process_number
+        self.stream_buffer = RingBuffer(buffer_size, len(self.stream_channels))
+        self.stream_error = None
+        self.stream_dropped = 0
+        self.streaming.set()
+        self.stream_thread = threading.Thread(target=self.read_stream, args=(callback, interval), daemon=True)
+        self.stream_thread.start()
+
+    def read_stream(self, callback, interval, data_number=30):
+        """ Body of the streaming thread: move whole scans from the FIFO Data_'data_number' to the ring buffer, until the
+        process has stopped and the FIFO is drained. """
+        n_channels = len(self.stream_channels)
+        try:
+            while True:
+                # read the process status before draining, so that the scans of a finished process are all drained
+                running = self.adw.Process_Status(self.stream_process) == 1
+                available = self.adw.Fifo_Full(data_number) // n_channels * n_channels
+                if available > 0:
+                    bins = np.ctypeslib.as_array(self.adw.GetFifo_Float(data_number, available)).reshape(-1, n_channels)
+                    scans = self.bin2voltage(bins.T, bits=self.input_resolution, channel=self.stream_channels).T
+                    self.stream_buffer.put(scans)
+                    if callback is not None:
+                        callback(scans)
+                self.stream_dropped = self.adw.Get_Par(36)
+                if not running or not self.streaming.is_set():
+                    break
+                time.sleep(interval)
+        except ADwin.ADwinError as error:
+            self.stream_error = error
+        finally:
+            self.stream_buffer.close()
+
+    def stream(self, samples=256, timeout=None):
+        """ Iterate over blocks of 'samples' scans from the ring buffer until the stream is stopped and the buffer
+        emptied. A shorter block is returned if 'timeout' (in s) expires first. """
+        while True:
+            rows = self.stream_buffer.get(samples, timeout)
+            if len(rows) == 0 and self.stream_buffer.closed:
+                return
+            yield rows
+
+    def stop_stream(self):
+        """ Stop the streaming process and thread. The scans left in 'stream_buffer' can still be read. """
+        if self.stream_process is not None:
+            self.adw.Stop_Process(self.stream_process)
+            self.wait_for_process(self.stream_process)
+        if self.stream_thread is not None:
+            self.stream_thread.join()
+            self.stream_thread = None
+        self.streaming.clear()
+        if self.stream_error is not None:
+            raise self.stream_error
 
-    def record_ai(self, input_channel, process_delay, settling_time, points2average):
-        """ Read analog input"""
-        raise ADwin.ADwinError("Process not yet implemented")
+    def acquire_stream(self, channels, n_scans):
+        """ Stream exactly 'n_scans' scans of the analog inputs 'channels' and return them as a (channels, samples)
+        array. """
+        self.start_stream(channels, buffer_size=n_scans, n_scans=n_scans)
+        self.stream_thread.join()
+        self.stop_stream()
+        return self.stream_buffer.get().T
 
-    def read_buffer(self, buffer_number):
-        """ Read data stored in ADwinGoldII buffer """
-        raise ADwin.ADwinError("Process not yet implemented")
+    def raster(self, v_outer, v_inner, input_channels, outer_channel=1, inner_channel=2, process_delay=None,
+               settling_time=0.0, points2average=1, ramp_rate=None, callback=None, wait=True):
+        """ Map the analog inputs 'input_channels' over the 2-D grid 'v_outer' x 'v_inner' (in V) of the analog outputs
+        'outer_channel' and 'inner_channel' (e.g. Vgs x Vds), entirely on the ADwin (process raster_ao_read_ai): both
+        axes are uploaded once, and at each point the outputs move at 'ramp_rate' (in V/s, None to step at once), settle
+        for 'settling_time' (in s) and 'points2average' samples are averaged. The points stream back in blocks through
+        the FIFO (row-major order, inner axis fastest) into 'stream_buffer', calling 'callback(scans)' for each block.
+        If 'wait' is True, return a (inputs, outer, inner) array of voltages; otherwise return None at once and read the
+        scans with 'stream'. Here 'stream_dropped' counts the events the ADwin waited for room in the FIFO. """
+        if {outer_channel, inner_channel} != {1, 2}:
+            raise ValueError("The outer and inner axes must be analog outputs 1 and 2.")
+        v_outer, v_inner = np.atleast_1d(v_outer), np.atleast_1d(v_inner)
+        if max(len(v_outer), len(v_inner)) > self.raster_size:
+            raise ValueError(f"The raster axes are limited to {self.raster_size} points.")
+        self.set_data_long(34, self.voltage2bin(v_outer, bits=self.output_resolution, channel=outer_channel))
+        self.set_data_long(35, self.voltage2bin(v_inner, bits=self.output_resolution, channel=inner_channel))
+        process_number = self.process_slot(self.raster_routine)
+        self.load_process(self.raster_routine)
+        period = self.set_event_period(process_number, process_delay)
+        ramp_step = 0 if ramp_rate is None else max(1, int(ramp_rate * period / (9.99969 - (-10)) * 2 ** self.output_resolution))
+        self.adw.Set_Par(1, self.channel_mask(input_channels))
+        self.adw.Set_Par(33, max(1, int(points2average)))
+        self.adw.Set_Par(34, int(np.ceil(settling_time / period)))
+        self.adw.Set_Par(42, len(v_outer))
+        self.adw.Set_Par(43, len(v_inner))
+        self.adw.Set_Par(44, ramp_step)
+        self.adw.Set_Par(45, outer_channel)
+        self.adw.Set_Par(46, inner_channel)
+        self.run_routine(self.raster_routine)
+        self.start_reader(input_channels, process_number, len(v_outer) * len(v_inner), callback)
+        if not wait:
+            return None
+        self.stream_thread.join()
+        self.stop_stream()
+        return self.stream_buffer.get().T.reshape(len(self.stream_channels), len(v_outer), len(v_inner))
@@ -0,0 +1,163 @@
+'<ADbasic Header, Headerversion 001.001>
+' Process_Number                 = 8
+' Initial_Processdelay           = 1000
+' Eventsource                    = Timer
+' Control_long_Delays_for_Stop   = No
+' Priority                       = High
+' Version                        = 1
+' ADbasic_Version                = 6.3.1
+' Optimize                       = Yes
+' Optimize_Level                 = 1
+' Stacksize                      = 1000
+'<Header End>
+'raster_ao_read_ai: 2-D raster of two analog outputs (e.g. Vgs x Vds), recording any subset of AI1-16 at each point.
+'Replaces the host loop over sweep_ao1-2 (two-point ramps) and read_ai1-8: the whole map runs on the ADwin
+'Process 8: slots 1-7 hold the routines of the measurement scripts. read_ai_interleaved also uses slot 8: the driver
+'loads whichever of the two it starts
+
+'General input-output parameters (1-29):
+'PAR_1 = active analog inputs (bit n-1 set for input n, e.g. 0000000000000101b -> 5 for inputs 1 and 3)
+
+'ADC-DAC parameters (31-40):
+'PAR_33 = number of points to average in-hardware
+'PAR_34 = number of loops to wait after reaching each point
+'PAR_35 = point index (current point, the number of points completed is PAR_35-1)
+'PAR_36 = number of events spent waiting for room in the FIFO (back-pressure: the host does not read fast enough)
+
+'process parameters (41-80):
+'PAR_42 = number of points of the outer axis (DATA_34)
+'PAR_43 = number of points of the inner axis (DATA_35)
+'PAR_44 = maximum output step per event (in bins) when moving to the next point. 0: step at once
+'PAR_45 = analog output of the outer axis (1 or 2)
+'PAR_46 = analog output of the inner axis (2 or 1, the other output)
+
+'PAR_51 = current analog output 1 value
+'PAR_52 = current analog output 2 value
+
+'Data layout: DATA_34 and DATA_35 hold the outer and inner axes (bins), free array numbers (DATA_21-28 are declared
+'[50000] by the sweep_ao* routines). Each point pushes the averaged active inputs (ascending input number) into the
+'FIFO DATA_30, points in row-major order (inner axis fastest)
+
+#INCLUDE ADwinGoldII.inc
+
+DIM DATA_34[10000] as long  'outer axis - (bin values)
+DIM DATA_35[10000] as long  'inner axis - (bin values)
+DIM DATA_30[1000000] as float as FIFO  'interleaved AI data FIFO - (bin values)
+
+DIM sums[16] as float
+DIM idx_outer, idx_inner, idx_point, idx_avg, idx_wait, n_active as long
+DIM v_outer, v_inner, target_outer, target_inner as long
+DIM mux, ch, flag as long
+
+INIT:
+  FIFO_CLEAR(30)
+  idx_outer = 1
+  idx_inner = 1
+  idx_point = 1
+  idx_avg = 0
+  idx_wait = 0
+  n_active = 0
+  FOR ch = 1 TO 16
+    sums[ch] = 0
+    IF ((PAR_1 AND Shift_Left(1, ch - 1)) > 0) THEN inc(n_active)
+  NEXT ch
+  'start from the current outputs
+  IF (PAR_45 = 1) THEN
+    v_outer = PAR_51
+    v_inner = PAR_52
+  ELSE
+    v_outer = PAR_52
+    v_inner = PAR_51
+  ENDIF
+  flag = 0
+  PAR_35 = idx_point
+  PAR_36 = 0
+
+EVENT:
+
+  SELECTCASE flag '0 = move to the point ; 1 = wait ; 2 = measure ; 3 = push to the FIFO
+
+    CASE 0 'move to the point --------------------------------
+      'each output moves by at most PAR_44 bins per event (at once if PAR_44 = 0)
+      target_outer = DATA_34[idx_outer]
+      target_inner = DATA_35[idx_inner]
+      IF ((PAR_44 = 0) OR ((target_outer - v_outer <= PAR_44) AND (v_outer - target_outer <= PAR_44))) THEN
+        v_outer = target_outer
+      ELSE
+        IF (target_outer > v_outer) THEN
+          v_outer = v_outer + PAR_44
+        ELSE
+          v_outer = v_outer - PAR_44
+        ENDIF
+      ENDIF
+      IF ((PAR_44 = 0) OR ((target_inner - v_inner <= PAR_44) AND (v_inner - target_inner <= PAR_44))) THEN
+        v_inner = target_inner
+      ELSE
+        IF (target_inner > v_inner) THEN
+          v_inner = v_inner + PAR_44
+        ELSE
+          v_inner = v_inner - PAR_44
+        ENDIF
+      ENDIF
+      IF (PAR_45 = 1) THEN
+        DAC(1, v_outer)
+        DAC(2, v_inner)
+        PAR_51 = v_outer
+        PAR_52 = v_inner
+      ELSE
+        DAC(2, v_outer)
+        DAC(1, v_inner)
+        PAR_52 = v_outer
+        PAR_51 = v_inner
+      ENDIF
+      IF ((v_outer = target_outer) AND (v_inner = target_inner)) THEN
+        idx_wait = 0
+        flag = 1
+      ENDIF
+
+    CASE 1 'wait --------------------------------
+      IF (idx_wait >= PAR_34) THEN
+        idx_avg = 0
+        flag = 2
+      ELSE
+        inc(idx_wait)
+      ENDIF
+
+    CASE 2 'measure --------------------------------
+      'inputs 2 * mux + 1 (ADC1) and 2 * mux + 2 (ADC2) share multiplexer position 'mux': skip unused positions
+      FOR mux = 0 TO 7
+        IF ((PAR_1 AND Shift_Left(11b, 2 * mux)) > 0) THEN
+          Set_Mux1(mux)
+          Set_Mux2(mux)
+          IO_Sleep(200)
+          START_CONV(11b)
+          WAIT_EOC(11b)
+          sums[2 * mux + 1] = sums[2 * mux + 1] + READ_ADC24(1)/64
+          sums[2 * mux + 2] = sums[2 * mux + 2] + READ_ADC24(2)/64
+        ENDIF
+      NEXT mux
+      inc(idx_avg)
+      IF (idx_avg >= PAR_33) THEN flag = 3
+
+    CASE 3 'push to the FIFO, waiting for room if needed --------------------------------
+      IF (FIFO_EMPTY(30) >= n_active) THEN
+        FOR ch = 1 TO 16
+          IF ((PAR_1 AND Shift_Left(1, ch - 1)) > 0) THEN
+            DATA_30 = sums[ch] / PAR_33
+          ENDIF
+          sums[ch] = 0
+        NEXT ch
+        inc(idx_point)
+        PAR_35 = idx_point
+        inc(idx_inner)
+        IF (idx_inner > PAR_43) THEN
+          idx_inner = 1
+          inc(idx_outer)
+        ENDIF
+        IF (idx_outer > PAR_42) THEN end
+        flag = 0
+      ELSE
+        inc(PAR_36)
+      ENDIF
+
+  ENDSELECT
@@ -0,0 +1,75 @@
+'<ADbasic Header, Headerversion 001.001>
+' Process_Number                 = 8
+' Initial_Processdelay           = 1000
+' Eventsource                    = Timer
+' Control_long_Delays_for_Stop   = No
+' Priority                       = High
+' Version                        = 1
+' ADbasic_Version                = 6.3.1
+' Optimize                       = Yes
+' Optimize_Level                 = 1
+' Stacksize                      = 1000
+'<Header End>
+'read_ai_interleaved: records the averaged values of any subset of AI1-16 into one array, interleaved by scan
+
+'General input-output parameters (1-29):
+'PAR_1 = active analog inputs (bit n-1 set for input n, e.g. 0000000000000101b -> 5 for inputs 1 and 3)
+
+'ADC-DAC parameters (31-40):
+'PAR_33 = number of points to average in-hardware
+'PAR_35 = scan index (current scan, the number of acquisitions completed is PAR_35-1)
+
+'process parameters (41-80):
+'PAR_41 = number of scans to record
+
+'Data layout: DATA_20[(scan - 1) * n_active + k] is the k-th active input (ascending input number) of scan 'scan', so
+'that the host reads any range of scans of all the active inputs with one GetData_Float
+
+#INCLUDE ADwinGoldII.inc
+
+DIM DATA_20[800000] as float at DRAM_EXTERN  'interleaved AI data array - (bin values)
+
+DIM sums[16] as float
+DIM idx_scan, idx_avg, idx_data as long
+DIM mux, ch as long
+
+INIT:
+  idx_avg = 0
+  idx_scan = 1
+  idx_data = 1
+  FOR ch = 1 TO 16
+    sums[ch] = 0
+  NEXT ch
+  PAR_35 = idx_scan
+
+EVENT:
+
+  'inputs 2 * mux + 1 (ADC1) and 2 * mux + 2 (ADC2) share multiplexer position 'mux': skip unused positions
+  FOR mux = 0 TO 7
+    IF ((PAR_1 AND Shift_Left(11b, 2 * mux)) > 0) THEN
+      Set_Mux1(mux)
+      Set_Mux2(mux)
+      IO_Sleep(200)
+      START_CONV(11b)
+      WAIT_EOC(11b)
+      sums[2 * mux + 1] = sums[2 * mux + 1] + READ_ADC24(1)/64
+      sums[2 * mux + 2] = sums[2 * mux + 2] + READ_ADC24(2)/64
+    ENDIF
+  NEXT mux
+
+  inc(idx_avg)
+
+  'If summed PAR_33 samples, store the average values of the active inputs
+  IF (idx_avg = PAR_33) THEN
+    FOR ch = 1 TO 16
+      IF ((PAR_1 AND Shift_Left(1, ch - 1)) > 0) THEN
+        DATA_20[idx_data] = sums[ch] / PAR_33
+        inc(idx_data)
+      ENDIF
+      sums[ch] = 0
+    NEXT ch
+    idx_avg = 0
+    inc(idx_scan)
+    PAR_35 = idx_scan
+    IF (idx_scan = PAR_41 + 1) THEN end
+  ENDIF
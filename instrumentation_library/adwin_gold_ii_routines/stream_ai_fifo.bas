@@ -0,0 +1,84 @@
+'<ADbasic Header, Headerversion 001.001>
+' Process_Number                 = 9
+' Initial_Processdelay           = 1000
+' Eventsource                    = Timer
+' Control_long_Delays_for_Stop   = No
+' Priority                       = High
+' Version                        = 1
+' ADbasic_Version                = 6.3.1
+' Optimize                       = Yes
+' Optimize_Level                 = 1
+' Stacksize                      = 1000
+'<Header End>
+'stream_ai_fifo: streams the averaged values of any subset of AI1-16 through a FIFO, for records of any length
+
+'General input-output parameters (1-29):
+'PAR_1 = active analog inputs (bit n-1 set for input n, e.g. 0000000000000101b -> 5 for inputs 1 and 3)
+
+'ADC-DAC parameters (31-40):
+'PAR_33 = number of points to average in-hardware
+'PAR_35 = scan index (current scan, the number of scans acquired is PAR_35-1)
+'PAR_36 = number of scans dropped because the FIFO was full (back-pressure: the host does not read fast enough)
+
+'process parameters (41-80):
+'PAR_41 = number of scans to stream (0: stream until the process is stopped)
+
+'Data layout: each scan writes the active inputs (ascending input number) into the FIFO DATA_30, so that the host reads
+'whole scans with GetFifo_Float. A scan is written only if the FIFO has room for all its values.
+
+#INCLUDE ADwinGoldII.inc
+
+DIM DATA_30[1000000] as float as FIFO  'interleaved AI data FIFO - (bin values)
+
+DIM sums[16] as float
+DIM idx_scan, idx_avg, n_active as long
+DIM mux, ch as long
+
+INIT:
+  FIFO_CLEAR(30)
+  idx_avg = 0
+  idx_scan = 1
+  n_active = 0
+  FOR ch = 1 TO 16
+    sums[ch] = 0
+    IF ((PAR_1 AND Shift_Left(1, ch - 1)) > 0) THEN inc(n_active)
+  NEXT ch
+  PAR_35 = idx_scan
+  PAR_36 = 0
+
+EVENT:
+
+  'inputs 2 * mux + 1 (ADC1) and 2 * mux + 2 (ADC2) share multiplexer position 'mux': skip unused positions
+  FOR mux = 0 TO 7
+    IF ((PAR_1 AND Shift_Left(11b, 2 * mux)) > 0) THEN
+      Set_Mux1(mux)
+      Set_Mux2(mux)
+      IO_Sleep(200)
+      START_CONV(11b)
+      WAIT_EOC(11b)
+      sums[2 * mux + 1] = sums[2 * mux + 1] + READ_ADC24(1)/64
+      sums[2 * mux + 2] = sums[2 * mux + 2] + READ_ADC24(2)/64
+    ENDIF
+  NEXT mux
+
+  inc(idx_avg)
+
+  'If summed PAR_33 samples, push the average values of the active inputs, or drop the scan if the FIFO is full
+  IF (idx_avg = PAR_33) THEN
+    IF (FIFO_EMPTY(30) >= n_active) THEN
+      FOR ch = 1 TO 16
+        IF ((PAR_1 AND Shift_Left(1, ch - 1)) > 0) THEN
+          DATA_30 = sums[ch] / PAR_33
+        ENDIF
+      NEXT ch
+    ELSE
+      inc(PAR_36)
+    ENDIF
+    FOR ch = 1 TO 16
+      sums[ch] = 0
+    NEXT ch
+    idx_avg = 0
+    inc(idx_scan)
+    PAR_35 = idx_scan
+    IF ((PAR_41 > 0) AND (idx_scan = PAR_41 + 1)) THEN end
+  ENDIF
@@ -0,0 +1,114 @@
+'<ADbasic Header, Headerversion 001.001>
+' Process_Number                 = 10
+' Initial_Processdelay           = 1000
+' Eventsource                    = Timer
+' Control_long_Delays_for_Stop   = No
+' Priority                       = High
+' Version                        = 1
+' ADbasic_Version                = 6.3.1
+' Optimize                       = Yes
+' Optimize_Level                 = 1
+' Stacksize                      = 1000
+'<Header End>
+'sweep_ao_read_ai: steps any subset of AO1-2 through arbitrary waveforms, recording any subset of AI1-16 at each point
+
+'General input-output parameters (1-29):
+'PAR_1 = active analog inputs (bit n-1 set for input n, e.g. 0000000000000101b -> 5 for inputs 1 and 3). 0: no recording
+'PAR_2 = active analog outputs (bit n-1 set for output n, e.g. 00000011b -> 3 for outputs 1 and 2). 0: record only
+
+'ADC-DAC parameters (31-40):
+'PAR_33 = number of points to average in-hardware
+'PAR_34 = number of loops to wait after setting analog output (before the first point only, if no output is active)
+'PAR_35 = scan index (current point, the number of points completed is PAR_35-1)
+
+'process parameters (41-80):
+'PAR_41 = number of points (length of the AO arrays, or number of scans to record)
+
+'PAR_51 = current analog output 1 value
+'PAR_52 = current analog output 2 value
+
+'Data layout: DATA_32 and DATA_33 hold the AO1 and AO2 waveforms (bins). DATA_20[(point - 1) * n_active + k] is the
+'k-th active input (ascending input number) at point 'point', as in read_ai_interleaved
+
+#INCLUDE ADwinGoldII.inc
+
+DIM DATA_20[800000] as float at DRAM_EXTERN  'interleaved AI data array - (bin values)
+'DATA_21-28 are declared [50000] by the sweep_ao* routines: the waveforms use free array numbers, so that this routine
+'can be loaded next to them
+DIM DATA_32[200000] as long at DRAM_EXTERN  'AO1 data array - (bin values)
+DIM DATA_33[200000] as long at DRAM_EXTERN  'AO2 data array - (bin values)
+
+DIM sums[16] as float
+DIM idx_scan, idx_avg, idx_wait, idx_data as long
+DIM mux, ch, flag as long
+
+INIT:
+  idx_scan = 1
+  idx_avg = 0
+  idx_wait = 0
+  idx_data = 1
+  FOR ch = 1 TO 16
+    sums[ch] = 0
+  NEXT ch
+  flag = 0
+  PAR_35 = idx_scan
+
+EVENT:
+
+  SELECTCASE flag '0 = set analog outputs ; 1 = wait ; 2 = measure
+
+    CASE 0 'set analog outputs --------------------------------
+      IF ((PAR_2 AND 01b) > 0) THEN
+        DAC(1, DATA_32[idx_scan])
+        PAR_51 = DATA_32[idx_scan]
+      ENDIF
+      IF ((PAR_2 AND 10b) > 0) THEN
+        DAC(2, DATA_33[idx_scan])
+        PAR_52 = DATA_33[idx_scan]
+      ENDIF
+      IF ((PAR_2 > 0) OR (idx_scan = 1)) THEN
+        idx_wait = 0
+        flag = 1
+      ELSE
+        flag = 2
+      ENDIF
+
+    CASE 1 'wait --------------------------------
+      IF (idx_wait >= PAR_34) THEN
+        idx_avg = 0
+        flag = 2
+      ELSE
+        inc(idx_wait)
+      ENDIF
+
+    CASE 2 'measure --------------------------------
+      'inputs 2 * mux + 1 (ADC1) and 2 * mux + 2 (ADC2) share multiplexer position 'mux': skip unused positions
+      FOR mux = 0 TO 7
+        IF ((PAR_1 AND Shift_Left(11b, 2 * mux)) > 0) THEN
+          Set_Mux1(mux)
+          Set_Mux2(mux)
+          IO_Sleep(200)
+          START_CONV(11b)
+          WAIT_EOC(11b)
+          sums[2 * mux + 1] = sums[2 * mux + 1] + READ_ADC24(1)/64
+          sums[2 * mux + 2] = sums[2 * mux + 2] + READ_ADC24(2)/64
+        ENDIF
+      NEXT mux
+      inc(idx_avg)
+
+      'If summed PAR_33 samples, store the average values of the active inputs and go to the next point
+      IF (idx_avg >= PAR_33) THEN
+        FOR ch = 1 TO 16
+          IF ((PAR_1 AND Shift_Left(1, ch - 1)) > 0) THEN
+            DATA_20[idx_data] = sums[ch] / PAR_33
+            inc(idx_data)
+          ENDIF
+          sums[ch] = 0
+        NEXT ch
+        inc(idx_scan)
+        PAR_35 = idx_scan
+        flag = 0
+        IF (idx_scan = PAR_41 + 1) THEN end
+      ENDIF
+
+  ENDSELECT
@@ -1,87 +1,127 @@
 import numpy as np
+from instrument import QueuedSession
 
 class agilent4294a():
 
     # dictonary
-    a4294 = {"dc_range": {1e-3: "M1", 10e-3: "M10", 100e-3: "M100"}}
-
-    def __init__(self, visa):
-        self.visa = visa
+    a4294 = {"dc_range": {1e-3: "M1", 10e-3: "M10", 100e-3: "M100"},
+             "data_format": {"ASCII": "FORM4", "REAL32": "FORM2", "REAL64": "FORM3"}}
+
+    def __init__(self, visa, reset=True, data_format="REAL64"):
+        # With reset=False the unit is attached as it is (no preset, sweep and trigger untouched): the settings are read
+        # back once into the registry. Traces are transferred in 'data_format': ASCII, REAL32 or REAL64 (binary)
+        self.visa = QueuedSession(visa)
+        self.registry = {}            # last written / read settings, by command mnemonic
+        self.data_format = None       # format of the trace transfers (see "set_data_format")
         self.visa.write("*CLS")       # clear all
-        self.visa.write("*RST")       # preset (sweep mode is set to HOLD)
-        #self.visa.write("PRES")        # preset (does not reset instrument BASIC)
-        self.visa.write("HOLD")         # hold the trigger (IDLE state)
-        self.visa.write("FORM4")      # format ascii
-        self.visa.write("TRGS INT")   # selects trigger source
-        self.visa.write("E4TP OFF")  # adapter type NONE (E4TP M1: 1m extension, E4TP M2: 2m extension)
-        #self.visa.write("CALST OFF")  # turns off the user calibration function
-        #self.visa.write("COMSTA OFF")  # turn off OPEN compensation
-        #self.visa.write("COMSTB OFF")  # turn off SHORT compensation
-        #self.visa.write("COMSTC OFF")  # turn off LOAD compensation
-        self.visa.write("BEEPWARN ON")  # sets the point averaging count (1 to 256, default 4)
-        #self.visa.write("E4TP M1")
+        if reset is True:
+            self.reset()                  # preset (sweep mode is set to HOLD)
+            #self.visa.write("PRES")        # preset (does not reset instrument BASIC)
+            self.visa.write("HOLD")         # hold the trigger (IDLE state)
+            self.set_data_format(data_format)
+            self.visa.write("TRGS INT")   # selects trigger source
+            self.visa.write("E4TP OFF")  # adapter type NONE (E4TP M1: 1m extension, E4TP M2: 2m extension)
+            #self.visa.write("CALST OFF")  # turns off the user calibration function
+            #self.visa.write("COMSTA OFF")  # turn off OPEN compensation
+            #self.visa.write("COMSTB OFF")  # turn off SHORT compensation
+            #self.visa.write("COMSTC OFF")  # turn off LOAD compensation
+            self.visa.write("BEEPWARN ON")  # sets the point averaging count (1 to 256, default 4)
+            #self.visa.write("E4TP M1")
+        else:
+            self.set_data_format(data_format)
+            self.resync()
+
+    # registry functions
+    def write_setting(self, mnemonic, value):
+        # write "mnemonic value" unless the value is already in the registry
+        if self.registry.get(mnemonic) != value:
+            self.visa.write("{} {}".format(mnemonic, value))
+            self.registry[mnemonic] = value
+
+    def read_setting(self, mnemonic):
+        # return the value of a setting from the registry, or query it from the unit (numbers are returned as float)
+        if mnemonic not in self.registry:
+            val = self.visa.query("{}?".format(mnemonic)).strip()
+            try:
+                self.registry[mnemonic] = float(val)
+            except ValueError:
+                self.registry[mnemonic] = val
+        return self.registry[mnemonic]
+
+    def reset(self):
+        # preset the unit and forget the registry
+        self.visa.write("*RST")
+        self.registry = {}
+
+    def resync(self):
+        # discard the registry and read the settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return self.read_settings()
 
     # set settings function
     def wait_commands_exec(self):
         self.visa.write("*WAI")  # waits execution of all overlap commands sent before
 
     def set_measurement_parameters(self, meas='IMPH'): # measures Z and Theta (default)
-        self.visa.write("MEAS {}".format(meas))
+        self.write_setting("MEAS", meas)
 
     def set_measurement_signals(self, mode='VOLT', level=0):
-        self.visa.write("POWMOD {}".format(mode))  # set oscillator power mode
-        self.visa.write("POWE {}".format(level))  # set oscillator power level (default volt 0.5, current 200e-6, volt: 5e-3 to 1 V, current: 200e-6 to 20e-3)
+        self.write_setting("POWMOD", mode)  # set oscillator power mode
+        self.write_setting("POWE", level)  # set oscillator power level (default volt 0.5, current 200e-6, volt: 5e-3 to 1 V, current: 200e-6 to 20e-3)
 
     def set_dc_bias(self, mode='VOLT', level=0, range=1e-3): # mode VOLT or
-        self.visa.write("DCMOD {}".format(mode))  # select the DC output bias mode
+        self.write_setting("DCMOD", mode)  # select the DC output bias mode
         if mode == 'VOLT':
-            self.visa.write("DCV {}".format(level))  # set the dc output bias level (+- 40 V)
+            self.write_setting("DCV", level)  # set the dc output bias level (+- 40 V)
         elif mode == 'CURR':
-            self.visa.write("DCI {}".format(level))  # set the dc output bias level (+- 40 V)
-        self.visa.write("DCRNG {}".format(self.a4294["dc_range"][range]))  # select the DC output bias mode
+            self.write_setting("DCI", level)  # set the dc output bias level (+- 40 V)
+        self.write_setting("DCRNG", self.a4294["dc_range"][range])  # select the DC output bias mode
 
     # turn ON or OFF the dc bias
     def switch_dc_bias(self, state='OFF'):
-        self.visa.write("DCO {}".format(state))  # turn off the dc bias (off by default)
+        self.write_setting("DCO", state)  # turn off the dc bias (off by default)
 
     def set_averaging(self, bandwidth=5, point_averaging=4, average='OFF'):
-        self.visa.write("BWFACT {}".format(bandwidth))  # sets the bandwidth (1 to 5,
+        self.write_setting("BWFACT", bandwidth)  # sets the bandwidth (1 to 5,
         # 5: longest measurement time, accurate measurement)
-        self.visa.write("PAVER {}".format(average))  # Enables/disables the point averaging function
-        self.visa.write("PAVERFACT {}".format(point_averaging))  # sets the point averaging count (1 to 256, default 4)
+        self.write_setting("PAVER", average)  # Enables/disables the point averaging function
+        self.write_setting("PAVERFACT", point_averaging)  # sets the point averaging count (1 to 256, default 4)
 
     def set_oscillator_frequency(self, freq=1e6):
-        self.visa.write("CWFREQ {}".format(freq)) # Sets the frequency of the oscillator for the oscillator (OSC) level sweep and dc bias level sweep
+        self.write_setting("CWFREQ", freq) # Sets the frequency of the oscillator for the oscillator (OSC) level sweep and dc bias level sweep
 
     def set_sweep_condition(self, parameter='FREQ', type='LOG', start=40, stop=10e6, points=201, point_delay=0, sweep_delay=0):
-        self.visa.write("SWPP {}".format(parameter))        # sets the sweep parameter (default: frequency)
-        self.visa.write("SWPT {}".format(type))             # set the sweep type to log (default: LIN)
-        self.visa.write("STAR {}".format(start))       # sweep start freq (Hz)
-        self.visa.write("STOP {}".format(stop))        # sweep stop freq (Hz)
-        self.visa.write("POIN {}".format(points))      # number of points per sweep (deafult 201, max 801)
-        self.visa.write("SDELT {}".format(sweep_delay))     # sets delay time for each sweep (deafult 0, max 30s)
-        self.visa.write("PDELT {}".format(point_delay))     # sets delay time for each point (deafult 0, max 30s)
+        self.write_setting("SWPP", parameter)        # sets the sweep parameter (default: frequency)
+        self.write_setting("SWPT", type)             # set the sweep type to log (default: LIN)
+        self.write_setting("STAR", start)            # sweep start freq (Hz)
+        self.write_setting("STOP", stop)             # sweep stop freq (Hz)
+        self.write_setting("POIN", points)           # number of points per sweep (deafult 201, max 801)
+        self.write_setting("SDELT", sweep_delay)     # sets delay time for each sweep (deafult 0, max 30s)
+        self.write_setting("PDELT", point_delay)     # sets delay time for each point (deafult 0, max 30s)
+
+    def set_data_format(self, data_format="REAL64"):
+        # format of the trace transfers: ASCII (FORM4), REAL32 (FORM2) or REAL64 (FORM3). The binary formats are sent
+        # as an IEEE 488.2 block of big endian floats
+        self.visa.write(self.a4294["data_format"][data_format])
+        self.data_format = data_format
 
     def set_onscreen_arrangement(self): # sets autoscale on trace A and B (only for tool display)
-        self.visa.write('TRAC A')
-        self.visa.write('AUTO')
-        self.visa.write('TRAC B')
-        self.visa.write('AUTO')
+        self.visa.write('TRAC A;AUTO;TRAC B;AUTO')
 
     # read settings function
     def read_settings(self):
         settings = dict()
-        settings["oscillator_power_mode"] = self.visa.query("POWMOD?")
-        settings["oscillator_power_level"] = self.visa.query("POWE?")
-        settings["dc_bias_mode"] = self.visa.query("DCMOD?")
-        if self.visa.query("DCMOD?") == "VOLT":
-            settings["dc_bias_level"].append(self.visa.query("DCV?"))
-        elif self.visa.query("DCMOD?") == "CURR":
-            settings["dc_bias_level"].append(self.visa.query("DCI?"))
-        settings["bandwidth"] = self.visa.query("BWFACT?")
-        settings["point_average"] = self.visa.query("PAVERFACT?")
-        settings["sweep_delay"] = self.visa.query("SDELT?")
-        settings["point_delay"] = self.visa.query("PDELT?")
+        settings["oscillator_power_mode"] = self.read_setting("POWMOD")
+        settings["oscillator_power_level"] = self.read_setting("POWE")
+        settings["dc_bias_mode"] = self.read_setting("DCMOD")
+        if settings["dc_bias_mode"] == "VOLT":
+            settings["dc_bias_level"] = self.read_setting("DCV")
+        elif settings["dc_bias_mode"] == "CURR":
+            settings["dc_bias_level"] = self.read_setting("DCI")
+        settings["bandwidth"] = self.read_setting("BWFACT")
+        settings["point_average"] = self.read_setting("PAVERFACT")
+        settings["sweep_delay"] = self.read_setting("SDELT")
+        settings["point_delay"] = self.read_setting("PDELT")
 
         return settings
 
@@ -123,6 +163,22 @@ class agilent4294a():
 
         self.visa.write("ECALDON")  # turn off LOAD
 
+    def read_values(self, query):
+        # send a data transfer query and return the values as a numpy array, decoded according to the data format
+        if self.data_format == "ASCII":
+            return np.array(self.visa.query_ascii_values(query))
+        return self.visa.query_binary_values(query, datatype="d" if self.data_format == "REAL64" else "f",
+                                             is_big_endian=True, container=np.array)
+
+    def read_trace(self, trace="A"):
+        # select 'trace' and return its readout and subsidiary values (views of the interleaved transfer), in one query
+        data = self.read_values("TRAC {};OUTPDTRC?".format(trace))
+        return data[0::2], data[1::2]
+
+    def read_sweep_parameter(self):
+        # return the sweep parameter values (e.g. the frequencies) of the last sweep
+        return self.read_values("OUTPSWPRM?")
+
     # sweep frequency on defined range and return modulus, phase and frequency
     def sweep_and_acquire(self):
 
@@ -135,26 +191,11 @@ class agilent4294a():
         #self.wait_commands_exec()                # waits
         self.visa.write("*WAI")
 
-        # select trace A    (trace A and B are defined by MEAS)
-        self.visa.write('TRAC A')
-        nop = self.visa.query('POIN?')                        # ask for acquired points number
-        a_data = self.visa.query_ascii_values('OUTPDTRC?')    # ask for acquired points number
-        trace_a_readout = np.zeros(int(nop))
-        trace_a_subsidiary = np.zeros(int(nop))
-        for x in range(0, int(nop)):
-            trace_a_readout[x] = a_data[2*x]        # readout
-            trace_a_subsidiary[x] = a_data[2*x+1]   # subsidiary
-
-        # select trace B (phase theta)
-        self.visa.write('TRAC B')
-        b_data = self.visa.query_ascii_values('OUTPDTRC?')
-        trace_b_readout = np.zeros(int(nop))
-        trace_b_subsidiary = np.zeros(int(nop))
-        for x in range(0, int(nop)):
-            trace_b_readout[x] = b_data[2*x]        # readout
-            trace_b_subsidiary[x] = a_data[2*x+1]   # subsidiary
-
-        freq = self.visa.query_ascii_values('OUTPSWPRM?')     # frequencies
+        # trace A and B are defined by MEAS (e.g. modulus and phase theta)
+        trace_a_readout, trace_a_subsidiary = self.read_trace("A")
+        trace_b_readout, trace_b_subsidiary = self.read_trace("B")
+
+        freq = self.read_sweep_parameter()     # frequencies
         self.visa.write("*WAI")
 
         return freq, trace_a_readout, trace_b_readout
@@ -0,0 +1,55 @@
+import asyncio
+import time
+import numpy as np
+
+
+class AsyncInstrument:
+    """ Asyncio facade of a blocking driver (e.g. sr830, smu236, dmm2182a, Lakeshore336, mercuryitc, dc205). Every
+    method of the driver is available as a coroutine function, run in a worker thread, so that a measurement script can
+    await reads, ramps and waits of several instruments at once, e.g.
+
+        lockin, tc = AsyncInstrument(sr830(visa_1)), AsyncInstrument(Lakeshore336(visa_2))
+        (x, y), temperature = await asyncio.gather(lockin.read(), tc.read_temperature("a"))
+
+    Calls to the same instrument are serialized by a lock, since the drivers are not thread safe. Attributes which are
+    not methods are returned as they are. """
+
+    def __init__(self, driver):
+        self.driver = driver  # blocking driver object
+        self.lock = asyncio.Lock()
+
+    def __getattr__(self, name):
+        attribute = getattr(self.driver, name)
+        if not callable(attribute):
+            return attribute
+
+        async def method(*args, **kwargs):
+            async with self.lock:
+                return await asyncio.to_thread(attribute, *args, **kwargs)
+
+        method.__name__ = name
+        return method
+
+    async def ramp(self, setter, start, stop, n_step=100, rate=1.0, args=()):
+        """ Ramp a level from 'start' to 'stop' in 'n_step' points at 'rate' (in unit/s), calling the driver method
+        'setter' (name, e.g. "set_output_level") with the positional arguments 'args' followed by the level. Unlike the
+        blocking sweep functions of the drivers, the instrument is released between the points, and the points are
+        scheduled on a monotonic clock, so the ramp time does not drift with the bus latency. """
+        set_level = getattr(self, setter)
+        levels = np.linspace(start, stop, n_step)
+        step_time = abs(stop - start) / max(n_step - 1, 1) / rate
+        t_start = time.monotonic()
+        for idx, level in enumerate(levels):
+            await asyncio.sleep(max(0.0, t_start + idx * step_time - time.monotonic()))
+            await set_level(*args, level)
+
+    async def poll(self, reader, interval, args=()):
+        """ Call the driver method 'reader' (name, e.g. "read_temperature") with the positional arguments 'args' every
+        'interval' (in s), and yield the tuples (timestamp, reading). """
+        read = getattr(self, reader)
+        t_start = time.monotonic()
+        idx = 0
+        while True:
+            yield time.time(), await read(*args)
+            idx += 1
+            await asyncio.sleep(max(0.0, t_start + idx * interval - time.monotonic()))
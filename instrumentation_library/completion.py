@@ -0,0 +1,78 @@
+""" Completion functions: wait for an instrument to be done (service request, status byte, operation complete, ADwin
+process) and return the moment it is, or raise TimeoutError after 'timeout' (in s). A timeout of None waits forever. """
+
+import time
+import pyvisa
+
+
+def wait_until(condition, timeout=None, interval=1e-3, idle=None):
+    """ Call 'condition' every 'interval' (in s) until it returns True. If 'idle' is given (e.g. lambda: plt.pause(1e-3)
+    to keep figures responsive), it is called between the calls instead of sleeping. """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not condition():
+        if deadline is not None and time.monotonic() > deadline:
+            raise TimeoutError(f"Condition not met within {timeout} s.")
+        if idle is not None:
+            idle()
+        else:
+            time.sleep(interval)
+
+
+def wait_for_srq(visa, timeout=None):
+    """ Wait until the instrument asserts a service request (the status byte is then read by pyvisa). """
+    try:
+        visa.wait_for_srq(timeout=None if timeout is None else int(timeout * 1e3))
+    except pyvisa.errors.VisaIOError as error:
+        if error.error_code == pyvisa.constants.StatusCode.error_timeout:
+            raise TimeoutError(f"No service request from {visa.resource_name} within {timeout} s.") from error
+        raise
+
+
+def wait_for_status(visa, mask, timeout=None, interval=1e-3):
+    """ Serial poll the instrument until any bit of 'mask' is set in the status byte, and return the status byte. A serial
+    poll does not go through the instrument message parser, so it is cheaper than a query and can be sent while the
+    instrument is busy. """
+    status = [0]
+
+    def ready():
+        status[0] = visa.read_stb()
+        return status[0] & mask
+
+    try:
+        wait_until(ready, timeout, interval)
+    except TimeoutError:
+        raise TimeoutError(f"Status byte of {visa.resource_name} did not match {mask:#04x} within {timeout} s.")
+    return status[0]
+
+
+def wait_for_opc(visa, timeout=None):
+    """ Wait until all the pending operations of the instrument are complete (*OPC?), with the VISA timeout set to
+    'timeout' for the query. """
+    visa_timeout = visa.timeout
+    visa.timeout = None if timeout is None else int(timeout * 1e3)
+    try:
+        visa.query("*OPC?")
+    except pyvisa.errors.VisaIOError as error:
+        if error.error_code == pyvisa.constants.StatusCode.error_timeout:
+            raise TimeoutError(f"Operations of {visa.resource_name} not complete within {timeout} s.") from error
+        raise
+    finally:
+        visa.timeout = visa_timeout
+
+
+def wait_for_process(adw, process_number, timeout=None, interval=1e-3, idle=None):
+    """ Wait until the ADwin process 'process_number' has stopped (the ADwin cannot interrupt the host, so the process
+    status is polled every 'interval'). """
+    try:
+        wait_until(lambda: adw.Process_Status(process_number) == 0, timeout, interval, idle)
+    except TimeoutError:
+        raise TimeoutError(f"ADwin process {process_number} still running after {timeout} s.")
+
+
+def wait_for_par(adw, number, value, timeout=None, interval=1e-3, idle=None):
+    """ Wait until the ADwin global parameter Par_'number' equals 'value' (e.g. a flag set by a process when a block of
+    data is ready). """
+    try:
+        wait_until(lambda: adw.Get_Par(number) == value, timeout, interval, idle)
+    except TimeoutError:
+        raise TimeoutError(f"ADwin Par_{number} not equal to {value} after {timeout} s.")
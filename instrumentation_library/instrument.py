@@ -0,0 +1,296 @@
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class BusQueue:
+    """ Command queue of one bus (GPIB board, serial port...), shared by all the instruments on it, e.g. the lock-ins at
+    GPIB0::1 and GPIB0::2 and the SMUs at GPIB0::3 and GPIB0::4 share the queue of GPIB0.
+
+    A worker thread sends the operations on the bus one at a time, in the order in which they were queued for each
+    instrument. An instrument which must not be addressed yet (see Instrument.delays) is skipped, and the operations of
+    the other instruments proceed meanwhile, so the bus is never idle on a fixed sleep. Writes are pipelined: the driver
+    does not wait for them to be sent. """
+
+    queues = {}  # [dict] {bus: BusQueue}
+    queues_lock = threading.Lock()
+
+    def __init__(self, bus):
+        self.bus = bus  # [str] bus name, e.g. "GPIB0"
+        self.pending = {}  # [dict] {instrument: deque of (sequence, future, function, args, kwargs)}
+        self.ready = {}  # [dict] {instrument: time (monotonic, in s) from which it can be addressed again}
+        self.sequence = 0  # [int] order of the queued operations
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.work, name="bus {}".format(bus), daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def get(cls, bus):
+        """ Return the queue of 'bus', created at the first call. """
+        with cls.queues_lock:
+            if bus not in cls.queues:
+                cls.queues[bus] = cls(bus)
+            return cls.queues[bus]
+
+    @staticmethod
+    def bus_name(visa):
+        """ Return the bus of a VISA session, i.e. the board prefix of its resource name ("GPIB0::1::INSTR" -> "GPIB0").
+        Sessions without a resource name get a bus of their own. """
+        name = getattr(visa, "resource_name", None)
+        return name.split("::")[0].upper() if isinstance(name, str) else "session {}".format(id(visa))
+
+    def submit(self, instrument, function, *args, **kwargs):
+        """ Queue the call function(*args, **kwargs) for 'instrument' and return a Future of its result. """
+        future = Future()
+        with self.condition:
+            self.sequence += 1
+            self.pending.setdefault(instrument, deque()).append((self.sequence, future, function, args, kwargs))
+            self.condition.notify()
+        return future
+
+    def next(self):
+        # wait for the oldest operation whose instrument can be addressed, and take it out of the queue
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                ready = [(x[0][0], instrument) for instrument, x in self.pending.items()
+                         if x and self.ready.get(instrument, 0.0) <= now]
+                if ready:
+                    instrument = min(ready, key=lambda x: x[0])[1]
+                    return instrument, self.pending[instrument].popleft()
+                waiting = [self.ready[instrument] - now for instrument, x in self.pending.items() if x]
+                self.condition.wait(min(waiting) if waiting else None)
+
+    def work(self):
+        # body of the worker thread
+        while True:
+            instrument, (sequence, future, function, args, kwargs) = self.next()
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(function(*args, **kwargs))
+            except BaseException as error:
+                future.set_exception(error)
+
+    def hold(self, instrument, delay):
+        """ Do not address 'instrument' for 'delay' (in s) from now. Called by the worker after an operation. """
+        if delay > 0:
+            with self.condition:
+                self.ready[instrument] = time.monotonic() + delay
+
+
+class QueuedSession:
+    """ Wrapper of a VISA session whose transfers (write, query, read...) go through the queue of its bus (BusQueue), for
+    the drivers not built on Instrument: a driver keeps its calls and sleeps, but is never on the bus at the same time
+    as the worker of a queued driver, e.g. a 2182A next to SMUs on GPIB0:
+
+        self.visa = QueuedSession(visa)
+
+    Each transfer waits for its turn and returns its result, so the driver runs as before. The sleeps of the driver are
+    spent outside the queue, and the other instruments of the bus are served meanwhile. Waiting for a service request
+    does not use the bus and is not queued. Every other attribute (timeout, read_termination...) is the session's. """
+
+    transfers = ("write", "read", "query", "read_raw", "read_bytes", "query_ascii_values", "query_binary_values",
+                 "read_stb", "clear", "assert_trigger")
+
+    def __init__(self, visa):
+        object.__setattr__(self, "visa", visa)
+        object.__setattr__(self, "bus", BusQueue.get(BusQueue.bus_name(visa)))
+
+    def __getattr__(self, name):
+        attribute = getattr(self.visa, name)
+        if name not in self.transfers:
+            return attribute
+        return lambda *args, **kwargs: self.bus.submit(self, attribute, *args, **kwargs).result()
+
+    def __setattr__(self, name, value):
+        setattr(self.visa, name, value)
+
+
+class Instrument:
+    """ Base class of the VISA drivers. Commands are sent through the queue of the bus of the instrument (BusQueue):
+
+        write(command)              queue a command and return at once (pipelined)
+        query(command)              queue a query after the pending commands and return the answer
+        query_raw(command)          queue a query and return the raw answer (binary transfers)
+        query_batch(queries)        send several queries on one line when the instrument allows it
+        call(function, ...)         run any other VISA operation (read_raw, clear...) in the queue
+        sync()                      wait until the queued commands are sent
+        batch()                     context manager sending the writes of a block on as few lines as possible
+
+    Instead of sleeping after every command, the instrument is not addressed for delays[mnemonic] (in s) after the
+    commands which need it (e.g. a reset), the mnemonics being the groups of letters of the command ("*RST", or "J" in
+    "J0X"). 'wait' (in s) is the delay after any other command (0 by default). An error raised by a pipelined write
+    is raised by the next query, call or sync.
+
+    A driver can be used from several threads (e.g. a stream read by a thread while the main thread sets the unit):
+    the writes deferred by batch() belong to the thread which opened the block, and the operations of each thread are
+    queued in order.
+
+    Drivers built on this class: srs_sr830.sr830 and keithley_smu236.smu236. The other VISA drivers (dmm2182a, dmm2000,
+    dc205, tc336, tds2002, 4294a...) keep a sleep after each command, and send their transfers through the same bus
+    queue with a QueuedSession, so that each bus has one writer. """
+
+    separator = ";"  # [str] separator of the commands sent on one line. None: one command per line
+    query_separator = ";"  # [str] separator of the answers of the queries sent on one line. None: one query per line
+    max_line = 255  # [int] maximum length of a command line (in characters)
+    max_queries = 32  # [int] maximum number of queries on one line
+    delays = {}  # [dict] {mnemonic: delay (in s) before the instrument can be addressed again}
+
+    def __init__(self, visa, wait=0.0, delays=None):
+        self.visa = visa
+        self.wait = wait  # [float] delay (in s) after the commands without an entry in 'delays'
+        self.delays = {**self.delays, **(delays or {})}
+        self.bus = BusQueue.get(BusQueue.bus_name(visa))
+        self.local = threading.local()  # [threading.local] state of each thread using the driver (pending)
+        self.lock = threading.Lock()  # guards last and error, shared by the threads
+        self.last = None  # [Future] last operation queued
+        self.error = None  # [Exception] error raised by a pipelined write, raised at the next synchronization
+
+    @property
+    def pending(self):
+        # [list] commands of the current thread waiting to be sent on one line (None when writes are not deferred)
+        return getattr(self.local, "pending", None)
+
+    @pending.setter
+    def pending(self, value):
+        self.local.pending = value
+
+    '''----- Communication functions -----'''
+
+    def delay(self, command):
+        # return the delay (in s) after 'command', or after the longest of the commands on a line
+        if not self.delays:
+            return self.wait
+        delays = [self.delays.get(x, self.wait) for x in re.findall(r"\*?[A-Za-z]+", command)]
+        return max(delays, default=self.wait)
+
+    def send(self, function, *args, hold=0.0, **kwargs):
+        # queue function(*args, **kwargs), after which the instrument is not addressed for 'hold' (in s)
+        def operation():
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.bus.hold(self, hold)
+
+        with self.lock:
+            self.last = self.bus.submit(self, operation)
+            return self.last
+
+    def check(self, future):
+        # keep the error of a pipelined write, to be raised at the next synchronization
+        if future.exception() is not None:
+            with self.lock:
+                if self.error is None:
+                    self.error = future.exception()
+
+    def raise_error(self):
+        with self.lock:
+            error, self.error = self.error, None
+        if error is not None:
+            raise error
+
+    def write(self, command):
+        # queue a command, or defer it when writes are batched (see "batch")
+        if self.pending is not None:
+            self.pending.append(command)
+        else:
+            self.send(self.visa.write, command, hold=self.delay(command)).add_done_callback(self.check)
+
+    def flush(self):
+        # queue the deferred commands on as few lines as possible, or one per line if the instrument does not accept
+        # several commands on a line
+        if not self.pending:
+            return
+        commands, self.pending = self.pending, None
+        try:
+            if self.separator is None:
+                for command in commands:
+                    self.write(command)
+                return
+            line = ""
+            for command in commands:
+                if line and len(line) + len(command) + len(self.separator) > self.max_line:
+                    self.write(line)
+                    line = ""
+                line = "{}{}{}".format(line, self.separator, command) if line else command
+            self.write(line)
+        finally:
+            self.pending = []
+
+    @contextmanager
+    def batch(self):
+        # defer the writes issued inside the block and send them on as few lines as possible when the block is left,
+        # e.g.
+        # with lockin.batch():
+        #     lockin.set_frequency(17)
+        #     lockin.set_sensitivity(1e-3)
+        if self.pending is not None:
+            yield self  # nested block: the outermost block sends the commands
+            return
+        self.pending = []
+        try:
+            yield self
+            self.flush()
+        finally:
+            self.pending = None
+
+    def call(self, function, *args, hold=None, **kwargs):
+        # run a VISA operation (e.g. self.visa.read_raw) after the pending commands and return its result. The
+        # instrument is then not addressed for 'hold' (in s, 'wait' if None)
+        self.flush()
+        future = self.send(function, *args, hold=self.wait if hold is None else hold, **kwargs)
+        result = future.result()
+        self.raise_error()
+        return result
+
+    def sync(self):
+        # wait until the queued commands are sent, e.g. before waiting for a service request
+        self.flush()
+        with self.lock:
+            last = self.last
+        if last is not None:
+            last.exception()
+        self.raise_error()
+
+    def query(self, command):
+        # send a query, after the pending commands, and return the answer
+        return self.call(self.visa.query, command, hold=self.delay(command)).strip("\n")
+
+    def query_raw(self, command, count=None):
+        # send a query and return the raw answer (bytes): all of it, or 'count' bytes (e.g. a binary block without
+        # terminator)
+        return self.call(self.read_raw_answer, command, count, hold=self.delay(command))
+
+    def read_raw_answer(self, command, count):
+        self.visa.write(command)
+        return self.visa.read_raw() if count is None else self.visa.read_bytes(count)
+
+    def query_batch(self, queries):
+        # send several queries on one command line and return the answers in the same order. Instruments which answer
+        # one query per line get the queries one after the other, queued at once
+        queries = list(queries)
+        if not queries:
+            return []
+        self.flush()
+        if self.query_separator is None:
+            futures = [self.send(self.visa.query, x, hold=self.delay(x)) for x in queries]
+            answers = [x.result().strip("\n") for x in futures]
+            self.raise_error()
+            return answers
+        answers = []
+        for idx in range(0, len(queries), self.max_queries):
+            answers += self.call(self.read_answers, queries[idx: idx + self.max_queries])
+        return answers
+
+    def read_answers(self, queries):
+        # send queries on one line and read their answers, which may come on one or several lines
+        self.visa.write(self.separator.join(queries))
+        answers = []
+        while len(answers) < len(queries):
+            answers += [x for x in re.split("[{}\n]".format(re.escape(self.query_separator)), self.visa.read().strip())
+                        if x != ""]
+        return answers
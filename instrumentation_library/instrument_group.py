@@ -0,0 +1,38 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class InstrumentGroup:
+    """ Read several instruments concurrently. Each reader is a callable (typically a bound driver method, e.g.
+    smu.read) talking to its own VISA session. The readers run in a thread pool, so the waits of the drivers overlap and
+    the duration of a group read is that of the slowest instrument, instead of the sum. """
+
+    def __init__(
+            self,
+            readers: list
+    ):
+        self.readers = list(readers)  # [list] callables, each returning the reading of one instrument
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.readers)))
+        self.duration = None  # [float] duration (in s) of the last group read
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def read(self):
+        """ Call all the readers concurrently and return the tuple (timestamp, reading 1, reading 2, ...), with the
+        readings in the order of the readers. The timestamp (in s since the epoch) is the midpoint of the group read.
+        The exception raised by a reader, if any, is raised once all the readers are done. """
+        t_start = time.time()
+        futures = [self.executor.submit(reader) for reader in self.readers]
+        wait(futures)
+        readings = [future.result() for future in futures]
+        t_stop = time.time()
+        self.duration = t_stop - t_start
+        return ((t_start + t_stop) / 2, *readings)
+
+    def close(self):
+        """ Shut down the thread pool, waiting for the pending reads. """
+        self.executor.shutdown(wait=True)
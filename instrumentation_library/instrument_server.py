@@ -0,0 +1,104 @@
+import importlib
+import threading
+import pyvisa
+from multiprocessing.managers import BaseManager
+
+
+# Local address and authentication key of the instrument server
+ADDRESS = ("127.0.0.1", 50100)
+AUTHKEY = b"lab-quantum-devices"
+
+
+class DriverRegistry:
+    """ The drivers owned by the instrument server, by name. A driver is created (and the instrument reset, booted,
+    loaded...) the first time it is opened; afterwards the same driver, with its VISA session or ADwin state, is served
+    to every client. """
+
+    def __init__(self, resource_manager=None):
+        self.resource_manager = resource_manager  # pyvisa resource manager, created at the first VISA driver
+        self.drivers = {}
+        self.lock = threading.Lock()
+
+    def open(self, name, module, driver_class, resource=None, args=(), kwargs=None):
+        """ Create the driver 'name' as module.driver_class(visa, *args, **kwargs), visa being the session of
+        'resource' (or as module.driver_class(*args, **kwargs) if 'resource' is None, e.g. for the ADwin), unless it
+        already exists. Return True if the driver was created. """
+        with self.lock:
+            if name in self.drivers:
+                return False
+            cls = getattr(importlib.import_module(module), driver_class)
+            if resource is None:
+                self.drivers[name] = cls(*args, **(kwargs or {}))
+            else:
+                if self.resource_manager is None:
+                    self.resource_manager = pyvisa.ResourceManager()
+                self.drivers[name] = cls(self.resource_manager.open_resource(resource), *args, **(kwargs or {}))
+            return True
+
+    def get(self, name):
+        with self.lock:
+            return self.drivers[name]
+
+    def names(self):
+        with self.lock:
+            return list(self.drivers)
+
+    def close(self, name):
+        """ Close the VISA session of driver 'name' (if any) and remove it. """
+        with self.lock:
+            driver = self.drivers.pop(name)
+            if hasattr(driver, "visa"):
+                driver.visa.close()
+
+
+class InstrumentServer(BaseManager):
+    """ Manager serving the driver registry, in the server process. """
+
+
+class InstrumentClient(BaseManager):
+    """ Manager connecting to the instrument server. """
+
+
+InstrumentClient.register("registry")
+InstrumentClient.register("instrument")
+
+
+def serve(address=ADDRESS, authkey=AUTHKEY, resource_manager=None):
+    """ Run the instrument server until interrupted. Each client connection is served by a thread: only one client at a
+    time should use a given instrument. """
+    registry = DriverRegistry(resource_manager)
+    InstrumentServer.register("registry", callable=lambda: registry)
+    InstrumentServer.register("instrument", callable=registry.get)
+    server = InstrumentServer(address, authkey).get_server()
+    print(f"Instrument server listening on {address[0]}:{address[1]}.")
+    server.serve_forever()
+
+
+def connect(address=ADDRESS, authkey=AUTHKEY):
+    """ Connect to the instrument server. Raise ConnectionRefusedError if it is not running. """
+    client = InstrumentClient(address, authkey)
+    client.connect()
+    return client
+
+
+def open_instrument(name, module, driver_class, resource=None, *args, client=None, **kwargs):
+    """ Return the driver 'name' from the instrument server, creating it there if needed, e.g.
+
+        lockin = open_instrument("lockin1", "srs_sr830", "sr830", "GPIB0::8::INSTR")
+        adc = open_instrument("adc", "adwin_gold_ii", "ADwinGoldII", None, boot_dir, routines_dir, process=[...])
+
+    The returned proxy forwards the method calls (not the attributes) to the driver in the server. If the server is not
+    running, the driver is created locally, as usual. """
+    try:
+        client = connect() if client is None else client
+    except ConnectionRefusedError:
+        cls = getattr(importlib.import_module(module), driver_class)
+        if resource is None:
+            return cls(*args, **kwargs)
+        return cls(pyvisa.ResourceManager().open_resource(resource), *args, **kwargs)
+    client.registry().open(name, module, driver_class, resource, args, kwargs)
+    return client.instrument(name)
+
+
+if __name__ == "__main__":
+    serve()
@@ -1,6 +1,8 @@
 import numpy as np
 import time
+import completion
 from collections import defaultdict
+from instrument import QueuedSession
 
 
 class dmm2000():
@@ -15,12 +17,14 @@ class dmm2000():
             scpi_r[key][subval] = subkey
 
     def __init__(self, visa):
-        # create a local registry
-        self.visa = visa
+        # create a local registry of the last written / read settings. Readers are served from the registry, and setters
+        # skip redundant writes
+        self.visa = QueuedSession(visa)
+        self.registry = {}
         self.model = self.read_model()
 
         # reset the dmm to default settings
-        self.visa.write("*rst")
+        self.reset()
 
         # clears the following enable registers: Operation Event Enable Register, Questionable Event Enable Register,
         # and measurement Event Enable Register
@@ -41,127 +45,211 @@ class dmm2000():
         # of the measurement Event Enable Register, send the following command:stat:meas:enab 544 where BFL (bit B9) = Decimal = 512
         # and RAV (bit B5) = Decimal = 32, so that <NRf> = 512 + 32 = 544
         # *sre 1 activate the MSB enable register (BFL and RAV belong to MSB register)
-        self.visa.write("status:measurement:enable {}; *sre 1".format(register))
+        if self.registry.get("status register") != register:
+            self.visa.write("status:measurement:enable {}; *sre 1".format(register))
+            self.registry["status register"] = register
 
     def set_sense_function(self, function="dc:volt"):
         # set sense to voltage dc. # Note: the apexes '' are required
-        self.visa.write("sense:function '{}'".format(function))
+        if self.registry.get("sense function") != function:
+            self.visa.write("sense:function '{}'".format(function))
+            self.registry["sense function"] = function
 
     def set_digits(self, digits, sense_function):
         # set resolution to seven digits (affects the display only)
-        self.visa.write("sense:{}:digits {}".format(sense_function, digits))
+        if self.registry.get(("digits", sense_function)) != digits:
+            self.visa.write("sense:{}:digits {}".format(sense_function, digits))
+            self.registry[("digits", sense_function)] = digits
 
     def set_sense_range(self, sense_range, sense_function):
         # set the range between 0.1, 1, 10, 100 volts
-        self.visa.write("sense:{}:range {}".format(sense_function, sense_range))
+        if self.registry.get(("sense range", sense_function)) != sense_range:
+            self.visa.write("sense:{}:range {}".format(sense_function, sense_range))
+            self.registry[("sense range", sense_function)] = sense_range
 
     def set_nplc(self, nplc, sense_function):
         # set number of n_plc between 0.01 (200 us) and 10 (200 ms)
-        self.visa.write("sense:{}:nplcycles {}".format(sense_function, nplc))
+        if self.registry.get(("nplc", sense_function)) != nplc:
+            self.visa.write("sense:{}:nplcycles {}".format(sense_function, nplc))
+            self.registry[("nplc", sense_function)] = nplc
 
     def set_filter_state(self, state, sense_function):
         # enable (1)/disable (0) digital filter
-        self.visa.write("sense:{}:average:state {}".format(sense_function, self.scpi_w["filter_status"][state]))
+        if self.registry.get(("filter status", sense_function)) != state:
+            self.visa.write("sense:{}:average:state {}".format(sense_function, self.scpi_w["filter_status"][state]))
+            self.registry[("filter status", sense_function)] = state
 
     def set_filter_type(self, type, sense_function):
         # set digital filter to moving (MOV)/ repeat REP). Note: if the repeat filter is enabled, then the instrument samples the
         # specified number of reading conversions to yield a single filtered reading. If the moving filter is active, or filter is
         # disabled, then only one reading conversion is performed.
-        self.visa.write("sense:{}:average:tcontrol {}".format(sense_function, self.scpi_w["filter_type"][type]))
+        if self.registry.get(("filter type", sense_function)) != type:
+            self.visa.write("sense:{}:average:tcontrol {}".format(sense_function, self.scpi_w["filter_type"][type]))
+            self.registry[("filter type", sense_function)] = type
 
     def set_filter_samples(self, n, sense_function):
         # set number of digital samples to average between 1 and 100
         # Note: each measurement will take the time 20 ms * NPLC * filter samples
-        self.visa.write("sense:{}:average:count {}".format(sense_function, n))
+        if self.registry.get(("filter samples", sense_function)) != n:
+            self.visa.write("sense:{}:average:count {}".format(sense_function, n))
+            self.registry[("filter samples", sense_function)] = n
 
     def set_bandwidth(self, bandwidth):
         # set the bandwidth of the dmm
         sense = self.read_sense_function()
-        self.visa.write("sense:{}:detector:bandwidth {}".format(sense, bandwidth))
+        if self.registry.get(("bandwidth", sense)) != bandwidth:
+            self.visa.write("sense:{}:detector:bandwidth {}".format(sense, bandwidth))
+            self.registry[("bandwidth", sense)] = bandwidth
 
     def set_trigger_count(self, n):
         # set the number of trigger events expected by the dmm before going back to idle.
         # Note: in order to prevent the dmm to go into idle, set count to "infinity"
-        self.visa.write("trigger:count {}".format(n))
+        if self.registry.get("trigger count") != n:
+            self.visa.write("trigger:count {}".format(n))
+            self.registry["trigger count"] = n
 
     def set_trigger_source(self, source):
         # set control source to IMMediate/TIMer/MANual/BUS/EXTernal.
         # Note: to send a trigger via software, set the trigger source to bus and use the command *TRG or GET to send the trigger
-        self.visa.write("trigger:source {}".format(source))
+        if self.registry.get("trigger source") != source:
+            self.visa.write("trigger:source {}".format(source))
+            self.registry["trigger source"] = source
 
     def set_trigger_delay_auto(self, auto):
         # set trigger delay auto to ON or OFF
-        self.visa.write("trigger:delay:auto {}".format(auto))
+        if self.registry.get("trigger delay auto") != auto:
+            self.visa.write("trigger:delay:auto {}".format(auto))
+            self.registry["trigger delay auto"] = auto
 
     def set_sample_count(self, n):
         # set the number of samples between 1 and 1024 to acquire before the next trigger
         # event. Note: if sample count is > 1 then acquisition should be saved in the buffer and recalled by reading the buffer
-        self.visa.write("sample:count {}".format(n))
+        if self.registry.get("sample count") != n:
+            self.visa.write("sample:count {}".format(n))
+            self.registry["sample count"] = n
 
     def set_buffer_size(self, n):
         # set the maximum number of data points to store in buffer between 2 and 1024
-        self.visa.write("trace:points {}".format(n))
+        if self.registry.get("buffer size") != n:
+            self.visa.write("trace:points {}".format(n))
+            self.registry["buffer size"] = n
+
+    def set_buffer_feed(self, feed):
+        # set the source of the data saved in buffer: sense1 (measured data), calculate1 (math results) or none
+        if self.registry.get("buffer feed") != feed:
+            self.visa.write("trace:feed {}".format(feed))
+            self.registry["buffer feed"] = feed
+
+    def set_data_format(self, data_format):
+        # set the format of the data sent over the bus: ascii, sreal (4 bytes IEEE754 single) or dreal (8 bytes double)
+        if self.registry.get("data format") != data_format:
+            self.visa.write("format:data {}".format(data_format))
+            self.registry["data format"] = data_format
+
+    def set_byte_order(self, order):
+        # set the byte order of the binary formats: normal (big endian) or swapped (little endian)
+        if self.registry.get("byte order") != order:
+            self.visa.write("format:border {}".format(order))
+            self.registry["byte order"] = order
 
     '''----- Read functions -----'''
 
     def read_status_register(self):
         # read the enabled status register
-        return self.visa.query("status:measurement:enable?").strip("\n")
+        if "status register" not in self.registry:
+            self.registry["status register"] = int(self.visa.query("status:measurement:enable?").strip("\n"))
+        return self.registry["status register"]
 
     def read_sense_function(self):
         # read voltage dc. # Note: the apexes '' are required
-        return self.visa.query("sense:function?").strip("\n").lower().strip('"')
+        if "sense function" not in self.registry:
+            self.registry["sense function"] = self.visa.query("sense:function?").strip("\n").lower().strip('"')
+        return self.registry["sense function"]
 
     def read_digits(self, sense_function):
         # read display resolution
-        return self.visa.query("sense:{}:digits?".format(sense_function)).strip("\n")
+        if ("digits", sense_function) not in self.registry:
+            self.registry[("digits", sense_function)] = int(self.visa.query("sense:{}:digits?".format(sense_function)).strip("\n"))
+        return self.registry[("digits", sense_function)]
 
     def read_sense_range(self, sense_function):
         # read the sense range
-        return self.visa.query("sense:{}:range?".format(sense_function)).strip("\n")
+        if ("sense range", sense_function) not in self.registry:
+            self.registry[("sense range", sense_function)] = float(self.visa.query("sense:{}:range?".format(sense_function)).strip("\n"))
+        return self.registry[("sense range", sense_function)]
 
     def read_nplc(self, sense_function):
         # read number of n_plc
-        return self.visa.query("sense:{}:nplcycles?".format(sense_function)).strip("\n")
+        if ("nplc", sense_function) not in self.registry:
+            self.registry[("nplc", sense_function)] = float(self.visa.query("sense:{}:nplcycles?".format(sense_function)).strip("\n"))
+        return self.registry[("nplc", sense_function)]
 
     def read_filter_status(self, sense_function):
         # read digital filter status
-        return self.scpi_r["filter_status"][self.visa.query("sense:{}:average:state?".format(sense_function)).strip("\n")]
+        if ("filter status", sense_function) not in self.registry:
+            self.registry[("filter status", sense_function)] = self.scpi_r["filter_status"][self.visa.query("sense:{}:average:state?".format(sense_function)).strip("\n")]
+        return self.registry[("filter status", sense_function)]
 
     def read_filter_type(self, sense_function):
         # read digital filter type
-        return self.scpi_r["filter_type"][self.visa.query("sense:{}:average:tcontrol?".format(sense_function)).lower().strip("\n")]
+        if ("filter type", sense_function) not in self.registry:
+            self.registry[("filter type", sense_function)] = self.scpi_r["filter_type"][self.visa.query("sense:{}:average:tcontrol?".format(sense_function)).lower().strip("\n")]
+        return self.registry[("filter type", sense_function)]
 
     def read_filter_samples(self, sense_function):
         # read number of digital samples averaged
-        return self.visa.query("sense:{}:average:count?".format(sense_function)).strip("\n")
+        if ("filter samples", sense_function) not in self.registry:
+            self.registry[("filter samples", sense_function)] = int(self.visa.query("sense:{}:average:count?".format(sense_function)).strip("\n"))
+        return self.registry[("filter samples", sense_function)]
 
     def read_bandwidth(self, sense_function):
         # read dmm bandwidth
-        return self.visa.query("sense:{}:detector:bandwidth?".format(sense_function)).strip("\n")
+        if ("bandwidth", sense_function) not in self.registry:
+            self.registry[("bandwidth", sense_function)] = float(self.visa.query("sense:{}:detector:bandwidth?".format(sense_function)).strip("\n"))
+        return self.registry[("bandwidth", sense_function)]
 
     def read_trigger_count(self):
         # read the number of trigger events expected by the dmm before going back to idle.
-        return self.visa.query("trigger:count?").strip("\n")
+        if "trigger count" not in self.registry:
+            self.registry["trigger count"] = self.visa.query("trigger:count?").strip("\n")
+        return self.registry["trigger count"]
 
     def read_trigger_source(self):
         # read trigger control source
-        return self.visa.query("trigger:source?").lower().strip("\n")
+        if "trigger source" not in self.registry:
+            self.registry["trigger source"] = self.visa.query("trigger:source?").lower().strip("\n")
+        return self.registry["trigger source"]
 
     def read_trigger_delay_auto(self):
         # set trigger delay auto to ON or OFF
-        return self.visa.query("trigger:delay:auto?").strip("\n")
+        if "trigger delay auto" not in self.registry:
+            self.registry["trigger delay auto"] = self.visa.query("trigger:delay:auto?").strip("\n")
+        return self.registry["trigger delay auto"]
 
     def read_sample_count(self):
         # read the number of samples to acquire before the next trigger
-        return self.visa.query("sample:count?").strip("\n")
+        if "sample count" not in self.registry:
+            self.registry["sample count"] = int(self.visa.query("sample:count?").strip("\n"))
+        return self.registry["sample count"]
 
     def read_buffer_size(self):
         # read the maximum number of data points that can be stored in buffer
-        return self.visa.query("trace:points?").strip("\n")
+        if "buffer size" not in self.registry:
+            self.registry["buffer size"] = int(self.visa.query("trace:points?").strip("\n"))
+        return self.registry["buffer size"]
+
+    def resync(self):
+        # discard the registry and read the settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return self.get_settings()
 
     '''----- Operation functions -----'''
 
+    def reset(self):
+        # reset the dmm to default settings and forget the registry
+        self.visa.write("*rst")
+        self.registry = {}
+
     def abort(self):
         # put dmm into idle
         self.visa.write("abort")
@@ -178,37 +266,72 @@ class dmm2000():
 
     def read(self):
         # perform :abort, :initiate and :fetch. Cannot be used if sample count is > 1
-        return float(self.visa.query("sense:data?"))
+        return float(self.query_values("sense:data?")[0])
         # return dmm.query("fetch?")
 
+    def read_point(self):
+        # trigger one reading over the bus and return it as soon as the conversion is done. The dmm must be initiated
+        # with trigger source bus (see "program_measure_on_trigger" and "arm"). No setting is written
+        self.visa.write("*trg")
+        return float(self.query_values("sense:data:fresh?")[0])
+
+    def arm(self):
+        # clear buffer and event registers, start filling the buffer upon the next trigger and take the dmm out of
+        # idle. With trigger source immediate the readings start at once
+        self.visa.write("trace:clear; trace:feed:control next; *cls")
+        self.visa.write("initiate")
+
     def read_buffer(self):
-        # return all data stored in buffer
-        return np.array(self.visa.query_ascii_values("trace:data?"))
+        # return all data stored in buffer, in one transfer
+        return self.query_values("trace:data?")
+
+    def query_values(self, query):
+        # send a data query (trace:data?, sense:data?...) and return the readings as an array. The data format applies
+        # to all of them: binary replies are decoded with the format and byte order in the registry
+        data_format = self.registry.get("data format", "ascii")
+        if data_format == "ascii":
+            return np.array(self.visa.query_ascii_values(query))
+        return self.visa.query_binary_values(query, datatype="f" if data_format == "sreal" else "d",
+                                             is_big_endian=self.registry.get("byte order") == "normal", container=np.array)
+
+    def fetch_buffer(self, timeout=25):
+        # wait for the buffer full service request (status register 512) and return all data stored in buffer
+        self.wait_for_srq(timeout)
+        return self.read_buffer()
+
+    def acquire_buffer(self, timeout=25):
+        # arm the measurement programmed by "program_measure_on_trigger" and return the buffer once full. With trigger
+        # source immediate or external the dmm fills the buffer by itself, at the rate set by n_plc and filter samples
+        self.arm()
+        return self.fetch_buffer(timeout)
 
     def read_model(self):
         # returns the manufacturer, model number, serial number and firmware revision levels of the unit
         return self.visa.query("*idn?")
 
-    def wait_for_srq(self):
-        # wait for unit to raise a service request
-        self.visa.wait_for_srq()
+    def wait_for_srq(self, timeout=25):
+        # wait for unit to raise a service request. Raise TimeoutError after "timeout" (in s, the 25 s default of
+        # pyvisa). timeout=None waits forever
+        completion.wait_for_srq(self.visa, timeout)
 
     def clear_event_register(self):
         self.visa.write("*cls")
 
     def get_settings(self):
-        return {"dmm unit": self.read_model(),
-                "sense function": self.read_sense_function(),
-                "sense range": self.read_sense_range(self.read_sense_function()),
-                "n_plc": self.read_nplc(self.read_sense_function()),
-                "filter status": self.read_filter_status(self.read_sense_function()),
-                "filter type": self.read_filter_type(self.read_sense_function()),
-                "filter samples": self.read_filter_samples(self.read_sense_function())}
+        sense_function = self.read_sense_function()
+        return {"dmm unit": self.model,
+                "sense function": sense_function,
+                "sense range": self.read_sense_range(sense_function),
+                "n_plc": self.read_nplc(sense_function),
+                "filter status": self.read_filter_status(sense_function),
+                "filter type": self.read_filter_type(sense_function),
+                "filter samples": self.read_filter_samples(sense_function)}
 
     def program_measure_on_trigger(self, sense_function="voltage:dc", sense_range=0.1, nplc=1, filter_state="off", filter_type="moving", filter_samples=1,
                                    trigger_source="bus", trigger_count="infinity", trigger_delay_auto="on", sample_count=1, buffer_size=1024, digits=7,
-                                   status_register=512, bandwidth=300E3):
-        #
+                                   status_register=512, bandwidth=300E3, data_format="sreal"):
+        # program the measurement once. Set trigger_count = buffer_size to acquire a full buffer (see "acquire_buffer"),
+        # or trigger_count = "infinity" to read point by point (see "read_point")
         self.set_sense_function(sense_function)
         self.set_sense_range(sense_range, sense_function)
         self.set_nplc(nplc, sense_function)
@@ -222,9 +345,11 @@ class dmm2000():
         self.set_buffer_size(buffer_size)
         self.set_digits(digits, sense_function)
         self.set_status_register(status_register)
+        self.set_data_format(data_format)
+        self.set_byte_order("swapped")
 
         # set the source of data saved in buffer as "sense" (measured) data. Other option would be "calculate"
-        self.visa.write("trace:feed sense1")
+        self.set_buffer_feed("sense1")
 
         # start filling the buffer upon receiving the trigger input.
         self.visa.write("trace:feed:control next")
\ No newline at end of file
@@ -1,6 +1,8 @@
 import numpy as np
 import time
+import completion
 from collections import defaultdict
+from instrument import QueuedSession
 
 
 class dmm2182a():
@@ -9,13 +11,16 @@ class dmm2182a():
 
     def __init__(self, visa, wait=0.01):
 
-        self.visa = visa
+        self.visa = QueuedSession(visa)
         self.wait = wait
+        # Last written / read settings. Readers are served from the registry, and setters skip redundant writes
+        self.registry = {}
+        # True while the trigger model is initiated with the current configuration (see "configure" and "arm")
+        self.armed = False
         self.model = self.read_model()
 
         # Restore factory defaults of smu
-        self.visa.write(":syst:pres")
-        self.visa.write("*rst")
+        self.reset()
         # Clears all event registers and Error Queue
         self.clear_measurement_event_register()
 
@@ -25,85 +30,122 @@ class dmm2182a():
 
     def set_function(self, function="'voltage'"):
         # 'voltage' or 'temperature', apex necessary
-        self.visa.write(":sense:function {}".format(function))
-        time.sleep(self.wait)
+        name = function.strip("'\"").lower()
+        if self.registry.get("function") != name:
+            self.visa.write(":sense:function {}".format(function))
+            time.sleep(self.wait)
+            self.registry["function"] = name
 
     def set_channel(self, channel=1):
         # Select channel to measure; 0, 1 or 2 (0 = internal temperature sensor).
-        self.visa.write(":sense:channel {}".format(channel))
-        time.sleep(self.wait)
+        if self.registry.get("channel") != int(channel):
+            self.visa.write(":sense:channel {}".format(channel))
+            time.sleep(self.wait)
+            self.registry["channel"] = int(channel)
 
     def set_range(self, channel=1, sense_range=0.1):
         # Range is the expected reading: 0 to 120 (volts). The 2182a sets the range accordingly to measure the value
-        self.visa.write(":sense:voltage:channel{}:range:upper {}".format(channel, sense_range))
-        time.sleep(self.wait)
+        if self.registry.get(("range", channel)) != float(sense_range):
+            self.visa.write(":sense:voltage:channel{}:range:upper {}".format(channel, sense_range))
+            time.sleep(self.wait)
+            self.registry[("range", channel)] = float(sense_range)
+            self.registry[("autorange", channel)] = "off"  # selecting a range disables autorange
 
     def set_autorange(self, channel=1, state="on"):
-        self.visa.write(":sense:voltage:channel{}:range:auto {}".format(channel, state))
-        time.sleep(self.wait)
+        if self.registry.get(("autorange", channel)) != state:
+            self.visa.write(":sense:voltage:channel{}:range:auto {}".format(channel, state))
+            time.sleep(self.wait)
+            self.registry[("autorange", channel)] = state
+            self.registry.pop(("range", channel), None)
 
     def set_nplc(self, function="voltage", nplc=1):
-        self.visa.write(":sense:{}:nplcycles {}".format(function, nplc))
-        time.sleep(self.wait)
+        if self.registry.get(("nplc", function)) != float(nplc):
+            self.visa.write(":sense:{}:nplcycles {}".format(function, nplc))
+            time.sleep(self.wait)
+            self.registry[("nplc", function)] = float(nplc)
 
     def set_digits(self, function="voltage", digits=8):
-        self.visa.write(":sense:{}:digits {}".format(function, digits))
-        time.sleep(self.wait)
+        if self.registry.get(("digits", function)) != int(digits):
+            self.visa.write(":sense:{}:digits {}".format(function, digits))
+            time.sleep(self.wait)
+            self.registry[("digits", function)] = int(digits)
 
     def set_lpf(self, function="voltage", state="on"):
-        self.visa.write(":sense:{}:lpass:state {}".format(function, state))
-        time.sleep(self.wait)
+        if self.registry.get(("lpf", function)) != state:
+            self.visa.write(":sense:{}:lpass:state {}".format(function, state))
+            time.sleep(self.wait)
+            self.registry[("lpf", function)] = state
 
     def set_filter_state(self, function="voltage", state="on"):
-        self.visa.write(":sense:{}:dfilter:state {}".format(function, state))
-        time.sleep(self.wait)
+        if self.registry.get(("filter state", function)) != state:
+            self.visa.write(":sense:{}:dfilter:state {}".format(function, state))
+            time.sleep(self.wait)
+            self.registry[("filter state", function)] = state
 
     def set_filter_count(self, function="voltage", n=1):
         # n from 1 to 100
-        self.visa.write(":sense:{}:dfilter:count {}".format(function, n))
-        time.sleep(self.wait)
+        if self.registry.get(("filter count", function)) != int(n):
+            self.visa.write(":sense:{}:dfilter:count {}".format(function, n))
+            time.sleep(self.wait)
+            self.registry[("filter count", function)] = int(n)
 
     def set_filter_control(self, function="voltage", control="repeat"):
         # moving or repeat
-        self.visa.write(":sense:{}:dfilter:tcontrol {}".format(function, control))
-        time.sleep(self.wait)
+        if self.registry.get(("filter control", function)) != control:
+            self.visa.write(":sense:{}:dfilter:tcontrol {}".format(function, control))
+            time.sleep(self.wait)
+            self.registry[("filter control", function)] = control
 
     # def set_filter_window(self, function="voltage", window=10):
     #     self.visa.write(":sense:{}:dfilter:window {}".format(function, window))
 
     def set_trigger_source(self, source="bus"):
-        self.visa.write(":trigger:source {}".format(source))
-        time.sleep(self.wait)
+        if self.registry.get("trigger source") != source:
+            self.visa.write(":trigger:source {}".format(source))
+            time.sleep(self.wait)
+            self.registry["trigger source"] = source
 
     def set_trigger_delay(self, delay="default"):
         # delay in seconds from 0 to 999999.99, or default = 100 ms
-        self.visa.write(":trigger:delay {}".format(delay))
-        time.sleep(self.wait)
+        if self.registry.get("trigger delay") != delay:
+            self.visa.write(":trigger:delay {}".format(delay))
+            time.sleep(self.wait)
+            self.registry["trigger delay"] = delay
 
     def set_trigger_autodelay(self, state="on"):
-        self.visa.write(":trigger:delay:auto {}".format(state))
-        time.sleep(self.wait)
+        if self.registry.get("trigger autodelay") != state:
+            self.visa.write(":trigger:delay:auto {}".format(state))
+            time.sleep(self.wait)
+            self.registry["trigger autodelay"] = state
 
     def set_trigger_count(self, n="inf"):
         # from 1 to 9999 or infinite
-        self.visa.write(":trigger:count {}".format(n))
-        time.sleep(self.wait)
+        if self.registry.get("trigger count") != ("infinite" if n == "inf" else float(n)):
+            self.visa.write(":trigger:count {}".format(n))
+            time.sleep(self.wait)
+            self.registry["trigger count"] = "infinite" if n == "inf" else float(n)
 
     def set_sample_count(self, n=1):
-        self.visa.write(":sample:count {}".format(n))
-        time.sleep(self.wait)
+        if self.registry.get("sample count") != n:
+            self.visa.write(":sample:count {}".format(n))
+            time.sleep(self.wait)
+            self.registry["sample count"] = n
 
     def set_initiate_continuous(self, state="on"):
-        self.visa.write(":initiate:continuous {}".format(state))
-        time.sleep(self.wait)
+        if self.registry.get("initiate continuous") != state:
+            self.visa.write(":initiate:continuous {}".format(state))
+            time.sleep(self.wait)
+            self.registry["initiate continuous"] = state
 
     def set_status_measurement_register(self, status=32):
         # Bit B5 (32), Reading Available (RAV) - Set bit indicates that a reading was taken and processed.
         # Bit B7 (128), Buffer Available (BAV) - Set bit indicates that there are at least two readings in the trace buffer.
         # Bit B8 (256), Buffer Half Full (BHF) - Set bit indicates that the trace buffer is half full.
         # Bit B9 (512), Buffer Full (BFL) - Set bit indicates that the trace buffer is full.
-        self.visa.write(":status:measurement:enable {}".format(status))
-        time.sleep(self.wait)
+        if self.registry.get("measurement enable") != status:
+            self.visa.write(":status:measurement:enable {}".format(status))
+            time.sleep(self.wait)
+            self.registry["measurement enable"] = status
 
     def set_sre_register(self, status=1):
         # 0 Clears enable register
@@ -114,73 +156,111 @@ class dmm2182a():
         # 32 Set ESB (Bit 5)
         # 128 Set OSB (Bit 7)
         # 255 Set all bits
-        self.visa.write("*sre {}".format(status))
-        time.sleep(self.wait)
+        if self.registry.get("sre") != status:
+            self.visa.write("*sre {}".format(status))
+            time.sleep(self.wait)
+            self.registry["sre"] = status
+
+    def set_buffer_size(self, n=1024):
+        # number of readings stored in the trace buffer, from 2 to 1024
+        if self.registry.get("buffer size") != int(n):
+            self.visa.write(":trace:points {}".format(n))
+            time.sleep(self.wait)
+            self.registry["buffer size"] = int(n)
+
+    def set_buffer_feed(self, feed="sense"):
+        # source of the readings stored in the trace buffer: sense (raw readings), calculate (math results) or none
+        if self.registry.get("buffer feed") != feed:
+            self.visa.write(":trace:feed {}".format(feed))
+            time.sleep(self.wait)
+            self.registry["buffer feed"] = feed
+
+    def set_data_format(self, data_format="sreal"):
+        # format of the readings sent over the bus: ascii, sreal (4 bytes IEEE754 single) or dreal (8 bytes double)
+        if self.registry.get("data format") != data_format:
+            self.visa.write(":format:data {}".format(data_format))
+            time.sleep(self.wait)
+            self.registry["data format"] = data_format
+
+    def set_byte_order(self, order="swapped"):
+        # byte order of the binary formats: normal (big endian) or swapped (little endian)
+        if self.registry.get("byte order") != order:
+            self.visa.write(":format:border {}".format(order))
+            time.sleep(self.wait)
+            self.registry["byte order"] = order
 
     def set_line_sync(self, state="off"):
-        self.visa.write(":system:lsync {}".format(state))
-        time.sleep(self.wait)
+        if self.registry.get("line sync") != state:
+            self.visa.write(":system:lsync {}".format(state))
+            time.sleep(self.wait)
+            self.registry["line sync"] = state
 
     '''----- Read function -----'''
 
     def read_function(self):
-        val = self.visa.query(":sense:function?").strip("\n").lower()
-        time.sleep(self.wait)
-        return val
+        if "function" not in self.registry:
+            val = self.visa.query(":sense:function?").strip("\n").strip('"').lower()
+            time.sleep(self.wait)
+            self.registry["function"] = {"volt": "voltage", "temp": "temperature"}.get(val, val)
+        return self.registry["function"]
 
     def read_channel(self):
-        val = self.visa.query(":sense:channel?").strip("\n")
-        time.sleep(self.wait)
-        return val
+        if "channel" not in self.registry:
+            self.registry["channel"] = int(self.visa.query(":sense:channel?").strip("\n"))
+            time.sleep(self.wait)
+        return self.registry["channel"]
 
     def read_range(self, channel=1):
-        val = self.visa.query(":sense:voltage:channel{}:range?".format(channel)).strip("\n")
-        time.sleep(self.wait)
-        return val
+        if ("range", channel) not in self.registry:
+            self.registry[("range", channel)] = float(self.visa.query(":sense:voltage:channel{}:range?".format(channel)).strip("\n"))
+            time.sleep(self.wait)
+        return self.registry[("range", channel)]
 
     def read_autorange(self, channel=1):
-        val = self.visa.query(":sense:voltage:channel{}:range:auto?".format(channel)).strip("\n")
-        time.sleep(self.wait)
-        return val
+        if ("autorange", channel) not in self.registry:
+            val = self.visa.query(":sense:voltage:channel{}:range:auto?".format(channel)).strip("\n")
+            time.sleep(self.wait)
+            self.registry[("autorange", channel)] = "on" if val == "1" else "off"
+        return self.registry[("autorange", channel)]
 
     def read_nplc(self, function="voltage"):
-        val = self.visa.query(":sense:{}:n_plc?".format(function)).strip("\n")
-        time.sleep(self.wait)
-        return val
+        if ("nplc", function) not in self.registry:
+            self.registry[("nplc", function)] = float(self.visa.query(":sense:{}:nplcycles?".format(function)).strip("\n"))
+            time.sleep(self.wait)
+        return self.registry[("nplc", function)]
 
     def read_digits(self, function="voltage"):
-        val = self.visa.query(":sense:{}:digits?".format(function)).strip("\n")
-        time.sleep(self.wait)
-        return val
+        if ("digits", function) not in self.registry:
+            self.registry[("digits", function)] = int(self.visa.query(":sense:{}:digits?".format(function)).strip("\n"))
+            time.sleep(self.wait)
+        return self.registry[("digits", function)]
 
     def read_lpf(self, function="voltage"):
-        val = self.visa.query(":sense:{}:lpass:state?".format(function)).strip("\n")
-        time.sleep(self.wait)
-        if val == "1":
-            return "on"
-        if val == "0":
-            return "off"
+        if ("lpf", function) not in self.registry:
+            val = self.visa.query(":sense:{}:lpass:state?".format(function)).strip("\n")
+            time.sleep(self.wait)
+            self.registry[("lpf", function)] = "on" if val == "1" else "off"
+        return self.registry[("lpf", function)]
 
     def read_filter_state(self, function="voltage"):
-        val = self.visa.query(":sense:{}:dfilter:state?".format(function)).strip("\n")
-        time.sleep(self.wait)
-        if val == "1":
-            return "on"
-        if val == "0":
-            return "off"
+        if ("filter state", function) not in self.registry:
+            val = self.visa.query(":sense:{}:dfilter:state?".format(function)).strip("\n")
+            time.sleep(self.wait)
+            self.registry[("filter state", function)] = "on" if val == "1" else "off"
+        return self.registry[("filter state", function)]
 
     def read_filter_control(self, function="voltage"):
-        val = self.visa.query(":sense:{}:dfilter:tcontrol?".format(function)).lower().strip("\n")
-        time.sleep(self.wait)
-        if val == "rep":
-            return "repeat"
-        if val == "mov":
-            return "moving"
+        if ("filter control", function) not in self.registry:
+            val = self.visa.query(":sense:{}:dfilter:tcontrol?".format(function)).lower().strip("\n")
+            time.sleep(self.wait)
+            self.registry[("filter control", function)] = {"rep": "repeat", "mov": "moving"}.get(val)
+        return self.registry[("filter control", function)]
 
     def read_filter_count(self, function="voltage"):
-        val = int(self.visa.query(":sense:{}:dfilter:count?".format(function)).strip("\n"))
-        time.sleep(self.wait)
-        return val
+        if ("filter count", function) not in self.registry:
+            self.registry[("filter count", function)] = int(self.visa.query(":sense:{}:dfilter:count?".format(function)).strip("\n"))
+            time.sleep(self.wait)
+        return self.registry[("filter count", function)]
 
     def read_filter_window(self, function="voltage"):
         val = self.visa.query(":sense:{}:dfilter:window?".format(function)).strip("\n")
@@ -188,30 +268,31 @@ class dmm2182a():
         return val
 
     def read_trigger_source(self):
-        val = self.visa.query(":trigger:source?").lower().strip("\n")
-        time.sleep(self.wait)
-        return val
+        if "trigger source" not in self.registry:
+            val = self.visa.query(":trigger:source?").lower().strip("\n")
+            time.sleep(self.wait)
+            self.registry["trigger source"] = {"imm": "immediate", "ext": "external", "tim": "timer", "man": "manual"}.get(val, val)
+        return self.registry["trigger source"]
 
     def read_trigger_count(self):
-        val = float(self.visa.query(":trigger:count?").strip("\n"))
-        time.sleep(self.wait)
-        if val > 9999:
-            return "infinite"
-        else:
-            return val
+        if "trigger count" not in self.registry:
+            val = float(self.visa.query(":trigger:count?").strip("\n"))
+            time.sleep(self.wait)
+            self.registry["trigger count"] = "infinite" if val > 9999 else val
+        return self.registry["trigger count"]
 
     def read_initiate_continuous(self):
-        val = self.visa.query(":initiate:continuous?").lower().strip("\n")
-        time.sleep(self.wait)
-        if val == "1":
-            return "on"
-        if val == "0":
-            return "off"
+        if "initiate continuous" not in self.registry:
+            val = self.visa.query(":initiate:continuous?").lower().strip("\n")
+            time.sleep(self.wait)
+            self.registry["initiate continuous"] = "on" if val == "1" else "off"
+        return self.registry["initiate continuous"]
 
     def read_status_measurement_register(self):
-        val = self.visa.query(":status:measurement:enable?").lower().strip("\n")
-        time.sleep(self.wait)
-        return val
+        if "measurement enable" not in self.registry:
+            self.registry["measurement enable"] = int(self.visa.query(":status:measurement:enable?").strip("\n"))
+            time.sleep(self.wait)
+        return self.registry["measurement enable"]
 
     def read_model(self):
         val = self.visa.query("*idn?").strip("\n").lower()
@@ -219,35 +300,50 @@ class dmm2182a():
         return val
 
     def read_sre_register(self):
-        val = self.visa.query("*sre?").strip("\n")
-        time.sleep(self.wait)
-        return val
+        if "sre" not in self.registry:
+            self.registry["sre"] = int(self.visa.query("*sre?").strip("\n"))
+            time.sleep(self.wait)
+        return self.registry["sre"]
+
+    def resync(self):
+        # discard the registry and read the settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return self.get_settings()
 
     '''----- Operation function -----'''
 
     def initiate(self):
         self.visa.write(":initiate:immediate")
         time.sleep(self.wait)
+        self.armed = True
 
     def clear_srq_enable_register(self):
         self.visa.write("*sre 0")
         time.sleep(self.wait)
+        self.registry["sre"] = 0
+
+    def reset(self):
+        # restore factory defaults and forget the registry
+        self.visa.write(":syst:pres")
+        self.visa.write("*rst")
+        time.sleep(self.wait)
+        self.registry = {}
+        self.armed = False
 
     def clear_measurement_event_register(self):
         self.visa.write("*cls")
         time.sleep(self.wait)
 
     def read_new(self):
-        val = self.visa.query(":sense:data:fresh?")
+        val = float(self.query_values(":sense:data:fresh?")[0])
         return val
 
     def read_last(self):
-        val = float(self.visa.query(":sense:data:latest?"))
+        val = float(self.query_values(":sense:data:latest?")[0])
         return val
 
-    def configure(self, lpf="on", samples=1, sense_range=10e-3, nplc=1, trigger_source="bus", trigger_count="inf", trigger_delay="default",
-                     trigger_autodelay_state="on", autorange="off"):
-        # program measurement. A trigger is needed to initiate the measurement
+    def configure_sense(self, lpf="on", samples=1, sense_range=10e-3, nplc=1, autorange="off"):
+        # program function, range, integration time and filters
         self.set_initiate_continuous("off")
         self.set_function()
         self.set_channel()
@@ -262,6 +358,14 @@ class dmm2182a():
         # # self.set_filter_window()
         self.set_filter_control()
         self.set_line_sync()
+
+    def configure(self, lpf="on", samples=1, sense_range=10e-3, nplc=1, trigger_source="bus", trigger_count="inf", trigger_delay="default",
+                     trigger_autodelay_state="on", autorange="off"):
+        # program measurement. A trigger is needed to initiate the measurement. Only the settings that differ from the
+        # registry are written, and the unit is initiated again only if a setting changed: calling configure before every
+        # reading costs nothing once the unit is configured
+        registry = dict(self.registry)
+        self.configure_sense(lpf, samples, sense_range, nplc, autorange)
         # # configure trigger
         self.set_sample_count(n=1)
         self.set_trigger_source(source=trigger_source)
@@ -271,28 +375,87 @@ class dmm2182a():
         # configure measurement status register and service request enable register to raise a request upon measurement completion
         self.set_sre_register(1)
         self.set_status_measurement_register(32)
-        self.visa.write("*wai")
-        self.initiate()
+        if not self.armed or self.registry != registry:
+            self.initiate()
 
     def read(self, lpf="on", samples=1, sense_range=10e-3, nplc=1, trigger_source="bus", trigger_count="inf", trigger_delay="default",
              trigger_autodelay_state="on"):
-        # program measurement. A trigger is needed to initiate the measurement
+        # program measurement (if needed) and take one reading
         self.configure(lpf, samples, sense_range, nplc, trigger_source, trigger_count, trigger_delay, trigger_autodelay_state)
+        return self.read_point()
+
+    def read_point(self):
+        # take one reading with the present configuration (see "configure"): trigger over the bus and fetch the new
+        # reading, which the unit returns as soon as the conversion is done. No setting is written, so that sweeps run
+        # at the rate set by nplc and filter count
         self.send_trigger()
-        self.wait_for_srq()
-        return self.read_last()
+        return float(self.query_values(":sense:data:fresh?")[0])
+
+    def configure_buffer(self, n_points, lpf="on", samples=1, sense_range=10e-3, nplc=1, trigger_source="immediate", trigger_delay=0,
+                         autorange="off", data_format="sreal"):
+        # program a buffered measurement of n_points (2 to 1024) readings into the trace buffer. Each trigger from
+        # "trigger_source" takes one reading: immediate (at the rate set by nplc, filter count and trigger delay),
+        # external (trigger link, e.g. one pulse per step of a current source sweep), timer or bus (see "send_trigger").
+        # The unit raises a service request when the buffer is full. Start with "arm", read with "fetch_buffer"
+        self.stop()
+        self.configure_sense(lpf, samples, sense_range, nplc, autorange)
+        self.set_sample_count(n=1)
+        self.set_trigger_source(source=trigger_source)
+        self.set_trigger_count(n=n_points)
+        self.set_trigger_delay(delay=trigger_delay)
+        self.set_trigger_autodelay(state="off")
+        self.set_buffer_size(n_points)
+        self.set_buffer_feed("sense")
+        self.set_data_format(data_format)
+        self.set_byte_order("swapped")
+        # Bit B9 (512), Buffer Full (BFL)
+        self.set_sre_register(1)
+        self.set_status_measurement_register(512)
+
+    def arm(self):
+        # clear the trace buffer and the event registers, enable storage and initiate the trigger model. With trigger
+        # source immediate the readings start at once
+        self.visa.write(":trace:clear; :trace:feed:control next; *cls")
+        time.sleep(self.wait)
+        self.initiate()
+
+    def read_buffer(self):
+        # return the readings stored in the trace buffer, in one transfer
+        return self.query_values(":trace:data?")
+
+    def query_values(self, query):
+        # send a data query (trace:data?, sense:data?...) and return the readings as an array. The data format applies
+        # to all of them: binary replies are decoded with the format and byte order in the registry
+        data_format = self.registry.get("data format", "ascii")
+        if data_format == "ascii":
+            return np.array(self.visa.query_ascii_values(query))
+        return self.visa.query_binary_values(query, datatype="f" if data_format == "sreal" else "d",
+                                             is_big_endian=self.registry.get("byte order") == "normal", container=np.array)
+
+    def fetch_buffer(self, timeout=None):
+        # wait until the trace buffer is full (see "configure_buffer") and return its readings
+        self.wait_for_srq(timeout)
+        self.armed = False
+        return self.read_buffer()
+
+    def acquire_buffer(self, timeout=None):
+        # arm the buffered measurement programmed by "configure_buffer" and return the readings once the buffer is full
+        self.arm()
+        return self.fetch_buffer(timeout)
 
     def send_trigger(self):
         self.visa.write("*trg")
 
     def wait_for_srq(self, timeout=None):
-        self.visa.wait_for_srq(timeout=timeout)
+        # wait for unit to raise a service request. Raise TimeoutError after "timeout" (in s)
+        completion.wait_for_srq(self.visa, timeout)
 
     def stop(self):
         self.visa.write("abort")
+        self.armed = False
 
     def get_settings(self):
-        return {"dmm unit": self.read_model(),
+        return {"dmm unit": self.model,
                 "autorange": self.read_autorange(),
                 "range": self.read_range(),
                 "n_plc": self.read_nplc(),
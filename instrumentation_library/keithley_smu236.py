@@ -1,9 +1,14 @@
 import numpy as np
+import pyvisa
+import queue
+import threading
 import time
+import completion
+from instrument import Instrument
 from collections import defaultdict
 
 
-class smu236():
+class smu236(Instrument):
 
     # region dictionary for SCPI communication
     scpi_w = {"sens": {"remote": "1",
@@ -123,51 +128,72 @@ class smu236():
 
     '''----- Initialize object -----'''
 
-    def __init__(self, visa):
+    # Device-dependent commands are executed when the X is received, so several can be sent on one line (see "batch").
+    # The unit answers one query per talk (G, U): queries are sent one per line
+    separator = ""
+    query_separator = None
+    # J0X restores the factory defaults, like a power-up: the unit is not addressed for 1 s afterwards
+    delays = {"J": 1.0}
 
-        self.visa = visa
+    def __init__(self, visa, wait=0.0):
+
+        # Commands go through the queue of the bus (see Instrument). 'wait' (in s) holds the unit off after each command
+        super().__init__(visa, wait)
         self.visa.timeout = None
 
-        # Wait after read / write
-        self.wait = 0.01
+        # Maximum number of points of a sweep in the unit buffer. Longer sweeps are split in segments by program_iv
+        self.buffer_size = 1000
+
+        # Segments of the last programmed sweep. Each segment is a list of linear staircases (start, stop, step, points)
+        self.segments = []
+
+        # Read the sweep buffer in IBM binary format (4). Set to False (or on a failed binary transfer) to use ASCII
+        self.binary = True
+
+        # Last written / read settings. Readers are served from the registry, and setters skip redundant writes
+        self.registry = {}
 
         self.model = self.read_model()
 
         # Restore factory defaults of smu
-        self.visa.write("J0X")
-        time.sleep(self.wait)
+        self.reset()
 
         # put unit in standby
-        self.visa.write("N0X")
-        time.sleep(self.wait)
+        self.switch_off()
 
     '''----- Set settings functions -----'''
 
     def set_filter(self, samples=0):
         # set samples
-        self.visa.write("P{}X".format(self.scpi_w["filt"][samples]))
-        time.sleep(self.wait)
+        if self.registry.get("filter") != samples:
+            self.write("P{}X".format(self.scpi_w["filt"][samples]))
+            self.registry["filter"] = samples
 
     def set_sensing(self, sensing="local"):
         # set sensing to local or remote
-        self.visa.write("O{}X".format(self.scpi_w["sens"][sensing]))
-        time.sleep(self.wait)
+        if self.registry.get("sensing") != sensing:
+            self.write("O{}X".format(self.scpi_w["sens"][sensing]))
+            self.registry["sensing"] = sensing
 
     def set_integration_time(self, integration_time=416e-6):
         # set the integration time (nlpc)
-        self.visa.write("S{}X".format(self.scpi_w["time"][integration_time]))
-        time.sleep(self.wait)
+        if self.registry.get("integration time") != integration_time:
+            self.write("S{}X".format(self.scpi_w["time"][integration_time]))
+            self.registry["integration time"] = integration_time
 
     def set_srq_mask(self, srq_mask="sweep done"):
         # Set the SRQ mask: M(mask}, (compliance), where mask = 2 is for sweep done, and mask = is for reading available
-        self.visa.write("M{},0X".format(self.scpi_w["srqm"][srq_mask]))
-        time.sleep(self.wait)
+        if self.registry.get("srq mask") != srq_mask:
+            self.write("M{},0X".format(self.scpi_w["srqm"][srq_mask]))
+            self.registry["srq mask"] = srq_mask
 
     def set_sense_range(self, range):
         # set the sense range
-        sense = self.read_sense().lower()
-        self.visa.write("L,{}X".format(self.scpi_w["rang_sens"][sense][range]))
-        time.sleep(self.wait)
+        if self.registry.get("sense range") != range:
+            sense = self.read_sense().lower()
+            self.write("L,{}X".format(self.scpi_w["rang_sens"][sense][range]))
+            self.registry["sense range"] = range
+            self.registry.pop("compliance", None)
 
     def set_compliance(self, level="auto"):
         # set compliance value.
@@ -175,129 +201,156 @@ class smu236():
         # else, set compliance to level
         if self.read_sense_range() == "auto":
             pass
-        else:
-            self.visa.write("L{},X".format(level))
-        time.sleep(self.wait)
+        elif self.registry.get("compliance") != float(level):
+            self.write("L{},X".format(level))
+            self.registry["compliance"] = float(level)
 
     def set_source(self, source):
-        # set source to "i" or "v"
-        self.visa.write("F{},X".format(self.scpi_w["sour"][source]))
-        time.sleep(self.wait)
+        # set source to "i" or "v". The unit senses the other quantity, hence the sense settings are read again
+        if self.registry.get("source") != source:
+            self.write("F{},X".format(self.scpi_w["sour"][source]))
+            self.registry["source"] = source
+            self.registry["sense"] = "v" if source == "i" else "i"
+            for key in ["sense range", "compliance", "bias range"]:
+                self.registry.pop(key, None)
 
     def set_function(self, function):
         # set function to "dc" or "sweep".
         # Note: only "dc" is compatible with continuous operation
-        self.visa.write("F,{}X".format(self.scpi_w["func"][function]))
-        time.sleep(self.wait)
+        if self.registry.get("function") != function:
+            self.write("F,{}X".format(self.scpi_w["func"][function]))
+            self.registry["function"] = function
 
     def set_trigger_on(self):
         # switch trigger on
-        self.visa.write("R1X")
-        time.sleep(self.wait)
+        if self.registry.get("trigger") != "on":
+            self.write("R1X")
+            self.registry["trigger"] = "on"
 
     def set_trigger_off(self):
         # switch trigger on
-        self.visa.write("R0X")
-        time.sleep(self.wait)
+        if self.registry.get("trigger") != "off":
+            self.write("R0X")
+            self.registry["trigger"] = "off"
 
     def set_trigger_control(self, origin="immediate", trigger_in="continuous", trigger_out="none", trigger_end="disabled"):
         # set trigger settings. Origin = 4 allow trigger over the bus
         # Note: it is recommended to switch off the trigger before changing the settings, and then turn it on again
-        self.visa.write("T{},{},{},{}X".format(self.scpi_w["trig"]["origin"][origin], self.scpi_w["trig"]["input"][trigger_in],
-                                               self.scpi_w["trig"]["output"][trigger_out], self.scpi_w["trig"]["end"][trigger_end]))
-        time.sleep(self.wait)
+        if self.registry.get("trigger control") != (origin, trigger_in, trigger_out, trigger_end):
+            self.write("T{},{},{},{}X".format(self.scpi_w["trig"]["origin"][origin], self.scpi_w["trig"]["input"][trigger_in],
+                                              self.scpi_w["trig"]["output"][trigger_out], self.scpi_w["trig"]["end"][trigger_end]))
+            self.registry["trigger control"] = (origin, trigger_in, trigger_out, trigger_end)
 
     def set_suppress_on(self):
         # switch suppress on
-        self.visa.write("Z1X")
-        time.sleep(self.wait)
+        if self.registry.get("suppress") != "on":
+            self.write("Z1X")
+            self.registry["suppress"] = "on"
 
     def set_suppress_off(self):
         # switch suppress on
-        self.visa.write("Z0X")
-        time.sleep(self.wait)
+        if self.registry.get("suppress") != "off":
+            self.write("Z0X")
+            self.registry["suppress"] = "off"
 
     def set_default_delay(self, status="on"):
-        if status == "on":
-            self.visa.write("W1X")
-        elif status == "off":
-            self.visa.write("W0X")
-        time.sleep(self.wait)
+        if self.registry.get("default delay") != status:
+            if status == "on":
+                self.write("W1X")
+            elif status == "off":
+                self.write("W0X")
+            self.registry["default delay"] = status
 
     ''' ----- Read settings functions -----'''
 
+    def read_status(self):
+        # read the machine status word (U4X) and store all the settings it reports in the registry
+        status = self.query("U4X")
+        sense = status[0].lower()
+        self.registry["sense"] = sense
+        self.registry["sense range"] = self.scpi_r["rang_sens"][sense][status[5:7]]
+        self.registry["source"] = self.scpi_r["sour"][status[8:9].lower()]
+        self.registry["function"] = self.scpi_r["func"][status[10]]
+        self.registry["sensing"] = self.scpi_r["sens"][status[12]]
+        self.registry["filter"] = self.scpi_r["filt"][status[14]]
+        self.registry["integration time"] = self.scpi_r["time"][status[16]]
+        self.registry["default delay"] = "on" if status[18] == "1" else "off"
+        self.registry["suppress"] = "on" if status[20] == "1" else "off"
+
     def read_sense(self):
         # read sense setting
-        val = self.visa.query("U4X")[0].lower()
-        time.sleep(self.wait)
-        return val
+        if "sense" not in self.registry:
+            self.read_status()
+        return self.registry["sense"]
 
     def read_sense_range(self):
         # read sense range. Returns a float
-        sense = self.read_sense()
-        val = self.scpi_r["rang_sens"][sense][self.visa.query("U4X")[5:7]]
-        time.sleep(self.wait)
-        return val
+        if "sense range" not in self.registry:
+            self.read_status()
+        return self.registry["sense range"]
 
     def read_source(self):
         # read source
-        val = self.scpi_r["sour"][self.visa.query("U4X")[8:9].lower()]
-        time.sleep(self.wait)
-        return val
+        if "source" not in self.registry:
+            self.read_status()
+        return self.registry["source"]
 
     def read_function(self):
         # read source function
-        val = self.scpi_r["func"][self.visa.query("U4X")[10]]
-        time.sleep(self.wait)
-        return val
+        if "function" not in self.registry:
+            self.read_status()
+        return self.registry["function"]
 
     def read_filter(self):
         # read filter
-        val = self.scpi_r["filt"][self.visa.query("U4X")[14]]
-        time.sleep(self.wait)
-        return val
+        if "filter" not in self.registry:
+            self.read_status()
+        return self.registry["filter"]
 
     def read_sensing(self):
         # read sensing
-        val = self.scpi_r["sens"][self.visa.query("U4X")[12]]
-        time.sleep(self.wait)
-        return val
+        if "sensing" not in self.registry:
+            self.read_status()
+        return self.registry["sensing"]
 
     def read_integration_time(self):
         # read integration time
-        val = self.scpi_r["time"][self.visa.query("U4X")[16]]
-        time.sleep(self.wait)
-        return val
+        if "integration time" not in self.registry:
+            self.read_status()
+        return self.registry["integration time"]
 
     def read_srq_mask(self):
         # read service request enable register (mask).
         # Note: returns a decimal number that is the sum of the decimal representation of the active registers
-        val = self.scpi_r["srqm"][self.visa.query("U3X")[13:16]]
-        time.sleep(self.wait)
-        return val
+        if "srq mask" not in self.registry:
+            self.registry["srq mask"] = self.scpi_r["srqm"][self.query("U3X")[13:16]]
+        return self.registry["srq mask"]
 
     def read_compliance(self):
         # read compliance level
-        val = float(self.visa.query("U5X")[3:])
-        time.sleep(self.wait)
-        return val
+        if "compliance" not in self.registry:
+            self.registry["compliance"] = float(self.query("U5X")[3:])
+        return self.registry["compliance"]
 
     def read_model(self):
         # read unit model
-        val = self.visa.query("U0X").strip("\n")
-        time.sleep(self.wait)
-        return val
+        return self.query("U0X")
 
     def read_default_delay(self):
         # check if default delay is active and return delay in ms
-        val = int(self.visa.query("U4X")[18])
-        time.sleep(self.wait)
-        if val == 0:
+        if "default delay" not in self.registry:
+            self.read_status()
+        if self.registry["default delay"] == "off":
             return 0
         else:
             sense_range = self.read_sense_range()
             return self.default_delay[sense_range]
 
+    def resync(self):
+        # discard the registry and read the settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return self.get_settings()
+
     '''----- Operation functions -----'''
 
     def switch_on(self):
@@ -306,35 +359,47 @@ class smu236():
         # a trigger is needed to start making measurements.
         # Sweep Operation - With the sweep function selected, enabling OPERATE will source (but not measure) the bias level of the sweep.
         # The sweep itself will not start until the appropriate trigger occurs (as denoted by the blinking MANUAL TRIGGER light).
-        self.visa.write("N1X")
-        time.sleep(self.wait)
+        if self.registry.get("operate") != "on":
+            self.write("N1X")
+            self.registry["operate"] = "on"
 
     def switch_off(self):
         # turn "operate" off and put unit into idle
-        self.visa.write("N0X")
-        time.sleep(self.wait)
+        if self.registry.get("operate") != "off":
+            self.write("N0X")
+            self.registry["operate"] = "off"
+
+    def reset(self):
+        # restore factory defaults and forget the registry
+        self.write("J0X")
+        self.registry = {}
 
     def set_bias_level(self, bias, delay=0):
         # Set dc operation and bias level
-        self.visa.write("B{},,X".format(bias))
-        time.sleep(self.wait)
-        time.sleep(delay)
+        if self.registry.get("bias level") != bias:
+            self.write("B{},,X".format(bias))
+            self.registry["bias level"] = bias
+        if delay:
+            # wait from the moment the level is applied, not from the moment it is queued
+            self.sync()
+            time.sleep(delay)
 
     def set_bias_range(self, bias_range):
         # Set dc operation and bias range
-        source = self.read_source()
-        self.visa.write("B,{},X".format(self.scpi_w["rang_sour"][source][bias_range]))
-        time.sleep(self.wait)
+        if self.registry.get("bias range") != bias_range:
+            source = self.read_source()
+            self.write("B,{},X".format(self.scpi_w["rang_sour"][source][bias_range]))
+            self.registry["bias range"] = bias_range
 
     def set_bias_delay(self, delay):
         # Set dc operation and delay in
-        self.visa.write("B,,{}X".format(delay))
-        time.sleep(self.wait)
+        if self.registry.get("bias delay") != delay:
+            self.write("B,,{}X".format(delay))
+            self.registry["bias delay"] = delay
 
     def read(self):
         # read last measurement in memory
-        data = self.visa.query("G5,2,0X")
-        time.sleep(self.wait)
+        data = self.query("G5,2,0X")
         source = float(data.split(",")[0])
         measure = float(data.split(",")[1])
         return source, measure
@@ -354,55 +419,118 @@ class smu236():
         # lines: 0 = One line of data per talk,
         #        1 = One line of sweep data per talk,
         #        2 = All lines of sweep data per talk
-        data = np.array([float(x) for x in self.visa.query("G5,2,2X").strip("\r\n").split(",")])
-        time.sleep(self.wait)
+        # The buffer is read in binary format (4) and decoded straight into arrays. If the binary transfer fails, the
+        # driver falls back to ASCII format (2) for this and the following reads.
+        return self.decode_buffer(self.read_buffer_raw())
+
+    def read_buffer_raw(self):
+        # transfer the sweep buffer without decoding it: bytes in binary format, str in ASCII format
+        data = None
+        if self.binary:
+            try:
+                data = self.query_raw("G5,4,2X")
+                self.decode_binary(data)
+            except (ValueError, pyvisa.errors.VisaIOError):
+                self.call(self.visa.clear)
+                self.binary = False
+                data = None
+        if data is None:
+            data = self.query("G5,2,2X")
+        return data
+
+    def decode_buffer(self, raw):
+        # decode a transfer of the sweep buffer into source and measure arrays
+        if isinstance(raw, bytes):
+            data = self.decode_binary(raw)
+        else:
+            data = np.array(raw.strip("\r\n").split(","), dtype=float)
         measure = data[1::2]
         source = data[::2]
         return source, measure
 
+    def decode_binary(self, raw):
+        # Decode a binary transfer: '#A' (HP, format 3) or '#I' (IBM, format 4), followed by the byte count and by
+        # IEEE-754 single precision values, sent most significant byte first (HP) or least significant byte first (IBM)
+        order = {b"#A": ">", b"#I": "<"}.get(raw[:2])
+        if order is None or len(raw) < 4:
+            raise ValueError("Invalid binary header: {}".format(raw[:4]))
+        count = int(np.frombuffer(raw[2:4], order + "u2")[0])
+        if len(raw) < 4 + count or count % 4:
+            raise ValueError("Incomplete binary transfer: expected {} bytes, received {}".format(count, len(raw) - 4))
+        return np.frombuffer(raw[4:4 + count], order + "f4").astype(float)
+
     def create_linear_staircase(self, start, stop, step, source_range="auto", delay=0):
         # Note: delay is in ms, and the maximum number of steps is 1000. More steps will raise a buffer full error
         # The function stores data in the unit buffer and does not return any value.
         source = self.read_source()
-        time.sleep(self.wait)
         # create linear staircase (Q1)
-        self.visa.write("Q1,{},{},{},{},{}X".format(start, stop, step, self.scpi_w["rang_sour"][source][source_range], delay))
-        time.sleep(self.wait)
+        self.write("Q1,{},{},{},{},{}X".format(start, stop, step, self.scpi_w["rang_sour"][source][source_range], delay))
 
     def append_linear_staircase(self, start, stop, step, source_range="auto", delay=0):
         source = self.read_source()
-        self.visa.write("Q7,{},{},{},{},{}X".format(start, stop, step, self.scpi_w["rang_sour"][source][source_range], delay))
-        time.sleep(self.wait)
+        self.write("Q7,{},{},{},{},{}X".format(start, stop, step, self.scpi_w["rang_sour"][source][source_range], delay))
 
     def create_fixed_staircase(self, level, source_range="auto", delay=0, count=1):
         # Note: delay is in ms, and the maximum number of steps is 1000. More steps will raise a buffer full error
         # The function stores data in the unit buffer and does not return any value.
         source = self.read_source()
-        time.sleep(self.wait)
-        self.visa.write("Q0,{},{},{},{}X".format(level, self.scpi_w["rang_sour"][source][source_range], delay, count))
-        time.sleep(self.wait)
+        self.write("Q0,{},{},{},{}X".format(level, self.scpi_w["rang_sour"][source][source_range], delay, count))
 
     def append_fixed_staircase(self, level, source_range="auto", delay=0, count=1):
         source = self.read_source()
-        time.sleep(self.wait)
-        self.visa.write("Q6,{},{},{},{}X".format(level, self.scpi_w["rang_sour"][source][source_range], delay, count))
-        time.sleep(self.wait)
+        self.write("Q6,{},{},{},{}X".format(level, self.scpi_w["rang_sour"][source][source_range], delay, count))
 
     def create_logarithmic_staircase(self, start, stop, points_decade, source_range="auto", delay=0):
         # Note: delay is in ms, and the maximum number of steps is 1000. More steps will raise a buffer full error
         # A log sweep cannot start at 0 or sweep through 0: start must be different from 0
         # The function stores data in the unit buffer and does not return any value.
         source = self.read_source()
-        time.sleep(self.wait)
         # create linear staircase (Q1)
-        self.visa.write("Q2,{},{},{},{},{}X".format(start, stop, self.scpi_w["points_per_decade"][points_decade], self.scpi_w["rang_sour"][source][source_range], delay))
-        time.sleep(self.wait)
+        self.write("Q2,{},{},{},{},{}X".format(start, stop, self.scpi_w["points_per_decade"][points_decade], self.scpi_w["rang_sour"][source][source_range], delay))
 
     def append_logarithmic_staircase(self, start, stop, points_decade, source_range="auto", delay=0):
         source = self.read_source()
-        time.sleep(self.wait)
-        self.visa.write("Q8,{},{},{},{},{}X".format(start, stop, self.scpi_w["points_per_decade"][points_decade], self.scpi_w["rang_sour"][source][source_range], delay))
-        time.sleep(self.wait)
+        self.write("Q8,{},{},{},{},{}X".format(start, stop, self.scpi_w["points_per_decade"][points_decade], self.scpi_w["rang_sour"][source][source_range], delay))
+
+    def staircase_legs(self, start, stop, step, mode=0):
+        # Return the linear staircases (start, stop, step) of an iv sweep
+        # mode: 0 = forward scan only,
+        #       1 = forward and backward scan,
+        #       2 = hysteresis-like scan
+        if mode == 0:
+            return [(start, stop, step)]
+        elif mode == 1:
+            return [(start, stop, step), (stop - step, start, step)]
+        elif mode == 2:
+            return [(start, stop, step), (stop - step, stop - 2 * (stop - start), step),
+                    (stop - 2 * (stop - start) + step, start, step)]
+
+    def split_staircase(self, legs):
+        # Split linear staircases (start, stop, step) in segments that fit in the unit buffer. Each segment is a list of
+        # linear staircases (start, stop, step, points), programmed with one create and the following appends.
+        segments = [[]]
+        free = self.buffer_size
+        for start, stop, step in legs:
+            points = int(np.floor(abs(stop - start) / abs(step) + 1e-9)) + 1
+            increment = np.sign(stop - start) * abs(step)
+            done = 0
+            while done < points:
+                if free == 0:
+                    segments.append([])
+                    free = self.buffer_size
+                n = min(points - done, free)
+                segments[-1].append((round(start + increment * done, 12), round(start + increment * (done + n - 1), 12), step, n))
+                done += n
+                free -= n
+        return segments
+
+    def program_staircase(self, segment, source_range="auto", delay=0):
+        # Program a segment of linear staircases in the unit buffer
+        for idx, (start, stop, step, points) in enumerate(segment):
+            if idx == 0:
+                self.create_linear_staircase(start, stop, step, source_range, delay)
+            else:
+                self.append_linear_staircase(start, stop, step, source_range, delay)
 
     def program_iv(self, source, start, stop, step, mode=0, type="lin",
                    source_range="auto", sense_range="auto", delay=0, samples=0, integration_time=20e-3, sensing="local", compliance="auto", srq_mask="sweep done",
@@ -411,60 +539,97 @@ class smu236():
         # mode: 0 = forward scan only,
         #       1 = forward and backward scan,
         #       2 = hysteresis-like scan
-        self.set_source(source)
-        self.set_function("sweep")
-        self.set_sense_range(sense_range)
-        self.set_filter(samples)
-        self.set_integration_time(integration_time)
-        self.set_sensing(sensing)
-        self.set_compliance(compliance)
-        self.set_srq_mask(srq_mask)
-        self.set_trigger_off()
-        self.set_trigger_control(trigger_origin, trigger_in, trigger_out, trigger_end)
-        self.set_trigger_on()
-        if type == "lin":
-            if mode == 0:
-                self.create_linear_staircase(start, stop, step, source_range, delay)
-            elif mode == 1:
-                self.create_linear_staircase(start, stop, step, source_range, delay)
-                self.append_linear_staircase(stop - step, start, step, source_range, delay)
-            elif mode == 2:
-                self.create_linear_staircase(start, stop, step, source_range, delay)
-                self.append_linear_staircase(stop - step, stop - 2 * (stop - start), step, source_range, delay)
-                self.append_linear_staircase(stop - 2 * (stop - start) + step, start, step, source_range, delay)
-        elif type == "log":
-            print("Not yet implemented")
- 
+        # Sweeps longer than the unit buffer are split in segments (self.segments), and only the first one is programmed.
+        # make_iv programs and runs the following segments.
+        # The settings and the staircase are sent on as few lines as possible
+        with self.batch():
+            self.set_source(source)
+            self.set_function("sweep")
+            self.set_sense_range(sense_range)
+            self.set_filter(samples)
+            self.set_integration_time(integration_time)
+            self.set_sensing(sensing)
+            self.set_compliance(compliance)
+            self.set_srq_mask(srq_mask)
+            self.set_trigger_off()
+            self.set_trigger_control(trigger_origin, trigger_in, trigger_out, trigger_end)
+            self.set_trigger_on()
+            if type == "lin":
+                self.segments = self.split_staircase(self.staircase_legs(start, stop, step, mode))
+                self.program_staircase(self.segments[0], source_range, delay)
+            elif type == "log":
+                print("Not yet implemented")
+
     def make_iv(self, source, start, stop, step, mode=0, type="lin",
-                source_range="auto", sense_range="auto", delay=0, samples=0, integration_time=20e-3, sensing="local", compliance="auto", suppress=False):
+                source_range="auto", sense_range="auto", delay=0, samples=0, integration_time=20e-3, sensing="local", compliance="auto", suppress=False,
+                callback=None):
         # Make an iv and return measurement data
+        # Each segment of the sweep is transferred as soon as it is done, and the next segment is programmed and
+        # triggered right away. A background thread decodes the transfers into one contiguous (source, measure) array,
+        # and calls callback(source, measure) with the data of each segment, if given.
         self.program_iv(source, start, stop, step, mode, type, source_range, sense_range, delay, samples, integration_time, sensing, compliance)
+        points = [sum(x[3] for x in segment) for segment in self.segments]
+        data = np.zeros((2, sum(points)))
+        transfers = queue.Queue()
+        errors = []
+        reader = threading.Thread(target=self.decode_segments, args=(transfers, data, points, callback, errors), daemon=True)
+        reader.start()
         self.switch_on()
         if suppress is True:
             self.set_suppress_on()
-        self.send_trigger()
-        self.wait_for_srq()
-        buffer = self.read_buffer()
-        if suppress is True:
-            self.set_suppress_off()
-        return buffer
+        try:
+            for idx, segment in enumerate(self.segments):
+                if idx > 0:
+                    self.program_staircase(segment, source_range, delay)
+                self.send_trigger()
+                self.wait_for_srq()
+                transfers.put(self.read_buffer_raw())
+        finally:
+            transfers.put(None)
+            reader.join()
+            if suppress is True:
+                self.set_suppress_off()
+        if errors:
+            raise errors[0]
+        return data[0], data[1]
+
+    def decode_segments(self, transfers, data, points, callback, errors):
+        # Decode the transfers of the sweep segments (put in the queue 'transfers', terminated by None) into 'data'
+        start = 0
+        for n in points:
+            raw = transfers.get()
+            if raw is None:
+                return
+            try:
+                source, measure = self.decode_buffer(raw)
+                if len(source) != n or len(measure) != n:
+                    raise ValueError("Segment of {} points returned {} readings".format(n, len(measure)))
+                data[0, start:start + n] = source
+                data[1, start:start + n] = measure
+                if callback is not None:
+                    callback(source, measure)
+            except Exception as error:
+                errors.append(error)
+            start += n
+        transfers.get()
 
     def program_bias(self, source, output_value, source_range="auto", sense_range="auto", delay=0, samples=0, integration_time=20e-3, sensing="local",
                      compliance="auto"):
         # program a bias operation to source a dc value. Requires a trigger over the bus to initiate
-        self.set_srq_mask()
-        self.set_trigger_off()
-        self.set_trigger_control()
-        self.set_trigger_on()
-        self.set_source(source)
-        self.set_bias_range(source_range)
-        self.set_bias_level(output_value)
-        self.set_bias_delay(delay)
-        self.set_sense_range(sense_range)
-        self.set_filter(samples)
-        self.set_integration_time(integration_time)
-        self.set_sensing(sensing)
-        self.set_compliance(compliance)
+        with self.batch():
+            self.set_srq_mask()
+            self.set_trigger_off()
+            self.set_trigger_control()
+            self.set_trigger_on()
+            self.set_source(source)
+            self.set_bias_range(source_range)
+            self.set_bias_level(output_value)
+            self.set_bias_delay(delay)
+            self.set_sense_range(sense_range)
+            self.set_filter(samples)
+            self.set_integration_time(integration_time)
+            self.set_sensing(sensing)
+            self.set_compliance(compliance)
 
     def bias(self, source, output_value, source_range="auto", sense_range="auto", delay=0, samples=0, integration_time=20e-3, sensing="local", compliance="auto"):
         self.program_bias(source, output_value, source_range, sense_range, delay, samples, integration_time, sensing, compliance)
@@ -487,15 +652,17 @@ class smu236():
                 time.sleep(actual_wait)
 
     def wait_for_srq(self, timeout=None):
-        # wait for unit to raise a service request
-        self.visa.wait_for_srq(timeout=timeout)
+        # wait for unit to raise a service request, once the queued commands are sent. Raise TimeoutError after
+        # "timeout" (in s)
+        self.sync()
+        completion.wait_for_srq(self.visa, timeout)
 
     def send_trigger(self):
         # send a trigger to the unit over the bus
-        self.visa.write("H0X")
+        self.write("H0X")
 
     def get_settings(self):
-        return {"smu unit": self.read_model(),
+        return {"smu unit": self.model,
                 "source": self.read_source(),
                 "sense": self.read_sense(),
                 "sensing": self.read_sensing(),
@@ -1,6 +1,7 @@
 import time
 import pyvisa
 from collections import defaultdict
+from instrument import QueuedSession
 
 
 class Lakeshore336:
@@ -21,7 +22,7 @@ class Lakeshore336:
     wait: float = 0.01
 
     # Set temperature threshold (in K) between heater range "high" and "medium".
-    t_switch: float = 50.0,
+    t_switch: float = 50.0
 
     # Initialize instance
     def __init__(
@@ -32,8 +33,9 @@ class Lakeshore336:
             settling_time_init: float = 0.1 * 1 * 60,
             settling_time: float = 0.1 * 1 * 60
     ):
+        self.visa = QueuedSession(visa)  # VISA address
+        self.registry = {}  # Last written / read settings. Readers are served from here and redundant writes are skipped
         self.model = self.read_model()
-        self.visa = visa  # VISA address
         self.address = address  # Address of temperature controller
         self.sampling_freq = sampling_freq  # Temperature sampling frequency (in Hz)
         self.settling_time_init = settling_time_init  # Cryostat thermalization time (in s).
@@ -42,24 +44,37 @@ class Lakeshore336:
     def reset_controller_to_default_settings(self):
         """ Reset controller parameters to power-up settings. """
         self.visa.write("*rst")
+        self.registry = {}
+
+    def resync(self):
+        """ Discard the registry and read the settings back from the controller. """
+        self.registry = {}
+        return self.get_settings()
 
     def set_filter(self, channel, state, samples, window=2):
         # channel is "a", "b", "c" or "d"
         # state is "on" or "off"
         # max samples value = 64
-        self.visa.write(f"filter {channel},{self.scpi_w["filter"][state]},{samples},{window}")
-        time.sleep(self.wait)
+        val = [self.scpi_w['filter'][state], str(samples), str(window)]
+        if self.registry.get(("filter", channel)) != val:
+            self.visa.write(f"filter {channel},{','.join(val)}")
+            time.sleep(self.wait)
+            self.registry[("filter", channel)] = val
 
     def set_heater_range(self, heater, heater_range):
         # heater is 1 or 2
         # range is "off", "low", "medium", or "high"
-        self.visa.write(f"range {heater},{self.scpi_w["range"][heater_range]}")
-        time.sleep(self.wait)
+        if self.registry.get(("range", heater)) != heater_range:
+            self.visa.write(f"range {heater},{self.scpi_w['range'][heater_range]}")
+            time.sleep(self.wait)
+            self.registry[("range", heater)] = heater_range
 
     def set_pid(self, pid, p, i, d):
         # pid is 1 or 2
-        self.visa.write(f"pid {pid},{p},{i},{d}")
-        time.sleep(self.wait)
+        if self.registry.get(("pid", pid)) != [float(p), float(i), float(d)]:
+            self.visa.write(f"pid {pid},{p},{i},{d}")
+            time.sleep(self.wait)
+            self.registry[("pid", pid)] = [float(p), float(i), float(d)]
 
     def set_temperature(self, output, setpoint):
         # set temperature setpoint.
@@ -70,25 +85,41 @@ class Lakeshore336:
         elif setpoint >= self.t_switch:
             self.set_heater_range(1, "high")
             self.set_heater_range(2, "high")
-        self.visa.write(f"SETP {output},{setpoint}")
-        time.sleep(self.wait)
+        self.set_setpoint(output, setpoint)
+
+    def set_setpoint(self, output, setpoint):
+        # set temperature setpoint (in K) of output 1 or 2, without changing the heater range
+        if self.registry.get(("setpoint", output)) != float(setpoint):
+            self.visa.write(f"SETP {output},{setpoint}")
+            time.sleep(self.wait)
+            self.registry[("setpoint", output)] = float(setpoint)
 
     def read_filter(self, channel):
-        # return samples, window
-        val = self.visa.query(f"filter? {channel}").split(",")
-        time.sleep(self.wait)
-        return val
+        # return state, samples, window
+        if ("filter", channel) not in self.registry:
+            self.registry[("filter", channel)] = self.visa.query(f"filter? {channel}").strip().split(",")
+            time.sleep(self.wait)
+        return self.registry[("filter", channel)]
 
     def read_heater_range(self, channel):
-        val = self.scpi_r["range"][self.visa.query(f"range? {channel}").strip("\n").strip("\r")]
-        time.sleep(self.wait)
-        return val
+        if ("range", channel) not in self.registry:
+            self.registry[("range", channel)] = self.scpi_r["range"][self.visa.query(f"range? {channel}").strip("\n").strip("\r")]
+            time.sleep(self.wait)
+        return self.registry[("range", channel)]
 
     def read_pid(self, pid):
         # return p, i , d
-        val = [float(x) for x in self.visa.query(f"pid? {pid}").split(",")]
-        time.sleep(self.wait)
-        return val
+        if ("pid", pid) not in self.registry:
+            self.registry[("pid", pid)] = [float(x) for x in self.visa.query(f"pid? {pid}").split(",")]
+            time.sleep(self.wait)
+        return self.registry[("pid", pid)]
+
+    def read_setpoint(self, output):
+        # return the temperature setpoint (in K) of output 1 or 2
+        if ("setpoint", output) not in self.registry:
+            self.registry[("setpoint", output)] = float(self.visa.query(f"SETP? {output}"))
+            time.sleep(self.wait)
+        return self.registry[("setpoint", output)]
 
     def read_model(self):
         # return model number
@@ -99,25 +130,21 @@ class Lakeshore336:
     def read_temperature(self, sensor="all"):
         # read temperature from sensors ("all", "a", "b", "c" or "d")
         if sensor == "all":
-            val = [float(x) for x in self.visa.query(f"KRDG? {self.scpi_w["sensor"][sensor]}").split(",")]
+            val = [float(x) for x in self.visa.query(f"KRDG? {self.scpi_w['read'][sensor]}").split(",")]
         else:
-            val = float(self.visa.query(f"KRDG? {self.scpi_w["sensor"][sensor]}"))
+            val = float(self.visa.query(f"KRDG? {self.scpi_w['read'][sensor]}"))
         time.sleep(self.wait)
         return val
 
     def warm_up(self):
         # set stage and shield temperature setpoint(s) to room temperature
-        self.visa.write("SETP 1, 300")
-        time.sleep(self.wait)
-        self.visa.write("SETP 2, 300")
-        time.sleep(self.wait)
+        self.set_setpoint(1, 300)
+        self.set_setpoint(2, 300)
 
     def off(self):
         # switch stage and shield heaters off
-        self.visa.write("range 1, off")
-        time.sleep(self.wait)
-        self.visa.write("range 2, off")
-        time.sleep(self.wait)
+        self.set_heater_range(1, "off")
+        self.set_heater_range(2, "off")
 
     def configure(
             self,
@@ -144,13 +171,13 @@ class Lakeshore336:
 
     def get_settings(self):
         return {
-            "model": self.read_model(),
+            "model": self.model,
             "filter channel a (state, samples, window)": self.read_filter("a"),
             "filter channel b (state, samples, window)": self.read_filter("b"),
             "filter channel c (state, samples, window)": self.read_filter("c"),
             "filter channel d (state, samples, window)": self.read_filter("d"),
             "heater 1 range": self.read_heater_range(1),
-            "heater 2 range": self.read_heater_range(1),
+            "heater 2 range": self.read_heater_range(2),
             "pid 1 settings (p, i, d)": self.read_pid(1),
             "pid 2 settings (p, i, d)": self.read_pid(2),
         }
@@ -0,0 +1,171 @@
+import csv
+import re
+import threading
+import time
+import numpy as np
+from instrument import QueuedSession
+
+
+# positions of the value arguments (levels, delays) of the Keithley 236 commands. The arguments of the other commands
+# (e.g. G, F, O, R) and the other arguments (ranges, sweep type) select a format or a mode and are kept
+values_236 = {"B": (0, 2), "L": (0,), "Q": (1, 2, 3, 4, 5)}
+
+
+def mnemonic(message):
+    """ Return the command mnemonic of 'message', with the numeric value arguments replaced by '#'. Keithley 236 lines
+    of device-dependent commands are keyed by their first command, e.g. "G5,2,0X" and "G5,4,2X" are kept, "B1,,X" and
+    "B1.5,,X" -> "B#,,X", "L1e-3,0X" -> "L#,0X", "R0XR1XQ1,0,5,1,0,0X" -> "R0X". Other lines by the header of their
+    first command, e.g. "SNAP? 1, 2, 9" -> "SNAP?", "TRCB?1,0,100" -> "TRCB?#,#,#", while the digits of the header
+    words are kept ("ch1:scale", "DB7.T1"). """
+    message = message.strip()
+    number = r"[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d+)?"
+    if re.fullmatch(r"([A-DF-WYZ][^A-DF-WYZa-df-z]*X)+", message):
+        command, arguments = message[0], message[1:message.index("X")].split(",")
+        arguments = ["#" if idx in values_236.get(command, ()) and x.strip() != "" else x for idx, x in enumerate(arguments)]
+        return "{}{}X".format(command, ",".join(arguments))
+    header = message.split(";")[0].split(" ")[0]
+    return re.sub(r"(?<![A-Za-z0-9.])" + number, "#", header)
+
+
+class LatencyRecorder:
+    """ Record the wall time of the VISA operations (write, query, read, wait_for_srq) of several instruments, per
+    instrument and per command mnemonic. Opt in by wrapping the resource of a driver:
+
+        recorder = LatencyRecorder()
+        recorder.attach(lockin, "lockin")         # lockin.visa is now timed
+        ...
+        recorder.print_summary()
+        recorder.export_histograms("latency.csv")
+
+    The summary also reports, for each instrument, the fraction of the elapsed time spent in VISA operations: the rest
+    is spent by the host (e.g. time.sleep(self.wait) in the drivers, processing, plotting). """
+
+    def __init__(self):
+        self.samples = {}  # [dict] {(instrument, operation, mnemonic): list of durations (in s)}
+        self.busy = {}  # [dict] {instrument: [first start, last stop, total duration]} (monotonic clock, in s)
+        self.lock = threading.Lock()
+
+    def resource(self, visa, name=None):
+        """ Return a timed wrapper of the pyvisa resource 'visa', recorded as 'name' (the resource name if None). """
+        return TimedResource(visa, self, name if name is not None else getattr(visa, "resource_name", str(visa)))
+
+    def attach(self, driver, name=None):
+        """ Replace the resource 'visa' of 'driver' by a timed wrapper, and return the driver. The session of a
+        QueuedSession is wrapped inside it, so that the time spent waiting for the bus is not recorded. """
+        if isinstance(driver.visa, QueuedSession):
+            if not isinstance(driver.visa.visa, TimedResource):
+                driver.visa = QueuedSession(self.resource(driver.visa.visa, name))
+        elif not isinstance(driver.visa, TimedResource):
+            driver.visa = self.resource(driver.visa, name)
+        return driver
+
+    def record(self, instrument, operation, command, t_start, t_stop):
+        with self.lock:
+            self.samples.setdefault((instrument, operation, command), []).append(t_stop - t_start)
+            busy = self.busy.setdefault(instrument, [t_start, t_stop, 0.0])
+            busy[1] = max(busy[1], t_stop)
+            busy[2] += t_stop - t_start
+
+    def clear(self):
+        with self.lock:
+            self.samples = {}
+            self.busy = {}
+
+    def summary(self):
+        """ Return one dict per (instrument, operation, mnemonic), by decreasing total time, with the count, the total,
+        mean, median, 95th percentile and maximum durations (in s). """
+        with self.lock:
+            samples = {key: np.array(val) for key, val in self.samples.items()}
+        rows = []
+        for (instrument, operation, command), val in samples.items():
+            rows.append({"instrument": instrument, "operation": operation, "mnemonic": command, "count": len(val),
+                         "total": val.sum(), "mean": val.mean(), "median": np.median(val),
+                         "p95": np.percentile(val, 95), "max": val.max()})
+        return sorted(rows, key=lambda x: x["total"], reverse=True)
+
+    def utilization(self):
+        """ Return {instrument: (elapsed time, time in VISA operations, fraction)} (in s) since the first operation. """
+        with self.lock:
+            return {key: (stop - start, total, total / (stop - start) if stop > start else 1.0)
+                    for key, (start, stop, total) in self.busy.items()}
+
+    def print_summary(self, n=20):
+        """ Print the 'n' entries of the summary with the largest total time, and the utilization of the instruments. """
+        print("{:<20} {:<14} {:<24} {:>7} {:>10} {:>10} {:>10} {:>10}".format(
+            "instrument", "operation", "mnemonic", "count", "total (s)", "mean (ms)", "p95 (ms)", "max (ms)"))
+        for row in self.summary()[:n]:
+            print("{:<20} {:<14} {:<24} {:>7} {:>10.3f} {:>10.3f} {:>10.3f} {:>10.3f}".format(
+                row["instrument"], row["operation"], row["mnemonic"], row["count"], row["total"], 1e3 * row["mean"],
+                1e3 * row["p95"], 1e3 * row["max"]))
+        for instrument, (elapsed, busy, fraction) in self.utilization().items():
+            print(f"{instrument}: {busy:.3f} s in VISA operations out of {elapsed:.3f} s ({100 * fraction:.1f} %).")
+
+    def histograms(self, bins=None):
+        """ Return {(instrument, operation, mnemonic): (counts, bin edges)} of the durations (in s). By default the bins
+        are log-spaced, 10 per decade from 10 us to 100 s, the same for all the commands so they can be compared. """
+        bins = np.logspace(-5, 2, 71) if bins is None else bins
+        with self.lock:
+            samples = {key: np.array(val) for key, val in self.samples.items()}
+        return {key: np.histogram(val, bins) for key, val in samples.items()}
+
+    def export_histograms(self, filename, bins=None):
+        """ Write the non-empty bins of the histograms to the csv file 'filename', one row per bin. """
+        with open(filename, "w", newline="") as file:
+            writer = csv.writer(file)
+            writer.writerow(["instrument", "operation", "mnemonic", "bin start (s)", "bin stop (s)", "count"])
+            for (instrument, operation, command), (counts, edges) in self.histograms(bins).items():
+                for idx in np.flatnonzero(counts):
+                    writer.writerow([instrument, operation, command, edges[idx], edges[idx + 1], counts[idx]])
+
+
+class TimedResource:
+    """ Wrapper of a pyvisa resource recording the duration of write, query, read and wait_for_srq operations in a
+    LatencyRecorder. Reads and service requests are recorded with the mnemonic of the last command written. Every other
+    attribute (timeout, clear, read_stb...) is passed to the resource. """
+
+    def __init__(self, resource, recorder, name):
+        object.__setattr__(self, "resource", resource)
+        object.__setattr__(self, "recorder", recorder)
+        object.__setattr__(self, "name", name)
+        object.__setattr__(self, "last", "")  # mnemonic of the last command written
+
+    def __getattr__(self, name):
+        return getattr(self.resource, name)
+
+    def __setattr__(self, name, value):
+        setattr(self.resource, name, value)
+
+    def timed(self, operation, command, function, *args, **kwargs):
+        t_start = time.monotonic()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self.recorder.record(self.name, operation, command, t_start, time.monotonic())
+
+    def write(self, message, *args, **kwargs):
+        object.__setattr__(self, "last", mnemonic(message))
+        return self.timed("write", self.last, self.resource.write, message, *args, **kwargs)
+
+    def query(self, message, *args, **kwargs):
+        object.__setattr__(self, "last", mnemonic(message))
+        return self.timed("query", self.last, self.resource.query, message, *args, **kwargs)
+
+    def query_ascii_values(self, message, *args, **kwargs):
+        object.__setattr__(self, "last", mnemonic(message))
+        return self.timed("query", self.last, self.resource.query_ascii_values, message, *args, **kwargs)
+
+    def query_binary_values(self, message, *args, **kwargs):
+        object.__setattr__(self, "last", mnemonic(message))
+        return self.timed("query", self.last, self.resource.query_binary_values, message, *args, **kwargs)
+
+    def read(self, *args, **kwargs):
+        return self.timed("read", self.last, self.resource.read, *args, **kwargs)
+
+    def read_raw(self, *args, **kwargs):
+        return self.timed("read_raw", self.last, self.resource.read_raw, *args, **kwargs)
+
+    def read_bytes(self, *args, **kwargs):
+        return self.timed("read_bytes", self.last, self.resource.read_bytes, *args, **kwargs)
+
+    def wait_for_srq(self, *args, **kwargs):
+        return self.timed("wait_for_srq", self.last, self.resource.wait_for_srq, *args, **kwargs)
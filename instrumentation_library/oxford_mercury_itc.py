@@ -1,35 +1,52 @@
 import time
 from collections import defaultdict
+from instrument import QueuedSession
 
 
 class mercuryitc():
 
-    def __init__(self, visa, wait=0.01):
+    # temperature sensor devices
+    sensors = {"a": "DB7.T1", "b": "DB6.T1", "c": "MB1.T1", "d": "DB8.T1"}
 
-        self.visa = visa
+    def __init__(self, visa, wait=0.01, reset=True):
+        # With reset=False the unit is attached as it is (e.g. mid-cooldown): the loop settings are read back once
+        # into the registry instead of resetting the unit
+        self.visa = QueuedSession(visa)
         self.wait = wait
-        self.visa.query("*RST")
+        self.registry = {}
+        if reset is True:
+            self.reset()
+        else:
+            self.resync()
         self.model = self.read_model()
 
     '''----- Set functions ------'''
 
     def set_temperature(self, output, setpoint):
-        # Note: "output" can be either 0 (HeHigh or He3Pot) or 1 (He4Pot), and "setpoint" is in K
+        # Note: "output" can be either 0 (HeHigh or He3Pot) or 1 (He4Pot), and "setpoint" is in K.
+        # Returns the reply of the unit, or None if the setpoint is already in the registry
+        if self.registry.get(("setpoint", output)) == setpoint:
+            return None
         if output == 0:
             val = self.visa.query("SET:DEV:DB7.T1:TEMP:LOOP:TSET:{}".format(setpoint))
         elif output == 1:
             val = self.visa.query("SET:DEV:DB6.T1:TEMP:LOOP:TSET:{}".format(setpoint))
         time.sleep(self.wait)
+        self.registry[("setpoint", output)] = setpoint
         return val
 
     def set_heater_percentage_auto(self, heater, value="ON"):
-        # Note: heater can be either 1 (HeHigh or He3Pot) or 2 (He4Pot), and t is in kelvin
+        # Note: heater can be either 1 (HeHigh or He3Pot) or 2 (He4Pot), and t is in kelvin.
+        # Returns the reply of the unit, or None if the state is already in the registry
+        if self.registry.get(("heater auto", heater)) == value:
+            return None
         if heater == 1:
             val = self.visa.query("SET:DEV:DB7.T1:TEMP:LOOP:ENAB:{}".format(value))
         elif heater == 2:
             val =self.visa.query("SET:DEV:DB6.T1:TEMP:LOOP:ENAB:{}".format(value))
         time.sleep(self.wait)
         time.sleep(5)
+        self.registry[("heater auto", heater)] = value
         return val
 
     '''----- Read functions ------'''
@@ -44,20 +61,51 @@ class mercuryitc():
         time.sleep(self.wait)
         return val
 
+    def read_setpoint(self, output):
+        # Note: "output" can be either 0 (HeHigh or He3Pot) or 1 (He4Pot). The setpoint is in K
+        if ("setpoint", output) not in self.registry:
+            device = {0: "DB7.T1", 1: "DB6.T1"}[output]
+            val = self.visa.query("READ:DEV:{}:TEMP:LOOP:TSET".format(device))
+            time.sleep(self.wait)
+            self.registry[("setpoint", output)] = float(val.strip("\n").split(":")[-1][:-1])
+        return self.registry[("setpoint", output)]
+
+    def read_heater_percentage_auto(self, heater):
+        # Note: heater can be either 1 (HeHigh or He3Pot) or 2 (He4Pot). Returns "ON" or "OFF"
+        if ("heater auto", heater) not in self.registry:
+            device = {1: "DB7.T1", 2: "DB6.T1"}[heater]
+            val = self.visa.query("READ:DEV:{}:TEMP:LOOP:ENAB".format(device))
+            time.sleep(self.wait)
+            self.registry[("heater auto", heater)] = val.strip("\n").split(":")[-1]
+        return self.registry[("heater auto", heater)]
+
     def read_temperature(self, sensor):
         # sensor can be either "a" (hehigh), "b" (he4pot), "c" (he3sorb) or "d" ("helow")
-        if sensor == "c":
-            val = float(self.visa.query("READ:DEV:MB1.T1:TEMP:SIG:TEMP").strip("\n").split(":")[-1][:-1])
-        if sensor == "b":
-            val = float(self.visa.query("READ:DEV:DB6.T1:TEMP:SIG:TEMP").strip("\n").split(":")[-1][:-1])
-        if sensor == "a":
-            val = float(self.visa.query("READ:DEV:DB7.T1:TEMP:SIG:TEMP").strip("\n").split(":")[-1][:-1])
-        if sensor == "d":
-            val = float(self.visa.query("READ:DEV:DB8.T1:TEMP:SIG:TEMP").strip("\n").split(":")[-1][:-1])
+        val = float(self.visa.query("READ:DEV:{}:TEMP:SIG:TEMP".format(self.sensors[sensor])).strip("\n").split(":")[-1][:-1])
+        time.sleep(self.wait)
+        return val
+
+    def read_temperatures(self, sensors="abcd"):
+        # read several sensors (e.g. "ab") back to back, without waiting between the queries. The unit answers one
+        # query per line, so this is the cheapest way to read them all (see TemperatureLogger)
+        val = [float(self.visa.query("READ:DEV:{}:TEMP:SIG:TEMP".format(self.sensors[x])).strip("\n").split(":")[-1][:-1]) for x in sensors]
         time.sleep(self.wait)
         return val
 
     ''' ----- Operation functions ----- '''
 
+    def reset(self):
+        # reset the unit and forget the registry of the last written settings
+        self.visa.query("*RST")
+        self.registry = {}
+
+    def resync(self):
+        # discard the registry and read the loop settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return {"setpoint 0": self.read_setpoint(0),
+                "setpoint 1": self.read_setpoint(1),
+                "heater auto 1": self.read_heater_percentage_auto(1),
+                "heater auto 2": self.read_heater_percentage_auto(2)}
+
     def clear_status(self):
         self.visa.write("*CLS")
\ No newline at end of file
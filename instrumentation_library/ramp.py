@@ -0,0 +1,124 @@
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait
+
+
+class Ramp:
+    """ A source whose level is changed at a limited rate, in steps of at most 'step' (by default the change in
+    'interval' at 'rate'), e.g.
+
+        vgs = Ramp(smu_vgs.set_bias_level, rate=10)                             # 10 V/s, one point every 50 ms
+        heater = Ramp(cs580.set_current, rate=1e-6, step=10e-9)                 # 1 uA/s in 10 nA steps
+        amplitude = Ramp(lockin.set_amplitude, level=0.004, rate=0.1)           # lock-in sine amplitude, 0.1 V/s
+        vds = Ramp(None, rate=1, staircase=lambda v, dt: adc.sweep_ao(10, v, 1, dt / 3, 0, 1))  # ADwin AO1
+
+    The points are scheduled on a monotonic clock, so the ramp time does not drift with the bus latency. If 'staircase'
+    is given, the whole ramp is handed over to the instrument instead: staircase(levels, step_time) must output the
+    levels, one every step_time (in s), and return when done. """
+
+    def __init__(
+            self,
+            setter,
+            level: float = 0.0,
+            rate: float = 1.0,
+            step: float = None,
+            interval: float = 0.05,
+            args: tuple = (),
+            staircase=None
+    ):
+        self.setter = setter  # [callable] setter(*args, level) sets the level of the source
+        self.level = level  # [float] present level of the source (in unit)
+        self.rate = rate  # [float] maximum ramp rate (in unit/s)
+        self.step = step  # [float] maximum step (in unit). If None, rate * interval
+        self.interval = interval  # [float] time (in s) between the points when 'step' is None
+        self.args = args  # [tuple] positional arguments of the setter preceding the level (e.g. a channel)
+        self.staircase = staircase  # [callable] hardware staircase, see above
+
+    def levels(self, target, start=None):
+        """ Return the levels from 'start' (the present level if None), excluded, to 'target', included. """
+        start = self.level if start is None else start
+        step = self.step if self.step is not None else self.rate * self.interval
+        n_step = int(np.ceil(round(abs(target - start) / step, 9)))
+        return np.linspace(start, target, n_step + 1)[1:]
+
+    def duration(self, target, start=None, rate=None):
+        """ Return the time (in s) needed to ramp to 'target' at 'rate' (the rate of the ramp if None). """
+        start = self.level if start is None else start
+        return abs(target - start) / (self.rate if rate is None else rate)
+
+    def run(self, target, start=None, t_start=None, duration=None, rate=None):
+        """ Ramp from 'start' (the present level if None) to 'target', setting the first point at 't_start' (monotonic
+        clock, now if None). The ramp lasts 'duration' (in s) if it is longer than the duration at 'rate' (the rate of
+        the ramp if None, e.g. a faster return to zero), e.g. to bring several sources to their targets together. """
+        levels = self.levels(target, start)
+        if len(levels) == 0:
+            self.level = target
+            return
+        step_time = max(self.duration(target, start, rate), duration or 0.0) / len(levels)
+        t_start = time.monotonic() if t_start is None else t_start
+        if self.staircase is not None:
+            time.sleep(max(0.0, t_start - time.monotonic()))
+            self.staircase(levels, step_time)
+        else:
+            for idx, level in enumerate(levels):
+                time.sleep(max(0.0, t_start + idx * step_time - time.monotonic()))
+                self.setter(*self.args, level)
+                self.level = level
+        self.level = target
+
+
+class RampScheduler:
+    """ Ramp several sources concurrently, e.g.
+
+        ramps = RampScheduler({"vgs": Ramp(smu_vgs.set_bias_level, rate=10), "vds": Ramp(smu_vds.set_bias_level, rate=1)})
+        ramps.run({"vgs": 5, "vds": 0.1})
+        ramps.zero()
+
+    Each source is ramped by a thread of a pool on a common monotonic schedule, so the total time is that of the slowest
+    ramp instead of the sum. Sources are expected to talk over their own VISA sessions. """
+
+    def __init__(
+            self,
+            ramps: dict
+    ):
+        self.ramps = dict(ramps)  # [dict] {name: Ramp}
+        self.executor = ThreadPoolExecutor(max_workers=max(1, len(self.ramps)))
+        self.duration = None  # [float] duration (in s) of the last run
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def run(self, targets, starts=None, synchronize=False, rates=None):
+        """ Ramp the sources named in 'targets' ({name: target}) concurrently, from the levels in 'starts' ({name:
+        level}, the present levels for the sources not in it), at the rates in 'rates' ({name: rate}, the rates of the
+        ramps for the sources not in it). With 'synchronize' the sources reach their targets together, at the pace of
+        the slowest. Return the duration (in s). The exception raised by a ramp, if any, is raised once all the ramps
+        are done. """
+        starts = starts if starts is not None else {}
+        rates = rates if rates is not None else {}
+        durations = {name: self.ramps[name].duration(target, starts.get(name), rates.get(name))
+                     for name, target in targets.items()}
+        duration = max(durations.values(), default=0.0) if synchronize else None
+        t_start = time.monotonic()
+        futures = [self.executor.submit(self.ramps[name].run, target, starts.get(name), t_start, duration, rates.get(name))
+                   for name, target in targets.items()]
+        wait(futures)
+        for future in futures:
+            future.result()
+        self.duration = time.monotonic() - t_start
+        return self.duration
+
+    def zero(self, starts=None, rates=None):
+        """ Ramp all the sources to 0 concurrently (see "run"). """
+        return self.run({name: 0.0 for name in self.ramps}, starts, rates=rates)
+
+    def levels(self):
+        """ Return the present levels ({name: level}). """
+        return {name: ramp.level for name, ramp in self.ramps.items()}
+
+    def close(self):
+        """ Shut down the thread pool, waiting for the pending ramps. """
+        self.executor.shutdown(wait=True)
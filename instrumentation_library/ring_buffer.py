@@ -0,0 +1,83 @@
+import threading
+import numpy as np
+
+
+class RingBuffer:
+    """ A thread safe first-in first-out buffer of fixed size, backed by a preallocated numpy array. A producer
+    (e.g. a reader thread) puts rows of samples, a consumer gets them in the same order. When the buffer is full, the
+    oldest rows are overwritten and counted in 'overflows'. """
+
+    def __init__(
+            self,
+            size: int = 2 ** 20,
+            width: int = 1,
+            dtype: type = np.float64
+    ):
+        self.size = size  # [int] maximum number of rows stored
+        self.width = width  # [int] number of columns of each row (e.g. 2 for X, Y)
+        self.data = np.zeros((size, width), dtype=dtype)
+        self.start = 0  # [int] index of the oldest row
+        self.count = 0  # [int] number of rows stored
+        self.overflows = 0  # [int] number of rows overwritten before being read
+        self.closed = False  # [bool] True when the producer will not put any more rows
+        self.condition = threading.Condition()
+
+    def __len__(self):
+        with self.condition:
+            return self.count
+
+    def put(self, rows):
+        """ Append rows (array of shape (n, width), or (n,) if width is 1) and wake up the waiting consumers. """
+        rows = np.asarray(rows, dtype=self.data.dtype).reshape(-1, self.width)
+        with self.condition:
+            if len(rows) > self.size:
+                self.overflows += len(rows) - self.size
+                rows = rows[-self.size:]
+            n = len(rows)
+            lost = max(0, self.count + n - self.size)
+            if lost:
+                self.overflows += lost
+                self.start = (self.start + lost) % self.size
+                self.count -= lost
+            end = (self.start + self.count) % self.size
+            first = min(n, self.size - end)
+            self.data[end:end + first] = rows[:first]
+            self.data[:n - first] = rows[first:]
+            self.count += n
+            self.condition.notify_all()
+
+    def get(self, n=None, timeout=None):
+        """ Remove and return the n oldest rows (all the rows if n is None). If n rows are not available, wait until
+        they are, the buffer is closed or 'timeout' (in s) expires, and return the rows available. """
+        with self.condition:
+            if n is not None:
+                self.condition.wait_for(lambda: self.count >= n or self.closed, timeout)
+                n = min(n, self.count)
+            else:
+                n = self.count
+            index = (self.start + np.arange(n)) % self.size
+            rows = self.data[index]
+            self.start = (self.start + n) % self.size
+            self.count -= n
+            return rows
+
+    def peek(self, n=None):
+        """ Return a copy of the n most recent rows (all the rows if n is None) without removing them. """
+        with self.condition:
+            n = self.count if n is None else min(n, self.count)
+            index = (self.start + self.count - n + np.arange(n)) % self.size
+            return self.data[index]
+
+    def clear(self):
+        """ Discard all the rows and reset the overflow counter. """
+        with self.condition:
+            self.start = 0
+            self.count = 0
+            self.overflows = 0
+            self.closed = False
+
+    def close(self):
+        """ Signal the consumers that no more rows will be put. """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
@@ -0,0 +1,949 @@
+""" In-process stand-ins for pyvisa resources. A SimulatedResource behaves like the message based resource returned by
+pyvisa.ResourceManager().open_resource, but the commands are interpreted by an instrument emulator (SR830, Keithley 236,
+Keithley 2182A, Keithley 2000, Lakeshore 336, Mercury ITC, Agilent 4294A, Tektronix TDS2002) that measures a device model (resistor, diode or RC
+network). Each command can be given a latency, so that acquisition loops can be profiled and benchmarked without the bench:
+
+    rm = SimulatedResourceManager({"GPIB0::1::INSTR": SR830Emulator(device=RCNetwork(1e6, 1e-9))}, latency=5e-3)
+    lockin = srs_sr830.sr830(visa=rm.open_resource("GPIB0::1::INSTR"))
+"""
+
+import re
+import time
+from collections import deque
+
+import numpy as np
+import pyvisa
+
+
+'''----- Device models -----'''
+
+
+class Resistor:
+    """ Ohmic device model. """
+
+    def __init__(self, resistance: float = 1e6):
+        self.resistance = resistance  # Resistance (in Ohm)
+
+    def current(self, v):
+        # current (in A) flowing through the device biased at v (in V)
+        return np.asarray(v) / self.resistance
+
+    def voltage(self, i):
+        # voltage (in V) across the device when a current i (in A) is forced
+        return np.asarray(i) * self.resistance
+
+    def impedance(self, frequency, bias=0.0):
+        # small signal impedance (in Ohm) at frequency (in Hz)
+        return np.asarray(frequency) * 0 + complex(self.resistance)
+
+
+class Diode:
+    """ Shockley diode model, with junction capacitance in parallel. """
+
+    def __init__(
+            self,
+            saturation_current: float = 1e-12,
+            ideality: float = 1.0,
+            temperature: float = 300.0,
+            capacitance: float = 0.0
+    ):
+        self.saturation_current = saturation_current  # Saturation current (in A)
+        self.ideality = ideality  # Ideality factor
+        self.temperature = temperature  # Temperature (in K)
+        self.capacitance = capacitance  # Junction capacitance (in F)
+
+    @property
+    def thermal_voltage(self):
+        return self.ideality * 1.380649e-23 * self.temperature / 1.602176634e-19
+
+    def current(self, v):
+        # the exponent is clipped to keep the forward current finite at large bias
+        return self.saturation_current * (np.exp(np.clip(np.asarray(v) / self.thermal_voltage, None, 200)) - 1)
+
+    def voltage(self, i):
+        # reverse currents larger than the saturation current cannot be forced: the voltage is clipped to -10 V
+        ratio = np.asarray(i) / self.saturation_current + 1
+        return np.where(ratio > 0, self.thermal_voltage * np.log(np.clip(ratio, 1e-300, None)), -10.0)
+
+    def impedance(self, frequency, bias=0.0):
+        # differential resistance at "bias" in parallel with the junction capacitance
+        r = self.thermal_voltage / (self.saturation_current + self.current(bias))
+        return r / (1 + 2j * np.pi * np.asarray(frequency) * r * self.capacitance)
+
+
+class RCNetwork:
+    """ Parallel RC network, with a series resistance. """
+
+    def __init__(self, resistance: float = 1e6, capacitance: float = 1e-9, series_resistance: float = 0.0):
+        self.resistance = resistance  # Parallel resistance (in Ohm)
+        self.capacitance = capacitance  # Parallel capacitance (in F)
+        self.series_resistance = series_resistance  # Series resistance (in Ohm)
+
+    def current(self, v):
+        return np.asarray(v) / (self.resistance + self.series_resistance)
+
+    def voltage(self, i):
+        return np.asarray(i) * (self.resistance + self.series_resistance)
+
+    def impedance(self, frequency, bias=0.0):
+        return self.series_resistance + self.resistance / (1 + 2j * np.pi * np.asarray(frequency) * self.resistance * self.capacitance)
+
+
+class ThermalStage:
+    """ First order thermal model of a cryostat stage: the temperature relaxes exponentially towards the setpoint when
+    the heater is on, and towards the base temperature when the heater is off. """
+
+    def __init__(self, temperature: float = 300.0, base_temperature: float = 4.2, tau: float = 60.0):
+        self.base_temperature = base_temperature  # Temperature (in K) reached with the heater off
+        self.tau = tau  # Thermal time constant (in s)
+        self.setpoint = temperature  # Temperature setpoint (in K)
+        self.heater = False  # Heater status
+        self.t0 = time.monotonic()
+        self.temperature0 = temperature
+
+    def target(self):
+        return self.setpoint if self.heater else self.base_temperature
+
+    def temperature(self):
+        dt = time.monotonic() - self.t0
+        return self.target() + (self.temperature0 - self.target()) * np.exp(-dt / self.tau)
+
+    def update(self, setpoint=None, heater=None):
+        # restart the relaxation from the current temperature
+        self.temperature0 = self.temperature()
+        self.t0 = time.monotonic()
+        if setpoint is not None:
+            self.setpoint = setpoint
+        if heater is not None:
+            self.heater = heater
+
+
+'''----- Instrument emulators -----'''
+
+
+class SimulatedInstrument:
+    """ Base class of the instrument emulators. Commands separated by 'separator' are executed in order, and each query
+    produces one response. Unknown SCPI-like settings are stored and returned verbatim when queried. """
+
+    idn = "SIMULATED,INSTRUMENT,0,1.0"
+    separator = ";"
+    defaults = {}
+
+    def __init__(self, device=None, noise: float = 0.0, seed: int = None):
+        self.device = device if device is not None else Resistor()
+        self.noise = noise  # Standard deviation of the noise added to each reading
+        self.rng = np.random.default_rng(seed)
+        self.settings = {}
+        self.srq_time = None  # Time (monotonic clock) at which the pending service request is raised
+        self.reset()
+
+    def reset(self):
+        self.settings = dict(self.defaults)
+        self.srq_time = None
+
+    def write(self, message):
+        # execute a command line and return the list of responses
+        responses = []
+        for command in message.split(self.separator):
+            command = command.strip()
+            if command:
+                response = self.execute(command)
+                if response is not None:
+                    responses.append(response)
+        return responses
+
+    def execute(self, command):
+        header, _, argument = command.partition(" ")
+        key = header.strip().lstrip(":").lower()
+        if key == "*idn?":
+            return self.idn
+        elif key == "*rst":
+            self.reset()
+        elif key in ["*cls", "*wai", "*trg"]:
+            pass
+        elif key == "*opc?":
+            return "1"
+        elif key == "*stb?":
+            return str(self.status_byte())
+        elif key.endswith("?"):
+            return self.settings.get(key[:-1], "0")
+        else:
+            self.settings[key] = argument.strip()
+
+    def measure(self, value):
+        # add noise to an ideal reading
+        if self.noise == 0:
+            return value
+        return value + self.noise * self.rng.standard_normal(np.shape(value))
+
+    def raise_srq(self, delay=0.0):
+        self.srq_time = time.monotonic() + delay
+
+    def service_request_delay(self):
+        # time (in s) until the pending service request is raised, or None if no request is pending
+        if self.srq_time is None:
+            return None
+        delay = max(0.0, self.srq_time - time.monotonic())
+        self.srq_time = None
+        return delay
+
+    def status_byte(self):
+        return 64 if self.srq_time is not None and self.srq_time <= time.monotonic() else 0
+
+    def stream_bytes(self):
+        # data sent by the instrument without being queried (e.g. a fast data transfer), available now
+        return b""
+
+
+class SR830Emulator(SimulatedInstrument):
+    """ Emulator of an SR830 lock-in amplifier. The sine output drives the device model: current inputs measure the
+    current through the device, voltage inputs measure the voltage across the device in series with 'load'. """
+
+    idn = "Stanford_Research_Systems,SR830,s/n00000,ver1.07"
+    defaults = {"FMOD": "1", "FREQ": "1000", "HARM": "1", "PHAS": "0", "SLVL": "1.000", "ISRC": "0", "IGND": "0",
+                "ICPL": "0", "ILIN": "0", "SENS": "26", "RMOD": "1", "OFLT": "8", "OFSL": "1", "SYNC": "0", "SRAT": "4",
+                "SEND": "1", "OUTX": "1", "FAST": "0", "TSTR": "0"}
+    buffer_size = 16383
+    sensitivities = [x * 10 ** e for e in range(-9, 1) for x in [1, 2, 5]][1:-2]  # Full scale of SENS 0 - 26
+    strd_delay = 0.5  # Delay (in s) between STRD and the first sample of the scan
+
+    def __init__(self, device=None, noise=0.0, seed=None, load=1e6):
+        self.load = load  # Series resistance (in Ohm) of voltage measurements
+        super().__init__(device, noise, seed)
+
+    def reset(self):
+        super().reset()
+        self.x = np.zeros(0)
+        self.y = np.zeros(0)
+        self.filling = False
+        self.t_start = 0.0
+        self.streaming = False
+        self.streamed = 0
+
+    def sampling_rate(self):
+        # SRAT 0 - 13 is 62.5 mHz * 2^n, SRAT 14 is "trigger"
+        srat = int(self.settings["SRAT"])
+        return None if srat == 14 else 62.5e-3 * 2 ** srat
+
+    def phasor(self):
+        amplitude = float(self.settings["SLVL"])
+        harmonic = int(self.settings["HARM"])
+        if harmonic != 1:
+            # the device models are linear: no signal at higher harmonics
+            signal = 0j
+        else:
+            z = complex(self.device.impedance(float(self.settings["FREQ"])))
+            if self.settings["ISRC"] in ["2", "3"]:
+                signal = amplitude / z
+            else:
+                signal = amplitude * z / (z + self.load)
+        return signal * np.exp(-1j * np.deg2rad(float(self.settings["PHAS"])))
+
+    def update_buffer(self):
+        # store the samples acquired since the last update
+        if not self.filling or self.sampling_rate() is None:
+            return
+        n = int((time.monotonic() - self.t_start) * self.sampling_rate()) - len(self.x)
+        if self.settings["SEND"] == "1":
+            n = min(n, self.buffer_size - len(self.x))
+        if n > 0:
+            self.append_samples(n)
+        if self.settings["SEND"] == "1" and len(self.x) >= self.buffer_size:
+            self.filling = False
+
+    def append_samples(self, n):
+        signal = self.phasor()
+        self.x = np.concatenate([self.x, self.measure(np.full(n, signal.real))])
+        self.y = np.concatenate([self.y, self.measure(np.full(n, signal.imag))])
+
+    def snap(self, parameter):
+        signal = self.phasor()
+        values = {1: signal.real, 2: signal.imag, 3: abs(signal), 4: np.rad2deg(np.angle(signal)),
+                  9: float(self.settings["FREQ"]), 10: signal.real, 11: signal.imag}
+        return float(self.measure(values.get(parameter, 0.0))) if parameter in [1, 2, 3, 10, 11] else values.get(parameter, 0.0)
+
+    def trace(self, channel, start, count):
+        self.update_buffer()
+        data = self.x if channel == 1 else self.y
+        if self.settings["SEND"] == "0":
+            data = data[-self.buffer_size:]
+        return data[start:start + count]
+
+    def execute(self, command):
+        if command.startswith("*"):
+            return super().execute(command)
+        mnemonic = command[:4].upper()
+        argument = command[4:].strip()
+        if argument.startswith("?"):
+            args = [int(float(x)) for x in argument[1:].split(",") if x.strip() != ""]
+            return self.query(mnemonic, args)
+        args = [x.strip() for x in argument.split(",")]
+        if mnemonic == "SLVL":
+            amplitude = min(max(float(args[0]), 0.004), 5.0)
+            self.settings["SLVL"] = "{:.3f}".format(round(amplitude / 0.002) * 0.002)
+        elif mnemonic in self.settings:
+            self.settings[mnemonic] = "{:.10g}".format(float(args[0]))
+        elif mnemonic == "STRT":
+            if not self.filling:
+                self.t_start = time.monotonic() - len(self.x) / (self.sampling_rate() or 1)
+                self.filling = True
+        elif mnemonic == "STRD":
+            # start a scan and transfer X and Y (FAST 1 or 2) as 16 bit integers, +/-30000 being the full scale
+            self.execute("REST")
+            self.t_start = time.monotonic() + self.strd_delay
+            self.filling = self.settings["FAST"] != "0"
+            self.streaming = self.filling
+            self.streamed = 0
+        elif mnemonic == "PAUS":
+            self.update_buffer()
+            self.filling = False
+            self.streaming = False
+        elif mnemonic == "REST":
+            self.filling = False
+            self.streaming = False
+            self.x = np.zeros(0)
+            self.y = np.zeros(0)
+        elif mnemonic == "TRIG":
+            if self.filling and self.sampling_rate() is None and len(self.x) < self.buffer_size:
+                self.append_samples(1)
+
+    def stream_bytes(self):
+        if not self.streaming or self.sampling_rate() is None:
+            return b""
+        n = int((time.monotonic() - self.t_start) * self.sampling_rate()) - self.streamed
+        if n <= 0:
+            return b""
+        self.streamed += n
+        signal = self.phasor()
+        full_scale = self.sensitivities[int(self.settings["SENS"])]
+        xy = np.empty((n, 2))
+        xy[:, 0] = self.measure(np.full(n, signal.real))
+        xy[:, 1] = self.measure(np.full(n, signal.imag))
+        # FAST 2 uses the PC byte order (little endian), FAST 1 the DOS one (identical on x86)
+        return np.clip(np.round(xy / full_scale * 30000), -32768, 32767).astype("<i2").tobytes()
+
+    def query(self, mnemonic, args):
+        if mnemonic in self.settings:
+            return self.settings[mnemonic]
+        elif mnemonic == "SNAP":
+            return ",".join("{:.6e}".format(self.snap(x)) for x in args)
+        elif mnemonic == "OUTP":
+            return "{:.6e}".format(self.snap(args[0]))
+        elif mnemonic == "SPTS":
+            self.update_buffer()
+            return str(min(len(self.x), self.buffer_size))
+        elif mnemonic == "TRCA":
+            return "".join("{:.6e},".format(x) for x in self.trace(*args))
+        elif mnemonic == "TRCB":
+            return np.asarray(self.trace(*args), dtype="<f4").tobytes()
+        return "0"
+
+
+class SMU236Emulator(SimulatedInstrument):
+    """ Emulator of a Keithley 236 source-measure unit (device dependent commands terminated by 'X'). """
+
+    idn = "236A01"
+    points_per_decade = {"0": 5, "1": 10, "2": 25, "3": 50}
+    integration_time = {"0": 416e-6, "1": 4e-3, "2": 16.67e-3, "3": 20e-3}
+    buffer_size = 1000
+
+    def reset(self):
+        super().reset()
+        self.settings = {"F": ["0", "0"], "L": ["1.000E-03", "00"], "P": ["0"], "S": ["0"], "O": ["0"], "M": ["000", "0"],
+                         "T": ["4", "0", "0", "0"], "R": ["0"], "N": ["0"], "B": ["0", "00", "0"], "W": ["1"], "Z": ["0"]}
+        self.sweep = []  # source levels of the programmed sweep
+        self.delays = []  # delay (in ms) of each sweep point
+        self.readings = np.zeros((0, 2))  # last (source, measure) readings
+        self.reading_index = 0
+
+    def write(self, message):
+        responses = []
+        for letter, argument in re.findall(r"([A-DF-WYZ])([^A-DF-WYZ]*)", message):
+            response = self.execute_command(letter, argument.replace("X", "").strip().split(","))
+            if response is not None:
+                responses.append(response)
+        return responses
+
+    def execute_command(self, letter, args):
+        if letter in ["Q"]:
+            self.program_sweep(args)
+        elif letter == "J":
+            self.reset()
+        elif letter == "H":
+            self.trigger()
+        elif letter == "U":
+            return self.status(args[0])
+        elif letter == "G":
+            return self.output(args)
+        elif letter in self.settings:
+            # empty arguments leave the corresponding setting unchanged
+            for idx, arg in enumerate(args):
+                if arg != "" and idx < len(self.settings[letter]):
+                    self.settings[letter][idx] = arg
+
+    def source(self):
+        return "i" if self.settings["F"][0] == "1" else "v"
+
+    def response(self, level):
+        # measure the device at the source level, limited by compliance
+        level = np.asarray(level, dtype=float)
+        value = self.device.current(level) if self.source() == "v" else self.device.voltage(level)
+        compliance = abs(float(self.settings["L"][0]))
+        return self.measure(np.clip(value, -compliance, compliance))
+
+    def program_sweep(self, args):
+        mode = args[0]
+        if mode in ["0", "6"]:
+            levels = [float(args[1])] * int(args[4] if len(args) > 4 and args[4] else 1)
+            delay = float(args[3] or 0)
+        elif mode in ["1", "7"]:
+            start, stop, step = float(args[1]), float(args[2]), abs(float(args[3]))
+            n = int(np.floor(abs(stop - start) / step + 1e-9)) + 1
+            levels = list(start + np.sign(stop - start) * step * np.arange(n))
+            delay = float(args[5] or 0)
+        elif mode in ["2", "8"]:
+            start, stop = float(args[1]), float(args[2])
+            n = int(round(abs(np.log10(stop / start)) * self.points_per_decade[args[3]])) + 1
+            levels = list(np.logspace(np.log10(abs(start)), np.log10(abs(stop)), n) * np.sign(start))
+            delay = float(args[5] or 0)
+        else:
+            return
+        sweep = levels if mode in ["0", "1", "2"] else self.sweep + levels
+        if len(sweep) > self.buffer_size:
+            # sweep buffer full: the command is rejected
+            return
+        self.delays = ([] if mode in ["0", "1", "2"] else self.delays) + [delay] * len(levels)
+        self.sweep = sweep
+
+    def trigger(self):
+        if self.settings["N"][0] != "1":
+            return
+        t_point = self.integration_time[self.settings["S"][0]] * 2 ** int(self.settings["P"][0])
+        mask = int(self.settings["M"][0])
+        if self.settings["F"][1] == "1":
+            levels = np.asarray(self.sweep)
+            self.readings = np.column_stack([levels, self.response(levels)]) if len(levels) else np.zeros((0, 2))
+            self.reading_index = 0
+            if mask & 2:
+                self.raise_srq(len(levels) * t_point + sum(self.delays) / 1e3)
+        else:
+            level = float(self.settings["B"][0])
+            self.readings = np.array([[level, self.response(level)]])
+            if mask & 8:
+                self.raise_srq(t_point + float(self.settings["B"][2]) / 1e3)
+
+    def last_reading(self):
+        if self.settings["F"][1] == "0":
+            # dc operation measures continuously
+            level = float(self.settings["B"][0]) if self.settings["N"][0] == "1" else 0.0
+            return np.array([level, self.response(level)])
+        return self.readings[-1] if len(self.readings) else np.zeros(2)
+
+    def output(self, args):
+        items, lines = int(args[0]), args[2] if len(args) > 2 else "0"
+        data_format = args[1] if len(args) > 1 else "0"
+        rows = self.readings if lines == "2" else self.last_reading()[None, :]
+        columns = [rows[:, 0]] * (items & 1) + [np.zeros(len(rows))] * (items >> 1 & 1) + [rows[:, 1]] * (items >> 2 & 1)
+        values = np.column_stack(columns).ravel() if columns else np.zeros(0)
+        if data_format == "3":
+            # HP binary: '#A', byte count and IEEE-754 single precision values, most significant byte first
+            return b"#A" + np.array([4 * len(values)], ">u2").tobytes() + values.astype(">f4").tobytes()
+        elif data_format == "4":
+            # IBM binary: '#I', byte count and IEEE-754 single precision values, least significant byte first
+            return b"#I" + np.array([4 * len(values)], "<u2").tobytes() + values.astype("<f4").tobytes()
+        return ",".join("{:+.4E}".format(x) for x in values)
+
+    def status(self, code):
+        if code == "0":
+            return self.idn
+        elif code == "3":
+            # machine status: only the srq mask is at a fixed position
+            return "MSTG01,0,0K0M{},0N{}R{}T{}V1Y0".format(self.settings["M"][0].zfill(3), self.settings["N"][0],
+                                                          self.settings["R"][0], ",".join(self.settings["T"]))
+        elif code == "4":
+            # measurement parameters: IMPL,<range>F<source>,<function>O<sensing>P<filter>S<integration>W<delay>Z<suppress>
+            sense = "I" if self.source() == "v" else "V"
+            return "{}MPL,{}F{},{}O{}P{}S{}W{}Z{}".format(sense, self.settings["L"][1].zfill(2), self.settings["F"][0],
+                                                         self.settings["F"][1], self.settings["O"][0], self.settings["P"][0],
+                                                         self.settings["S"][0], self.settings["W"][0], self.settings["Z"][0])
+        elif code == "5":
+            return "ICP{:.3E}".format(float(self.settings["L"][0]))
+        return ""
+
+
+def scpi_short(text):
+    """ Reduce a SCPI header (or keyword argument) to lowercase short form, so that e.g. 'SENSe:VOLTage:CHANnel1:RANGe'
+    and 'sens:volt:chan1:rang:upp' address the same setting. Optional default nodes are dropped. """
+    nodes = []
+    for node in text.strip().strip("'\"").lstrip(":").lower().split(":"):
+        match = re.fullmatch(r"(\*?[a-z_]+)(\d*)(\??)", node)
+        if match is None:
+            nodes.append(node)
+            continue
+        word, suffix, query = match.groups()
+        if len(word) > 4 and not word.startswith("*"):
+            word = word[:3] if word[3] in "aeiou" else word[:4]
+        nodes.append(word + suffix + query)
+    while len(nodes) > 1 and nodes[-1].rstrip("?") in ["upp", "imm"]:
+        query = nodes.pop().endswith("?")
+        nodes[-1] += "?" if query else ""
+    return ":".join(nodes)
+
+
+class DMM2182AEmulator(SimulatedInstrument):
+    """ Emulator of a Keithley 2182A nanovoltmeter, including the trace buffer. The meter reads the voltage across the
+    device model when the current 'excitation' is forced through it. Headers are stored in SCPI short form. """
+
+    idn = "KEITHLEY INSTRUMENTS INC.,MODEL 2182A,0000000,C02 /A02"
+    defaults = {"sens:volt:nplc": "5", "sens:volt:dfil:coun": "10", "sens:volt:dfil:stat": "1",
+                "sens:volt:dfil:tcon": "MOV", "sens:volt:dfil:wind": "0.01", "sens:volt:lpas:stat": "1",
+                "sens:volt:chan1:rang": "120", "sens:volt:chan1:rang:auto": "1", "sens:volt:dig": "8",
+                "sens:func": '"VOLT"', "sens:chan": "1", "init:cont": "1", "trig:sour": "IMM", "trig:coun": "1",
+                "trig:del": "0", "samp:coun": "1", "*sre": "0", "stat:meas:enab": "0", "trac:poin": "1024",
+                "trac:feed": "SENS", "trac:feed:cont": "NEV", "form:data": "ASC", "form:bord": "SWAP"}
+    line_freq = 50
+
+    def __init__(self, device=None, noise=0.0, seed=None, excitation=1e-6):
+        self.excitation = excitation  # Current (in A) forced through the device
+        super().__init__(device, noise, seed)
+
+    def reset(self):
+        super().reset()
+        self.latest = 0.0
+        self.initiated = False
+        self.buffer = []
+
+    def reading(self):
+        return float(self.measure(self.device.voltage(self.excitation)))
+
+    def trigger(self):
+        # take a reading and store it in the trace buffer if enabled. When the buffer fills, storage stops and the
+        # buffer full bit (512) may raise a service request
+        self.latest = self.reading()
+        if self.settings["trac:feed:cont"] == "NEXT" and len(self.buffer) < int(self.settings["trac:poin"]):
+            self.buffer.append(self.latest)
+            if len(self.buffer) == int(self.settings["trac:poin"]):
+                self.settings["trac:feed:cont"] = "NEV"
+                if int(self.settings["*sre"]) & 1 and int(self.settings["stat:meas:enab"]) & 512:
+                    self.raise_srq(len(self.buffer) * self.conversion_time())
+
+    def data(self, values):
+        # readings as ASCII values, or as an indefinite length binary block for the SREal and DREal formats. The format
+        # applies to the trace buffer and to the SENSe:DATA readings alike
+        if self.settings["form:data"] in ["SRE", "DRE"]:
+            dtype = ("<" if self.settings["form:bord"] == "SWAP" else ">") + ("f4" if self.settings["form:data"] == "SRE" else "f8")
+            return b"#0" + np.array(values, dtype).tobytes() + b"\n"
+        return ",".join("{:+.9E}".format(x) for x in values)
+
+    def conversion_time(self):
+        count = int(self.settings["sens:volt:dfil:coun"]) if self.settings["sens:volt:dfil:stat"] == "1" else 1
+        return float(self.settings["sens:volt:nplc"]) / self.line_freq * count
+
+    def execute(self, command):
+        header, _, argument = command.partition(" ")
+        key = scpi_short(header)
+        if key == "syst:pres":
+            self.reset()
+        elif key == "init":
+            self.initiated = True
+            if self.settings["trig:sour"] == "IMM" and self.settings["trig:coun"].upper() not in ["INF", "9.9E37"]:
+                # the trigger layer runs by itself: take 'trigger count' readings, then go back to idle
+                for _ in range(int(float(self.settings["trig:coun"]))):
+                    self.trigger()
+                self.initiated = False
+        elif key == "*trg":
+            if self.initiated or self.settings["init:cont"] == "1":
+                self.trigger()
+                if int(self.settings["*sre"]) & 1 and int(self.settings["stat:meas:enab"]) & 32:
+                    self.raise_srq(self.conversion_time())
+        elif key == "trac:data?":
+            return self.data(self.buffer)
+        elif key == "trac:cle":
+            self.buffer = []
+        elif key in ["sens:data:fres?", "sens:data:lat?", "sens:data?", "fetc?", "read?"]:
+            if key == "read?":
+                self.latest = self.reading()
+            return self.data([self.latest])
+        elif key == "abor":
+            self.initiated = False
+        elif key.startswith("*"):
+            return super().execute(command)
+        elif key.endswith("?"):
+            return self.settings.get(key[:-1], "0")
+        else:
+            self.settings[key] = self.argument(argument)
+
+    @staticmethod
+    def argument(text):
+        # the instrument answers queries with numbers, booleans as 1/0 and keywords (quoted or not) in short form
+        text = text.strip()
+        if text.lower() in ["on", "off"]:
+            return "1" if text.lower() == "on" else "0"
+        if re.fullmatch(r"['\"]?[A-Za-z][A-Za-z:]*['\"]?", text) and text.lower() not in ["inf", "def", "max", "min"]:
+            value = scpi_short(text).upper()
+            return '"{}"'.format(value) if text[0] in "'\"" else value
+        return text
+
+
+class DMM2000Emulator(DMM2182AEmulator):
+    """ Emulator of a Keithley 2000 multimeter, including the trace buffer. """
+
+    idn = "KEITHLEY INSTRUMENTS INC.,MODEL 2000,0000000,A20 /A02"
+    defaults = {"sens:func": '"VOLT:DC"', "sens:volt:dc:nplc": "1", "sens:volt:dc:aver:stat": "0",
+                "sens:volt:dc:aver:tcon": "MOV", "sens:volt:dc:aver:coun": "10", "sens:volt:dc:rang": "1010",
+                "sens:volt:dc:rang:auto": "1", "sens:volt:dc:dig": "7", "init:cont": "1", "trig:sour": "IMM",
+                "trig:coun": "1", "trig:del": "0", "samp:coun": "1", "trac:poin": "1024", "trac:feed": "SENS",
+                "trac:feed:cont": "NEV", "*sre": "0", "stat:meas:enab": "0", "form:data": "ASC", "form:bord": "SWAP"}
+
+    def conversion_time(self):
+        return 1 / self.line_freq
+
+    def execute(self, command):
+        key = scpi_short(command.partition(" ")[0])
+        if key == "sens:data?":
+            return self.data([self.reading()])
+        else:
+            return super().execute(command)
+
+
+class Lakeshore336Emulator(SimulatedInstrument):
+    """ Emulator of a Lakeshore 336 temperature controller. Output 1 heats sensor A, output 2 heats sensor B. """
+
+    idn = "LSCI,MODEL336,SIM0000/0000000,1.0"
+    sensors = {"0": None, "a": 0, "b": 1, "c": 2, "d": 3, "1": 0, "2": 1, "3": 2, "4": 3}
+
+    def __init__(self, device=None, noise=0.0, seed=None, temperature=300.0, base_temperature=4.2, tau=60.0):
+        self.stages = [ThermalStage(temperature, base_temperature, tau) for _ in range(4)]
+        super().__init__(device, noise, seed)
+
+    def reset(self):
+        super().reset()
+        self.settings = {"range": {"1": "0", "2": "0"}, "pid": {"1": "50,20,0", "2": "50,20,0"},
+                         "filter": {x: "0,1,2" for x in "abcd"}}
+        for stage in self.stages:
+            stage.update(heater=False)
+
+    def temperatures(self):
+        return [float(self.measure(stage.temperature())) for stage in self.stages]
+
+    def execute(self, command):
+        header, _, argument = command.partition(" ")
+        key = header.strip().lower()
+        args = [x.strip().lower() for x in argument.split(",")]
+        if key == "krdg?":
+            sensor = self.sensors[args[0]]
+            temperatures = self.temperatures()
+            if sensor is None:
+                return ",".join("{:+.3f}".format(x) for x in temperatures)
+            return "{:+.3f}".format(temperatures[sensor])
+        elif key == "setp":
+            self.stages[int(args[0]) - 1].update(setpoint=float(args[1]))
+        elif key == "setp?":
+            return "{:+.3f}".format(self.stages[int(args[0]) - 1].setpoint)
+        elif key == "range":
+            heater_range = {"off": "0", "low": "1", "medium": "2", "high": "3"}.get(args[1], args[1])
+            self.settings["range"][args[0]] = heater_range
+            self.stages[int(args[0]) - 1].update(heater=heater_range != "0")
+        elif key in ["pid", "filter"]:
+            self.settings[key][args[0]] = ",".join(args[1:])
+        elif key in ["range?", "pid?", "filter?"]:
+            return self.settings[key[:-1]][args[0]]
+        else:
+            return super().execute(command)
+
+
+class MercuryITCEmulator(SimulatedInstrument):
+    """ Emulator of an Oxford Instruments Mercury ITC (SCPI-like 'READ:DEV:...' and 'SET:DEV:...' commands). """
+
+    idn = "IDN:OXFORD INSTRUMENTS:MERCURY ITC:SIM0000:1.0"
+    devices = ["MB1.T1", "DB6.T1", "DB7.T1", "DB8.T1"]
+
+    def __init__(self, device=None, noise=0.0, seed=None, temperature=300.0, base_temperature=1.5, tau=60.0):
+        self.stages = {x: ThermalStage(temperature, base_temperature, tau) for x in self.devices}
+        super().__init__(device, noise, seed)
+
+    def execute(self, command):
+        fields = command.strip().split(":")
+        if fields[0] == "*IDN?":
+            return self.idn
+        elif fields[0] in ["*RST", "*CLS"]:
+            return "STAT:{}:VALID".format(fields[0])
+        elif fields[:3] == ["READ", "SYS", "MAN"]:
+            return "STAT:SYS:MAN:HW_" + self.idn
+        elif fields[:3] == ["READ", "SYS", "CAT"]:
+            return "STAT:SYS:CAT" + "".join(":DEV:{}:TEMP".format(x) for x in self.devices)
+        elif fields[:2] == ["READ", "DEV"] and fields[2] in self.stages and fields[4:6] == ["LOOP", "TSET"]:
+            return "STAT:{}:{:.4f}K".format(":".join(fields[1:]), self.stages[fields[2]].setpoint)
+        elif fields[:2] == ["READ", "DEV"] and fields[2] in self.stages and fields[4:6] == ["LOOP", "ENAB"]:
+            return "STAT:{}:{}".format(":".join(fields[1:]), "ON" if self.stages[fields[2]].heater else "OFF")
+        elif fields[:2] == ["READ", "DEV"] and fields[2] in self.stages:
+            temperature = float(self.measure(self.stages[fields[2]].temperature()))
+            return "STAT:{}:{:.4f}K".format(":".join(fields[1:]), temperature)
+        elif fields[:2] == ["SET", "DEV"] and fields[2] in self.stages and fields[4:6] == ["LOOP", "TSET"]:
+            self.stages[fields[2]].update(setpoint=float(fields[6]))
+            return "STAT:{}:VALID".format(command.strip())
+        elif fields[:2] == ["SET", "DEV"] and fields[2] in self.stages and fields[4:6] == ["LOOP", "ENAB"]:
+            self.stages[fields[2]].update(heater=fields[6] == "ON")
+            return "STAT:{}:VALID".format(command.strip())
+        return "STAT:{}:INVALID".format(command.strip())
+
+
+class Agilent4294AEmulator(SimulatedInstrument):
+    """ Emulator of an Agilent 4294A impedance analyzer measuring the impedance of the device model. """
+
+    idn = "Agilent Technologies,4294A,SIM00000,01.11"
+    defaults = {"meas": "imph", "swpp": "freq", "swpt": "lin", "star": "40", "stop": "110e6", "poin": "201",
+                "cwfreq": "1e6", "dcv": "0", "dci": "0", "dcmod": "volt", "dco": "off", "trac": "a", "form": "4",
+                "powmod": "volt", "powe": "0.5", "bwfact": "1", "paver": "off", "paverfact": "4", "sdelt": "0", "pdelt": "0"}
+
+    def reset(self):
+        super().reset()
+        self.sweep_parameter = np.zeros(0)
+        self.traces = {"a": np.zeros(0), "b": np.zeros(0)}
+
+    def single_sweep(self):
+        start, stop, points = float(self.settings["star"]), float(self.settings["stop"]), int(float(self.settings["poin"]))
+        if self.settings["swpt"] == "log":
+            x = np.logspace(np.log10(start), np.log10(stop), points)
+        else:
+            x = np.linspace(start, stop, points)
+        bias = float(self.settings["dcv"]) if self.settings["dco"] == "on" else 0.0
+        if self.settings["swpp"] == "dcb":
+            z = np.array([complex(self.device.impedance(float(self.settings["cwfreq"]), v)) for v in x])
+        else:
+            z = self.device.impedance(x, bias)
+        self.sweep_parameter = x
+        if self.settings["meas"] == "irim":
+            a, b = z.real, z.imag
+        else:
+            a, b = np.abs(z), np.rad2deg(np.angle(z))
+        self.traces = {"a": self.measure(a), "b": self.measure(b)}
+
+    def output(self, data):
+        # ASCII (FORM4), or an IEEE 488.2 definite length block of big endian REAL32 (FORM2) or REAL64 (FORM3) values
+        if self.settings["form"] in ["2", "3"]:
+            data = np.asarray(data, ">f4" if self.settings["form"] == "2" else ">f8").tobytes()
+            return "#6{:06d}".format(len(data)).encode() + data + b"\n"
+        return ",".join("{:+.12E}".format(x) for x in data)
+
+    def execute(self, command):
+        header, _, argument = command.partition(" ")
+        key = header.strip().lower()
+        if key.startswith("form") and key[4:].isdigit():
+            self.settings["form"] = key[4:]
+        elif key == "sing":
+            self.single_sweep()
+        elif key == "poin?":
+            return self.settings["poin"]
+        elif key == "outpdtrc?":
+            data = np.zeros(2 * len(self.traces[self.settings["trac"]]))
+            data[0::2] = self.traces[self.settings["trac"]]
+            return self.output(data)
+        elif key == "outpswprm?":
+            return self.output(self.sweep_parameter)
+        elif key in ["hold", "auto", "trgs", "e4tp", "beepwarn"]:
+            pass
+        else:
+            # keywords are answered in upper case, as the unit does
+            response = super().execute(command.lower())
+            return response.upper() if response is not None and response.isalpha() else response
+
+
+class TDS2002Emulator(SimulatedInstrument):
+    """ Emulator of a Tektronix TDS2002 oscilloscope recording the step response of the device model: channel 1 is a
+    voltage step of 'amplitude' at the trigger, channel 2 the voltage across the device capacitance (the time constant
+    is R * C for an RC network). Curves are digitized at 25 levels per division with 8 bits. """
+
+    idn = "TEKTRONIX,TDS 2002,0,CF:91.1CT FV:v4.12 TDS2CM:CMV:v1.04"
+    defaults = {"head": "1", "data:sour": "CH1", "data:encd": "ASC", "data:widt": "1", "data:star": "1", "data:stop": "2500",
+                "ch1:scal": "1", "ch2:scal": "1", "ch1:pos": "0", "ch2:pos": "0", "hor:main:secd": "1e-3",
+                "hor:main:pos": "0", "acq:stop": "RUNS", "acq:mode": "SAMP"}
+    record = 2500
+
+    def __init__(self, device=None, noise=0.0, seed=None, amplitude=1.0):
+        self.amplitude = amplitude  # Step amplitude (in V)
+        super().__init__(device, noise, seed)
+
+    def reset(self):
+        super().reset()
+        self.curves = {}
+
+    def time_constant(self):
+        return getattr(self.device, "resistance", 0.0) * getattr(self.device, "capacitance", 0.0)
+
+    def acquire(self):
+        # one triggered acquisition of both channels, as digitizer levels
+        sec_div = float(self.settings["hor:main:secd"])
+        t = -5 * sec_div + float(self.settings["hor:main:pos"]) + 10 * sec_div / self.record * np.arange(self.record)
+        tau = self.time_constant()
+        v = {"CH1": self.amplitude * (t >= 0),
+             "CH2": self.amplitude * (t >= 0) * ((1 - np.exp(-np.maximum(t, 0) / tau)) if tau > 0 else 1.0)}
+        for channel, val in v.items():
+            scale, position = float(self.settings[f"{channel.lower()}:scal"]), float(self.settings[f"{channel.lower()}:pos"])
+            self.curves[channel] = np.clip(np.round(self.measure(val) / scale * 25 + position * 25), -128, 127)
+
+    def preamble(self):
+        channel = self.settings["data:sour"]
+        width = int(self.settings["data:widt"])
+        sec_div = float(self.settings["hor:main:secd"])
+        scale, position = float(self.settings[f"{channel.lower()}:scal"]), float(self.settings[f"{channel.lower()}:pos"])
+        points = int(self.settings["data:stop"]) - int(self.settings["data:star"]) + 1
+        fields = [width, 8 * width, "BIN" if self.settings["data:encd"] != "ASC" else "ASC",
+                  "RP" if self.settings["data:encd"] == "RPB" else "RI", "MSB", points,
+                  '"{}, DC coupling, {:.1E} V/div, {:.1E} s/div, {} points, Sample mode"'.format(channel.capitalize(), scale, sec_div, self.record),
+                  "Y", "{:.6E}".format(10 * sec_div / self.record), 0,
+                  "{:.6E}".format(-5 * sec_div + float(self.settings["hor:main:pos"])), '"s"',
+                  "{:.6E}".format(scale / 25 / 256 ** (width - 1)), "0.0E0", "{:.6E}".format((position * 25 + (128 if self.settings["data:encd"] == "RPB" else 0)) * 256 ** (width - 1)), '"Volts"']
+        return ";".join(str(x) for x in fields)
+
+    def curve(self):
+        if not self.curves or self.settings["acq:stop"] != "SEQ":
+            self.acquire()
+        width = int(self.settings["data:widt"])
+        data = self.curves[self.settings["data:sour"]][int(self.settings["data:star"]) - 1:int(self.settings["data:stop"])]
+        data = data.astype(np.int64) * 256 ** (width - 1)
+        if self.settings["data:encd"] == "ASC":
+            return ",".join(str(x) for x in data)
+        if self.settings["data:encd"] == "RPB":
+            data = data + 128 * 256 ** (width - 1)
+        dtype = (">i" if self.settings["data:encd"] == "RIB" else ">u") + str(width)
+        data = data.astype(dtype).tobytes()
+        return "#{}{}".format(len(str(len(data))), len(data)).encode() + data + b"\n"
+
+    def execute(self, command):
+        header, _, argument = command.partition(" ")
+        key = scpi_short(header)
+        if key == "aut":
+            pass
+        elif key == "acq:stat":
+            if argument.strip().lower() in ["run", "on", "1"] and self.settings["acq:stop"] == "SEQ":
+                self.acquire()
+        elif key == "wfmp?":
+            return self.preamble()
+        elif key == "curv?":
+            return self.curve()
+        elif key.startswith("*"):
+            return super().execute(command)
+        elif key.endswith("?"):
+            return self.settings.get(key[:-1], "0")
+        else:
+            self.settings[key] = DMM2182AEmulator.argument(argument).upper()
+
+
+'''----- Resources -----'''
+
+
+class SimulatedResource:
+    """ A stand-in for a pyvisa message based resource. Each command is delayed by 'latency' (in s), or by the latency of
+    the longest matching prefix in 'command_latency', e.g. {"SNAP?": 5e-3, "TRCB?": 50e-3}. """
+
+    def __init__(self, instrument, resource_name="SIM0::1::INSTR", latency=0.0, command_latency=None):
+        self.instrument = instrument
+        self.resource_name = resource_name
+        self.latency = latency  # Default latency (in s) of each command
+        self.command_latency = command_latency if command_latency is not None else {}  # Latency (in s) per command prefix
+        self.timeout = 2000  # Timeout (in ms)
+        self.read_termination = None
+        self.write_termination = "\n"
+        self.responses = deque()
+
+    def command_delay(self, message):
+        prefixes = [x for x in self.command_latency if message.upper().startswith(x.upper())]
+        if prefixes:
+            return self.command_latency[max(prefixes, key=len)]
+        return self.latency
+
+    def timeout_error(self):
+        return pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_timeout)
+
+    def write(self, message):
+        time.sleep(self.command_delay(message))
+        self.responses.extend(self.instrument.write(message))
+        return len(message)
+
+    def read_raw(self, size=None):
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout / 1e3
+        while not self.responses:
+            data = self.instrument.stream_bytes()
+            if data:
+                self.responses.append(data)
+            elif deadline is not None and time.monotonic() > deadline:
+                raise self.timeout_error()
+            else:
+                time.sleep(1e-3)
+        response = self.responses.popleft()
+        return response if isinstance(response, bytes) else response.encode("latin-1")
+
+    def read_bytes(self, count, chunk_size=None, break_on_termchar=False):
+        # read exactly 'count' bytes, joining consecutive responses (e.g. several binary transfers on one line)
+        data = b""
+        while len(data) < count:
+            data += self.read_raw()
+        if len(data) > count:
+            self.responses.appendleft(data[count:])
+        return data[:count]
+
+    def read(self):
+        response = self.read_raw().decode("latin-1")
+        if self.read_termination:
+            response = response.rstrip(self.read_termination)
+        return response
+
+    def query(self, message, delay=None):
+        self.write(message)
+        if delay:
+            time.sleep(delay)
+        return self.read()
+
+    def query_ascii_values(self, message, converter="f", separator=",", container=list, delay=None):
+        values = [float(x) if converter == "f" else int(x) for x in self.query(message, delay).split(separator) if x.strip() != ""]
+        return container(values)
+
+    def query_binary_values(self, message, datatype="f", is_big_endian=False, container=list, delay=None, **kwargs):
+        self.write(message)
+        if delay:
+            time.sleep(delay)
+        return pyvisa.util.from_ieee_block(self.read_raw(), datatype, is_big_endian, container)
+
+    def wait_for_srq(self, timeout=25000):
+        delay = self.instrument.service_request_delay()
+        if delay is None or (timeout is not None and delay > timeout / 1e3):
+            if timeout is not None:
+                time.sleep(timeout / 1e3)
+            raise self.timeout_error()
+        time.sleep(delay)
+
+    def read_stb(self):
+        return self.instrument.status_byte()
+
+    def clear(self):
+        self.responses.clear()
+
+    def close(self):
+        self.responses.clear()
+
+
+class SimulatedResourceManager:
+    """ A stand-in for pyvisa.ResourceManager, serving the instrument emulators registered by address. """
+
+    def __init__(self, instruments=None, latency=0.0, command_latency=None):
+        self.instruments = dict(instruments) if instruments is not None else {}
+        self.latency = latency
+        self.command_latency = command_latency
+
+    def add(self, resource_name, instrument):
+        self.instruments[resource_name] = instrument
+
+    def list_resources(self, query="?*::INSTR"):
+        return tuple(self.instruments)
+
+    def open_resource(self, resource_name, **kwargs):
+        if resource_name not in self.instruments:
+            raise pyvisa.errors.VisaIOError(pyvisa.constants.StatusCode.error_resource_not_found)
+        resource = SimulatedResource(self.instruments[resource_name], resource_name, self.latency, self.command_latency)
+        for key, val in kwargs.items():
+            setattr(resource, key, val)
+        return resource
+
+    def close(self):
+        pass
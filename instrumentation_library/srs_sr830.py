@@ -1,10 +1,14 @@
 import numpy as np
 import time
-import struct
+import threading
+import pyvisa
+import completion
 from collections import defaultdict
+from instrument import Instrument
+from ring_buffer import RingBuffer
 
 
-class sr830():
+class sr830(Instrument):
 
     ''' Communications with the SR830 uses ASCII characters. Commands may be in either UPPER or lower case and may contain any number of
 embedded space characters. A command to the SR830 consists of a four character command mnemonic, arguments if necessary, and a command terminator.
@@ -109,9 +113,9 @@ both buffers are cleared and an error reported. '''
                        "gpib": "1"},
               "sync": {"off": "0",
                        "on": "1"},
-              "tran": {"off": 0,
-                       "on dos": 1,
-                       "on win": 2}}
+              "tran": {"off": "0",
+                       "on dos": "1",
+                       "on win": "2"}}
 
     # SCPI dictionary for reading from instrumentation
     scpi_r = defaultdict(dict)
@@ -119,107 +123,142 @@ both buffers are cleared and an error reported. '''
         for subkey, subval in val.items():
             scpi_r[key][subval] = subkey
 
-    def __init__(self, visa, wait=0.01):
-        # create an empty local registry and populate the registry with the current instrumentation settings
-        # when adding/removing parameters, amend "get_settings" method
-
-        self.visa = visa
-        self.wait = wait  # Wait time (in s) after each read / write operation
+    def __init__(self, visa, wait=0.0, reset=True):
+        # create an empty local registry, which is populated with the settings as they are written to / read from
+        # the instrumentation. When adding/removing parameters, amend "get_settings" method
+        # With reset=False the unit is attached as it is: the settings are read back once into the registry (one
+        # batched query) instead of resetting the unit and zeroing the amplitude
+
+        # Commands go through the queue of the bus (see Instrument). 'wait' (in s) holds the unit off after each command
+        # without an entry in 'delays'
+        super().__init__(visa, wait)
+        self.registry = {}  # Last written / read settings, by command mnemonic
+        self.stream_buffer = None  # Ring buffer of the streamed (X, Y) samples (see "start_stream")
+        self.stream_thread = None
+        self.stream_error = None
+        self.streaming = threading.Event()
+        self.scan_start = None  # Time (monotonic, in s) of the last STRT
         self.model = self.read_model()
-        self.visa.write("*RST")  # restore unit to factory default
-        self.set_interface("gpib")
-        self.set_amplitude(0)
+        if reset is True:
+            self.reset()
+            self.set_interface("gpib")
+            self.set_amplitude(0)
+        else:
+            self.set_interface("gpib")
+            self.resync()
+
+    '''----- Communication functions -----'''
 
+    # The SR830 executes the commands in the order received and holds off the bus when its 256 characters input buffer
+    # is full: no delay is needed between commands. Longer command lines are split at a command boundary (see Instrument)
+    max_line = 255
+    # hold-off (in s) after the commands of the driver which keep the unit busy: the reset to factory default ("reset")
+    # and the reset of the data buffer ("reset_buffer"). Any other command is sent at once ('wait' is 0)
+    delays = {"*RST": 0.5, "REST": 0.05}
 
     '''----- Set settings functions -----'''
 
     def set_reference(self, reference):
         # set reference
-        self.visa.write("FMOD {}".format(self.scpi_w["fmod"][reference]))
-        time.sleep(self.wait)
+        if self.registry.get("fmod") != reference:
+            self.write("FMOD {}".format(self.scpi_w["fmod"][reference]))
+            self.registry["fmod"] = reference
 
     def set_frequency(self, frequency):
         # set frequency
-        self.visa.write("FREQ {}".format(frequency))
-        time.sleep(self.wait)
+        if self.registry.get("freq") != frequency:
+            self.write("FREQ {}".format(frequency))
+            self.registry["freq"] = frequency
 
     def set_harmonic(self, harmonic):
         # set harmonic
-        self.visa.write("HARM {}".format(harmonic))
-        time.sleep(self.wait)
+        if self.registry.get("harm") != harmonic:
+            self.write("HARM {}".format(harmonic))
+            self.registry["harm"] = harmonic
 
     def set_input(self, input):
         # set input
-        self.visa.write("ISRC {}".format(self.scpi_w["isrc"][input]))
-        time.sleep(self.wait)
+        if self.registry.get("isrc") != input:
+            self.write("ISRC {}".format(self.scpi_w["isrc"][input]))
+            self.registry["isrc"] = input
 
     def set_shield(self, shield):
         # set shield
-        self.visa.write("IGND {}".format(self.scpi_w["ignd"][shield]))
-        time.sleep(self.wait)
+        if self.registry.get("ignd") != shield:
+            self.write("IGND {}".format(self.scpi_w["ignd"][shield]))
+            self.registry["ignd"] = shield
 
     def set_coupling(self, coupling):
         # set coupling
-        self.visa.write("ICPL {}".format(self.scpi_w["icpl"][coupling]))
-        time.sleep(self.wait)
+        if self.registry.get("icpl") != coupling:
+            self.write("ICPL {}".format(self.scpi_w["icpl"][coupling]))
+            self.registry["icpl"] = coupling
 
     def set_notch(self, notch):
         # set notch
-        self.visa.write("ILIN {}".format(self.scpi_w["ilin"][notch]))
-        time.sleep(self.wait)
+        if self.registry.get("ilin") != notch:
+            self.write("ILIN {}".format(self.scpi_w["ilin"][notch]))
+            self.registry["ilin"] = notch
 
     def set_sensitivity(self, sensitivity):
         # set sensitivity
-        self.visa.write("SENS {}".format(self.scpi_w["sens"][sensitivity]))
-        time.sleep(self.wait)
+        if self.registry.get("sens") != sensitivity:
+            self.write("SENS {}".format(self.scpi_w["sens"][sensitivity]))
+            self.registry["sens"] = sensitivity
 
     def set_reserve(self, reserve):
         # set reserve
-        self.visa.write("RMOD {}".format(self.scpi_w["rmod"][reserve]))
-        time.sleep(self.wait)
+        if self.registry.get("rmod") != reserve:
+            self.write("RMOD {}".format(self.scpi_w["rmod"][reserve]))
+            self.registry["rmod"] = reserve
 
     def set_integration_time(self, integration_time):
         # set integration time
-        self.visa.write("OFLT {}".format(self.scpi_w["oflt"][integration_time]))
-        time.sleep(self.wait)
+        if self.registry.get("oflt") != integration_time:
+            self.write("OFLT {}".format(self.scpi_w["oflt"][integration_time]))
+            self.registry["oflt"] = integration_time
 
     def set_filter(self, filter):
         # set filter
-        self.visa.write("OFSL {}".format(self.scpi_w["ofsl"][filter]))
-        time.sleep(self.wait)
+        if self.registry.get("ofsl") != filter:
+            self.write("OFSL {}".format(self.scpi_w["ofsl"][filter]))
+            self.registry["ofsl"] = filter
 
     def set_sync_filter(self, sync):
         # set synchronous filter
-        self.visa.write("SYNC {}".format(self.scpi_w["sync"][sync]))
-        time.sleep(self.wait)
+        if self.registry.get("sync") != sync:
+            self.write("SYNC {}".format(self.scpi_w["sync"][sync]))
+            self.registry["sync"] = sync
 
     def set_interface(self, interface):
         # set communication interface
-        self.visa.write("OUTX {}".format(self.scpi_w["outx"][interface]))
-        time.sleep(self.wait)
+        if self.registry.get("outx") != interface:
+            self.write("OUTX {}".format(self.scpi_w["outx"][interface]))
+            self.registry["outx"] = interface
 
     def set_sampling_frequency(self, frequency):
         # set sampling frequency
-        self.visa.write("SRAT {}".format(self.scpi_w["srat"][frequency]))
-        time.sleep(self.wait)
+        if self.registry.get("srat") != frequency:
+            self.write("SRAT {}".format(self.scpi_w["srat"][frequency]))
+            self.registry["srat"] = frequency
 
     def set_buffer_type(self, buffer):
         # When the buffer becomes full, data storage can stop or continue. The first case is called 1 Shot (data points are stored for a single buffer length).
         # At the end of the buffer, data storage stops and an audio alarm sounds. The second case is called Loop. In this case, data storage continues at
         # the end of the buffer. The data buffer will store 16383 points and start storing at the beginning again. The most recent 16383 points will be
         # contained in the buffer. Once the buffer has looped around, the oldest point (at any time) is at bin#0 and the most recent point is at bin
-        self.visa.write("SEND {}".format(self.scpi_w["send"][buffer]))
-        time.sleep(self.wait)
+        if self.registry.get("send") != buffer:
+            self.write("SEND {}".format(self.scpi_w["send"][buffer]))
+            self.registry["send"] = buffer
 
     def set_amplitude(self, amplitude):
         # The "SLVL x" command sets or queries the amplitude of the sine output.
         # The parameter x is a voltage (real number of Volts). The value of x will
         # be rounded to 0.002V. The value of x is limited to 0.004 <= x <= 5.000.
-        if amplitude <= 0.004:
-            self.visa.write("SLVL 0.004")
-        else:
-            self.visa.write("SLVL {}".format(amplitude))
-        time.sleep(self.wait)
+        amplitude = max(amplitude, 0.004)
+        if self.registry.get("slvl") != amplitude:
+            self.write("SLVL {}".format(amplitude))
+            self.registry["slvl"] = amplitude
 
     def set_data_transfer_mode(self, mode="off"):
         # data transfer mode can be slow ("off") fast for windows ("on win") or fast for dos ("on dos")
@@ -236,111 +275,111 @@ both buffers are cleared and an error reported. '''
         # listener. Remember, the first transfer will occur with the first point in the scan. If the
         # scan is started from the front panel or from a trigger, then make sure that the SR830 is
         # a talker and the controlling interface a listener BEFORE the scan actually starts.
-        self.visa.write("fast {}".format(self.scpi_w["tran"][mode]))
-        time.sleep(self.wait)
+        if self.registry.get("tran") != mode:
+            self.write("fast {}".format(self.scpi_w["tran"][mode]))
+            self.registry["tran"] = mode
 
     '''----- Read settings functions -----'''
 
     def read_reference(self):
         # read reference
-        val = self.scpi_r["fmod"][self.visa.query("FMOD?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "fmod" not in self.registry:
+            self.registry["fmod"] = self.scpi_r["fmod"][self.query("FMOD?")]
+        return self.registry["fmod"]
 
     def read_frequency(self):
-        # read frequency
-        val = self.visa.query("FREQ?").strip("\n")
-        time.sleep(self.wait)
-        return val
+        # read frequency. With an external reference FREQ? tracks the incoming reference: the unit is always queried
+        if "freq" not in self.registry or self.read_reference() == "external":
+            self.registry["freq"] = float(self.query("FREQ?"))
+        return self.registry["freq"]
 
     def read_harmonic(self):
         # read harmonic
-        val = self.visa.query("HARM?").strip("\n")
-        time.sleep(self.wait)
-        return val
+        if "harm" not in self.registry:
+            self.registry["harm"] = int(self.query("HARM?"))
+        return self.registry["harm"]
 
     def read_input(self):
         # read input
-        val = self.scpi_r["isrc"][self.visa.query("ISRC?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "isrc" not in self.registry:
+            self.registry["isrc"] = self.scpi_r["isrc"][self.query("ISRC?")]
+        return self.registry["isrc"]
 
     def read_shield(self):
         # read shield
-        val = self.scpi_r["ignd"][self.visa.query("IGND?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "ignd" not in self.registry:
+            self.registry["ignd"] = self.scpi_r["ignd"][self.query("IGND?")]
+        return self.registry["ignd"]
 
     def read_coupling(self):
         # read coupling
-        val = self.scpi_r["icpl"][self.visa.query("ICPL?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "icpl" not in self.registry:
+            self.registry["icpl"] = self.scpi_r["icpl"][self.query("ICPL?")]
+        return self.registry["icpl"]
 
     def read_notch(self):
         # read notch
-        val = self.scpi_r["ilin"][self.visa.query("ILIN?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "ilin" not in self.registry:
+            self.registry["ilin"] = self.scpi_r["ilin"][self.query("ILIN?")]
+        return self.registry["ilin"]
 
     def read_sensitivity(self):
         # read sensitivity
-        val = self.scpi_r["sens"][self.visa.query("SENS?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "sens" not in self.registry:
+            self.registry["sens"] = self.scpi_r["sens"][self.query("SENS?")]
+        return self.registry["sens"]
 
     def read_reserve(self):
         # read reserve
-        val = self.scpi_r["rmod"][self.visa.query("RMOD?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "rmod" not in self.registry:
+            self.registry["rmod"] = self.scpi_r["rmod"][self.query("RMOD?")]
+        return self.registry["rmod"]
 
     def read_integration_time(self):
         # read integration time
-        val = self.scpi_r["oflt"][self.visa.query("OFLT?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "oflt" not in self.registry:
+            self.registry["oflt"] = self.scpi_r["oflt"][self.query("OFLT?")]
+        return self.registry["oflt"]
 
     def read_filter(self):
         # read filter
-        val = self.scpi_r["ofsl"][self.visa.query("OFSL?").strip("\n").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "ofsl" not in self.registry:
+            self.registry["ofsl"] = self.scpi_r["ofsl"][self.query("OFSL?")]
+        return self.registry["ofsl"]
 
     def read_sync_filter(self):
         # read synchronous filter
-        val = self.scpi_r["sync"][self.visa.query("SYNC?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "sync" not in self.registry:
+            self.registry["sync"] = self.scpi_r["sync"][self.query("SYNC?")]
+        return self.registry["sync"]
 
     def read_interface(self):
         # read communication interface
-        val = self.scpi_r["outx"][self.visa.query("OUTX?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "outx" not in self.registry:
+            self.registry["outx"] = self.scpi_r["outx"][self.query("OUTX?")]
+        return self.registry["outx"]
 
     def read_sampling_frequency(self):
         # read sampling frequency
-        val = self.scpi_r["srat"][self.visa.query("SRAT?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "srat" not in self.registry:
+            self.registry["srat"] = self.scpi_r["srat"][self.query("SRAT?")]
+        return self.registry["srat"]
 
     def read_buffer_type(self):
         # read buffer type
-        val = self.scpi_r["send"][self.visa.query("SEND?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        if "send" not in self.registry:
+            self.registry["send"] = self.scpi_r["send"][self.query("SEND?")]
+        return self.registry["send"]
 
     def read_model(self):
         # return model number
-        val = self.visa.query("*IDN?").strip("\n")
-        time.sleep(self.wait)
-        return val
+        return self.query("*IDN?")
 
     def read_data_transfer_mode(self):
-        val = self.scpi_r["tran"][self.visa.query("fast?").strip("\n")]
-        time.sleep(self.wait)
-        return val
+        # read data transfer mode
+        if "tran" not in self.registry:
+            self.registry["tran"] = self.scpi_r["tran"][self.query("fast?")]
+        return self.registry["tran"]
 
     '''----- Operation functions -----'''
 
@@ -357,70 +396,91 @@ both buffers are cleared and an error reported. '''
                 time.sleep(delay)
 
     def read(self):
-        xy = self.visa.query("SNAP? 1, 2, 9")
-        time.sleep(self.wait)
+        xy = self.query("SNAP? 1, 2, 9")
         x = np.single(xy.split(",")[0])
         y = np.single(xy.split(",")[1])
         # freq = np.single(xy.split(",")[2])
         return x, y
 
     def read_buffer(self, channel, bin_start=0, bin_end=16383, mode="ascii"):
-        # read buffer in mode "mode". Bins are numbered from 0 to N-1, where N is the number of samples stored in buffer
+        # read buffer in mode "mode". Bins are numbered from 0 to N-1, where N is the number of samples stored in buffer.
+        # In binary mode the values are transferred as IEEE 4-byte floats (little endian) and decoded without copy
         self.pause_buffer()
         if mode == "ascii":
-            reading = self.visa.query("TRCA?{},{},{}".format(channel, bin_start, bin_end)).split(",")[0:-1]
-            reading = np.array([float(x) for x in reading])
+            reading = self.query("TRCA?{},{},{}".format(channel, bin_start, bin_end)).split(",")[0:-1]
+            reading = np.array(reading, dtype=float)
         elif mode == "binary":
-            self.visa.write("TRCB?{},{},{}".format(channel, bin_start, bin_end))
-            reading = self.visa.read_raw()
-            reading = np.array([float(x[0]) for x in struct.iter_unpack('f', reading)])
-        time.sleep(self.wait)
+            reading = np.frombuffer(self.query_raw("TRCB?{},{},{}".format(channel, bin_start, bin_end)), dtype="<f4")
         return reading
 
+    def read_buffers(self, bin_start=0, n_bins=None):
+        # read X (channel 1) and Y (channel 2) buffers in one binary transaction and return them as float32 arrays.
+        # If "n_bins" is None, all the bins stored from "bin_start" onwards are read
+        self.pause_buffer()
+        if n_bins is None:
+            n_bins = self.read_buffer_length() - bin_start
+        if n_bins <= 0:
+            return np.zeros(0, dtype="<f4"), np.zeros(0, dtype="<f4")
+        reading = self.query_raw("TRCB?1,{0},{1};TRCB?2,{0},{1}".format(bin_start, n_bins), 8 * n_bins)
+        reading = np.frombuffer(reading, dtype="<f4").reshape(2, n_bins)
+        return reading[0], reading[1]
+
+    def read_buffer_length(self):
+        # return the number of points stored in the buffer
+        return int(self.query("SPTS?"))
+
     def start_filling_buffer(self):
         self.reset_buffer()
-        self.visa.write("STRT")
-        time.sleep(self.wait)
+        self.write("STRT")
+        self.sync()
+        self.scan_start = time.monotonic()
 
     def pause_buffer(self):
         # reset buffer
-        self.visa.write("PAUS")
-        time.sleep(self.wait)
+        self.write("PAUS")
 
     def reset_buffer(self):
         # stop buffer storage and reset buffer
-        self.visa.write("REST")
-        time.sleep(self.wait)
+        self.write("REST")
 
     def send_trigger(self):
-        self.visa.write("TRIG")  # send a trigger signal to the lockin
-        time.sleep(self.wait)
+        self.write("TRIG")  # send a trigger signal to the lockin
 
     def stop(self):
-        self.visa.write("SLVL 0.004")
-        time.sleep(self.wait)
+        self.set_amplitude(0.004)
+
+    def reset(self):
+        # restore unit to factory default and forget the registry
+        self.write("*RST")
+        self.registry = {}
+
+    def resync(self):
+        # discard the registry and read the settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return self.get_settings()
 
     def configure(self, reference="internal", amplitude=0, frequency=1000, harmonic=1, input="a-b", shield="float", coupling="ac", sensitivity="20 uV/pA",
                 reserve="normal", integration_time=100e-3, filter="24 dB/oct", notch="no filter", sampling=512, buffer="shot", sync="off"):
-        # the unit is always on. To start storing readings in the buffer one has to run "measure"
-        self.set_reference(reference)
-        if reference == "internal":
-            self.set_frequency(frequency)
+        # the unit is always on. To start storing readings in the buffer one has to run "measure".
+        # All the settings are sent on one command line
+        with self.batch():
+            self.set_reference(reference)
+            if reference == "internal":
+                self.set_frequency(frequency)
+            self.set_harmonic(harmonic)
             self.set_amplitude(amplitude)
-        self.set_harmonic(harmonic)
-        self.set_amplitude(amplitude)
-        self.set_input(input)
-        self.set_shield(shield)
-        self.set_coupling(coupling)
-        self.set_sensitivity(sensitivity)
-        self.set_reserve(reserve)
-        self.set_integration_time(integration_time)
-        self.set_filter(filter)
-        self.set_notch(notch)
-        self.set_sampling_frequency(sampling)
-        self.set_buffer_type(buffer)
-        self.set_sync_filter(sync)
-        self.reset_buffer()
+            self.set_input(input)
+            self.set_shield(shield)
+            self.set_coupling(coupling)
+            self.set_sensitivity(sensitivity)
+            self.set_reserve(reserve)
+            self.set_integration_time(integration_time)
+            self.set_filter(filter)
+            self.set_notch(notch)
+            self.set_sampling_frequency(sampling)
+            self.set_buffer_type(buffer)
+            self.set_sync_filter(sync)
+            self.reset_buffer()
 
     def measure(self, samples, reference="internal", frequency=1000, harmonic=1, input="a", shield="float", coupling="ac", sensitivity="1 V/uA",
                 reserve="normal", time=1E-3, filter="6 dB/oct", notch="both", sampling=512, buffer="shot", sync="off"):
@@ -428,31 +488,117 @@ both buffers are cleared and an error reported. '''
                              filter, notch, sampling, buffer, sync)
         self.start_filling_buffer()
         self.wait_for_buffer_full(size=samples)
-        data1 = self.read_buffer(channel=1, bin_start=0, bin_end=samples)
-        data2 = self.read_buffer(channel=2, bin_start=0, bin_end=samples)
+        data1, data2 = self.read_buffers(bin_start=0, n_bins=samples)
         return data1, data2
 
-    def wait_for_buffer_full(self, size):
-        # sr830 cannot raise a service request when the buffer is full. One should query the buffer size and wait until full
-        while int(self.visa.query("SPTS?").strip("\n")) < size:
-            time.sleep(self.wait)
-            continue
+    def wait_for_buffer_full(self, size, timeout=None):
+        # sr830 cannot raise a service request when the buffer is full. Sleep until the scan is expected to have stored
+        # "size" points (from the sampling frequency), then query the buffer size until full. Raise TimeoutError after
+        # "timeout" (in s)
+        rate = self.read_sampling_frequency()
+        if rate != "trigger" and self.scan_start is not None:
+            time.sleep(max(0.0, self.scan_start + size / rate - time.monotonic()))
+        completion.wait_until(lambda: self.read_buffer_length() >= size, timeout, max(self.wait, 1e-3))
+
+    '''----- Streaming functions -----'''
+
+    def start_stream(self, buffer_size=2 ** 20, callback=None, latency=0.1):
+        # Stream X and Y with the fast data transfer mode into the ring buffer "stream_buffer", on a background thread.
+        # "callback(x, y)" is called by the thread for each block of samples, a block lasting about "latency" (in s).
+        # Samples are scaled with the sensitivity: offsets and expands must be off. The sampling frequency cannot be
+        # "trigger". The unit is a talker until "stop_stream": do not send other commands in the meantime
+        rate = self.read_sampling_frequency()
+        scale = np.float32(self.read_sensitivity() / 30000)
+        self.set_buffer_type("loop")
+        self.set_data_transfer_mode("on win")
+        self.flush()
+        self.stream_buffer = RingBuffer(buffer_size, 2, np.float32)
+        self.stream_error = None
+        self.streaming.set()
+        block = max(1, int(rate * latency))
+        # samples per read, so that a read holds the bus for about 10 ms (one sample period below 100 Hz)
+        chunk = min(block, max(1, int(rate * 1e-2)))
+        self.write("STRD")  # the scan starts 0.5 s after STRD
+        self.stream_thread = threading.Thread(target=self.read_stream, args=(block, chunk, scale, callback, 1e3 * (latency + 1.0)), daemon=True)
+        self.stream_thread.start()
+
+    def read_stream(self, block, chunk, scale, callback, timeout):
+        # body of the streaming thread: each sample is X, Y as 2-byte signed integers (+/-30000 is the full scale).
+        # The session is only touched through the bus queue, and each block is read "chunk" samples at a time, so the
+        # other instruments of the bus are served in between
+        previous_timeout = self.call(getattr, self.visa, "timeout")
+        self.send(setattr, self.visa, "timeout", max(timeout, previous_timeout or 0))  # queued before the reads
+        try:
+            while self.streaming.is_set():
+                data = bytearray()
+                while len(data) < 4 * block:
+                    data += self.call(self.visa.read_bytes, min(4 * chunk, 4 * block - len(data)))
+                samples = np.frombuffer(bytes(data), dtype="<i2").reshape(block, 2) * scale
+                self.stream_buffer.put(samples)
+                if callback is not None:
+                    callback(samples[:, 0], samples[:, 1])
+        except pyvisa.errors.VisaIOError as error:
+            self.stream_error = error
+        finally:
+            self.send(setattr, self.visa, "timeout", previous_timeout)
+            self.stream_buffer.close()
+
+    def stream(self, samples=256, timeout=None):
+        # iterate over blocks of "samples" (x, y) from the ring buffer until the stream is stopped and the buffer emptied.
+        # Returns a shorter block if "timeout" (in s) expires first
+        while True:
+            rows = self.stream_buffer.get(samples, timeout)
+            if len(rows) == 0 and self.stream_buffer.closed:
+                return
+            yield rows[:, 0], rows[:, 1]
+
+    def stop_stream(self):
+        # stop the scan and the streaming thread, and restore the slow data transfer mode.
+        # The samples left in "stream_buffer" can still be read
+        self.streaming.clear()
+        if self.stream_thread is not None:
+            self.stream_thread.join()
+            self.stream_thread = None
+        self.write("PAUS")
+        self.call(self.visa.clear)  # discard the partial block left in the output queue
+        self.set_data_transfer_mode("off")
+        if self.stream_error is not None:
+            raise self.stream_error
+
+    def acquire_stream(self, samples):
+        # stream exactly "samples" (x, y) and return them as two float32 arrays
+        self.start_stream(buffer_size=2 * samples)
+        try:
+            rows = self.stream_buffer.get(samples)
+        finally:
+            self.stop_stream()
+        return rows[:, 0], rows[:, 1]
 
     def get_settings(self):
-        # read local registry and return a list of tuples (dictionary)
-        return {"unit": self.read_model(),
-                "frequency": self.read_frequency(),
-                "reference": self.read_reference(),
-                "harmonic": self.read_harmonic(),
-                "input": self.read_input(),
-                "shield": self.read_shield(),
-                "coupling": self.read_coupling(),
-                "sensitivity": self.read_sensitivity(),
-                "reserve": self.read_reserve(),
-                "integration time": self.read_integration_time(),
-                "filter": self.read_filter(),
-                "notch filter": self.read_notch(),
-                "sampling frequency": self.read_sampling_frequency(),
-                "buffer type": self.read_buffer_type(),
-                "ADC line sync": self.read_sync_filter(),
+        # read the settings missing from the local registry with one compound query and return a list of tuples (dictionary)
+        keys = ["fmod", "freq", "harm", "isrc", "ignd", "icpl", "sens", "rmod", "oflt", "ofsl", "ilin", "srat", "send", "sync"]
+        missing = [key for key in keys if key not in self.registry
+                   or (key == "freq" and self.registry.get("fmod") == "external")]
+        for key, val in zip(missing, self.query_batch(["{}?".format(key.upper()) for key in missing])):
+            if key == "freq":
+                self.registry[key] = float(val)
+            elif key == "harm":
+                self.registry[key] = int(val)
+            else:
+                self.registry[key] = self.scpi_r[key][val]
+        return {"unit": self.model,
+                "frequency": self.registry["freq"],
+                "reference": self.registry["fmod"],
+                "harmonic": self.registry["harm"],
+                "input": self.registry["isrc"],
+                "shield": self.registry["ignd"],
+                "coupling": self.registry["icpl"],
+                "sensitivity": self.registry["sens"],
+                "reserve": self.registry["rmod"],
+                "integration time": self.registry["oflt"],
+                "filter": self.registry["ofsl"],
+                "notch filter": self.registry["ilin"],
+                "sampling frequency": self.registry["srat"],
+                "buffer type": self.registry["send"],
+                "ADC line sync": self.registry["sync"],
                 }
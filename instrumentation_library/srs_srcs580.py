@@ -1,6 +1,7 @@
 import numpy as np
 import time
 from collections import defaultdict
+from instrument import QueuedSession
 
 
 class srcs580:
@@ -24,68 +25,88 @@ class srcs580:
 
     def __init__(self, visa, wait=0.01):
 
-        self.visa = visa
+        self.visa = QueuedSession(visa)
         self.wait = wait
+        self.registry = {}  # Last written / read settings. Readers are served from here and redundant writes are skipped
         self.model = self.read_model()
         self.operation("off", "off")
 
     ''' ----- Set functions -----'''
 
     def set_gain(self, gain):
-        self.visa.write("GAIN {}".format(self.scpi_w["gain"][gain]))
-        time.sleep(self.wait)
+        if self.registry.get("gain") != gain:
+            self.visa.write("GAIN {}".format(self.scpi_w["gain"][gain]))
+            time.sleep(self.wait)
+            self.registry["gain"] = gain
 
     def set_response(self, response):
         # set bandwidth between "fast" or "slow"
-        self.visa.write("RESP {}".format(self.scpi_w["resp"][response]))
-        time.sleep(self.wait)
+        if self.registry.get("response") != response:
+            self.visa.write("RESP {}".format(self.scpi_w["resp"][response]))
+            time.sleep(self.wait)
+            self.registry["response"] = response
 
     def set_shield(self, shield):
-        self.visa.write("SHLD {}".format(self.scpi_w["shld"][shield]))
-        time.sleep(self.wait)
+        if self.registry.get("shield") != shield:
+            self.visa.write("SHLD {}".format(self.scpi_w["shld"][shield]))
+            time.sleep(self.wait)
+            self.registry["shield"] = shield
 
     def set_isolation(self, isolation):
-        self.visa.write("ISOL {}".format(self.scpi_w["isol"][isolation]))
-        time.sleep(self.wait)
+        if self.registry.get("isolation") != isolation:
+            self.visa.write("ISOL {}".format(self.scpi_w["isol"][isolation]))
+            time.sleep(self.wait)
+            self.registry["isolation"] = isolation
 
     def set_compliance(self, compliance):
-        self.visa.write("VOLT {}".format(compliance))
-        time.sleep(self.wait)
+        if self.registry.get("compliance") != float(compliance):
+            self.visa.write("VOLT {}".format(compliance))
+            time.sleep(self.wait)
+            self.registry["compliance"] = float(compliance)
 
     def set_input_state(self, state):
-        self.visa.write("INPT {}".format(self.scpi_w["inpt"][state]))
-        time.sleep(self.wait)
+        if self.registry.get("input") != state:
+            self.visa.write("INPT {}".format(self.scpi_w["inpt"][state]))
+            time.sleep(self.wait)
+            self.registry["input"] = state
 
     def set_output_state(self, state):
-        self.visa.write("SOUT {}".format(self.scpi_w["sout"][state]))
-        time.sleep(self.wait)
+        if self.registry.get("output") != state:
+            self.visa.write("SOUT {}".format(self.scpi_w["sout"][state]))
+            time.sleep(self.wait)
+            self.registry["output"] = state
 
     ''' ----- Read functions -----'''
 
     def read_gain(self):
-        val = self.scpi_r["gain"][self.visa.query("GAIN?").strip("\n").strip("\r")]
-        time.sleep(self.wait)
-        return val
+        if "gain" not in self.registry:
+            self.registry["gain"] = self.scpi_r["gain"][self.visa.query("GAIN?").strip("\n").strip("\r")]
+            time.sleep(self.wait)
+        return self.registry["gain"]
 
     def read_response(self):
-        val = self.scpi_r["resp"][self.visa.query("RESP?").strip("\n").strip("\r")]
-        time.sleep(self.wait)
-        return val
+        if "response" not in self.registry:
+            self.registry["response"] = self.scpi_r["resp"][self.visa.query("RESP?").strip("\n").strip("\r")]
+            time.sleep(self.wait)
+        return self.registry["response"]
 
     def read_shield(self):
-        val = self.scpi_r["shld"][self.visa.query("SHLD?").strip("\n").strip("\r")]
-        time.sleep(self.wait)
-        return val
+        if "shield" not in self.registry:
+            self.registry["shield"] = self.scpi_r["shld"][self.visa.query("SHLD?").strip("\n").strip("\r")]
+            time.sleep(self.wait)
+        return self.registry["shield"]
 
     def read_isolation(self):
-        val = self.scpi_r["isol"][self.visa.query("ISOL?").strip("\n").strip("\r")]
-        time.sleep(self.wait)
-        return val
+        if "isolation" not in self.registry:
+            self.registry["isolation"] = self.scpi_r["isol"][self.visa.query("ISOL?").strip("\n").strip("\r")]
+            time.sleep(self.wait)
+        return self.registry["isolation"]
 
     def read_compliance(self):
-        val = float(self.visa.query("VOLT?").strip("\n").strip("\r"))
-        time.sleep(self.wait)
-        return val
+        if "compliance" not in self.registry:
+            self.registry["compliance"] = float(self.visa.query("VOLT?").strip("\n").strip("\r"))
+            time.sleep(self.wait)
+        return self.registry["compliance"]
 
     def read_model(self):
         val = self.visa.query("*IDN?").rstrip()
@@ -101,13 +122,21 @@ class srcs580:
     def reset_factory_default(self):
         self.visa.write("*RST")
         time.sleep(self.wait)
+        self.registry = {}
+
+    def resync(self):
+        # discard the registry and read the settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return self.get_settings()
 
     def operation(self, input_state, output_state):
         self.set_input_state(input_state)
         self.set_output_state(output_state)
 
     def set_current(self, val):
-        self.visa.write(f"CURR {val}")
+        if self.registry.get("current") != val:
+            self.visa.write(f"CURR {val}")
+            self.registry["current"] = val
 
     def configure(self, gain=10e-3, response="fast", shield="return", isolation="float", input_state="off", output_state="off", compliance=50):
         self.reset_factory_default()
@@ -129,7 +158,7 @@ class srcs580:
                 time.sleep(delay)
 
     def get_settings(self):
-        return {"unit": self.read_model(),
+        return {"unit": self.model,
                 "gain": self.read_gain(),
                 "response": self.read_response(),
                 "shield": self.read_shield(),
@@ -2,6 +2,7 @@ import numpy as np
 import time
 import struct
 from collections import defaultdict
+from instrument import QueuedSession
 
 class dc205():
 
@@ -27,33 +28,43 @@ class dc205():
     def __init__(self, visa, wait=0.01, reset=True):
         # create an empty local registry and populate the registry with the current instrumentation settings
         # when adding/removing parameters, amend "get_settings" method
-        self.visa = visa
+        self.visa = QueuedSession(visa)
         self.wait = wait
+        self.registry = {}  # Last written / read settings. Readers are served from here and redundant writes are skipped
         self.model = self.read_model()
         self.visa.read_termination = "\r\n"
 
+        # With reset=False the unit is attached as it is: the settings are read back once into the registry
         if reset is True:
-            self.visa.write("*rst")
+            self.reset_unit()
+        else:
+            self.resync()
 
     '''----- Set functions -----'''
 
     def set_range(self, sense_range):
         # sense range is int and can be 1, 10, or 100
-        status = self.read_output_status()
-        if status == "on":
+        if self.registry.get("range") == sense_range:
+            return
+        if self.read_output_status() == "on":
             print("Cannot change range while output is on")
-        if self.read_output_status() == "off":
+        else:
             self.visa.write("rnge {}".format(self.scpi_w["range"][sense_range]))
             time.sleep(self.wait)
+            self.registry["range"] = sense_range
 
     def set_isolation(self, isolation):
         # isolation can be "ground" or "float"
-        self.visa.write("isol {}".format(isolation))
-        time.sleep(self.wait)
+        if self.registry.get("isolation") != isolation:
+            self.visa.write("isol {}".format(isolation))
+            time.sleep(self.wait)
+            self.registry["isolation"] = isolation
 
     def set_sensing(self, sensing="local"):
-        self.visa.write("sens {}".format(self.scpi_w["sensing"][sensing]))
-        time.sleep(self.wait)
+        if self.registry.get("sensing") != sensing:
+            self.visa.write("sens {}".format(self.scpi_w["sensing"][sensing]))
+            time.sleep(self.wait)
+            self.registry["sensing"] = sensing
 
     def set_output_status(self, status):
         # status can be either "on" or "off"
@@ -67,38 +78,55 @@ class dc205():
         # to RANG RANGE100, then SOUT ON may only be sent while the safety
         # interlock is closed.
         # The SOUT command is equivalent to pressing the OUTPUT [On/Off] button
-        self.visa.write("sout {}".format(self.scpi_w["output"][status]))
+        if self.registry.get("output") != status:
+            self.visa.write("sout {}".format(self.scpi_w["output"][status]))
+            self.registry["output"] = status
 
     def set_output_level(self, level):
-        self.visa.write("volt {:0.6f}".format(level))
-        time.sleep(self.wait)
+        if self.registry.get("level") != level:
+            self.visa.write("volt {:0.6f}".format(level))
+            time.sleep(self.wait)
+            self.registry["level"] = level
 
     def set_token(self, token="off"):
-        self.visa.write("tokn {}".format(self.scpi_w["token"][token]))
-        time.sleep(self.wait)
+        if self.registry.get("token") != token:
+            self.visa.write("tokn {}".format(self.scpi_w["token"][token]))
+            time.sleep(self.wait)
+            self.registry["token"] = token
 
     def set_srq_enable_register(self, val):
         # val is the sum of the decimal representation of each active bit
-        self.visa.write("*sre {}".format(val))
-        time.sleep(self.wait)
+        if self.registry.get("sre") != int(val):
+            self.visa.write("*sre {}".format(val))
+            time.sleep(self.wait)
+            self.registry["sre"] = int(val)
 
     '''----- Read functions -----'''
 
     def read_range(self):
-        val = self.scpi_r["range"][self.visa.query("rnge?").lower()]
-        time.sleep(self.wait)
-        return val
+        if "range" not in self.registry:
+            self.registry["range"] = self.scpi_r["range"][self.visa.query("rnge?").lower()]
+            time.sleep(self.wait)
+        return self.registry["range"]
 
     def read_isolation(self):
         # isolation can be "ground" or "float"
-        val = self.scpi_r["isolation"][self.visa.query("isol?")]
-        time.sleep(self.wait)
-        return val
+        if "isolation" not in self.registry:
+            self.registry["isolation"] = self.scpi_r["isolation"][self.visa.query("isol?")]
+            time.sleep(self.wait)
+        return self.registry["isolation"]
 
     def read_output_status(self):
-        val = self.scpi_r["output"][self.visa.query("sout?")]
-        time.sleep(self.wait)
-        return val
+        if "output" not in self.registry:
+            self.registry["output"] = self.scpi_r["output"][self.visa.query("sout?")]
+            time.sleep(self.wait)
+        return self.registry["output"]
+
+    def read_output_level(self):
+        if "level" not in self.registry:
+            self.registry["level"] = float(self.visa.query("volt?"))
+            time.sleep(self.wait)
+        return self.registry["level"]
 
     def read_model(self):
         val = self.visa.query("*idn?")
@@ -111,15 +139,22 @@ class dc205():
         return val
 
     def read_srq_enable_register(self):
-        val = self.visa.query("*sre?")
-        time.sleep(self.wait)
-        return val
+        if "sre" not in self.registry:
+            self.registry["sre"] = int(self.visa.query("*sre?"))
+            time.sleep(self.wait)
+        return self.registry["sre"]
+
+    def resync(self):
+        # discard the registry and read the settings back from the unit, e.g. after changes from the front panel
+        self.registry = {}
+        return self.get_settings()
 
     ''' ----- Operation functions ----- '''
 
     def reset_unit(self):
         self.visa.write("*rst")
         time.sleep(self.wait)
+        self.registry = {}
 
     def clear_all_event_status_registers(self):
         self.visa.write("*cls")
@@ -128,31 +163,8 @@ class dc205():
     def sweep_bias(self, start, stop, n_step=100, rate=10e-6):
         # run through all the output voltage values
         if start != stop:
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-<<<<<<< HEAD
-            if (abs((stop - start) / nstep) + 1) / rate > self.wait:
-                delay = (abs((stop - start) / nstep) + 1) / rate
-            else:
-                delay = self.wait
-            for v in np.linspace(start, stop, nstep):
-=======
-            actual_wait = np.max([self.wait, abs(stop - start) / n_step / rate])
-            for v in np.linspace(start, stop, n_step, endpoint=True):
->>>>>>> parent of 3fda7e2 (major)
-=======
-            actual_wait = np.max([self.wait, abs(stop - start) / n_step / rate])
-            for v in np.linspace(start, stop, n_step, endpoint=True):
->>>>>>> parent of 3fda7e2 (major)
-=======
-            actual_wait = np.max([self.wait, abs(stop - start) / n_step / rate])
-            for v in np.linspace(start, stop, n_step, endpoint=True):
->>>>>>> parent of 3fda7e2 (major)
-=======
             actual_wait = np.max([self.wait, abs(stop - start) / n_step / rate])
             for v in np.linspace(start, stop, n_step, endpoint=True):
->>>>>>> parent of 3fda7e2 (major)
                 self.set_output_level(v)
                 # wait "time" seconds before increasing the voltage level
                 time.sleep(actual_wait)
@@ -171,7 +183,9 @@ class dc205():
         self.set_output_status("on")
 
     def get_settings(self):
-        return {"unit": self.read_model(),
+        return {"unit": self.model,
                 "sense range": self.read_range(),
                 "isolation": self.read_isolation(),
+                "output": self.read_output_status(),
+                "output level": self.read_output_level(),
                 }
@@ -0,0 +1,180 @@
+import numpy as np
+import time
+import completion
+from instrument import QueuedSession
+
+
+class tds2002():
+
+    def __init__(self, visa, wait=0.01, reset=True):
+        # With reset=False the unit is attached as it is (e.g. after an autoset from the front panel)
+        self.visa = QueuedSession(visa)
+        self.wait = wait
+        # Last written settings, by command header. Setters skip redundant writes
+        self.registry = {}
+        self.preambles = {}  # waveform preamble of each channel, read once per acquisition settings (see "read_preamble")
+        self.model = self.read_model()
+        if reset is True:
+            self.reset()
+        # responses without headers, curves as 2-byte signed big endian integers
+        self.visa.write("header off")
+        time.sleep(self.wait)
+        self.set_encoding("ribinary", 2)
+
+    '''----- Set functions -----'''
+
+    def write_setting(self, header, value):
+        # write "header value" unless the value is already in the registry. Any change of the acquisition settings
+        # discards the preambles
+        if self.registry.get(header) != value:
+            self.visa.write("{} {}".format(header, value))
+            time.sleep(self.wait)
+            self.registry[header] = value
+            self.preambles = {}
+
+    def set_encoding(self, encoding="ribinary", width=2):
+        # curve encoding: ascii, ribinary (signed integers, MSB first) or rpbinary (positive integers). Width is 1 or 2
+        # bytes per point: the 8 bits of the digitizer are in the most significant byte
+        self.write_setting("data:encdg", encoding)
+        self.write_setting("data:width", width)
+
+    def set_record(self, start=1, stop=2500):
+        # first and last point (1 to 2500) of the transferred curves
+        self.write_setting("data:start", start)
+        self.write_setting("data:stop", stop)
+
+    def set_channel(self, channel, scale=1, coupling="dc", bandwidth="off", invert="off", position=0):
+        # vertical settings of channel 1 or 2: scale (in V/div), coupling (ac, dc or gnd), 20 MHz bandwidth limit,
+        # inversion and position (in div)
+        self.write_setting("ch{}:bandwidth".format(channel), bandwidth)
+        self.write_setting("ch{}:coupling".format(channel), coupling)
+        self.write_setting("ch{}:invert".format(channel), invert)
+        self.write_setting("ch{}:position".format(channel), position)
+        self.write_setting("ch{}:scale".format(channel), scale)
+
+    def set_timebase(self, sec_div=1e-3, position=0):
+        # horizontal scale (in s/div) and trigger position (in s)
+        self.write_setting("horizontal:main:secdiv", sec_div)
+        self.write_setting("horizontal:main:position", position)
+
+    def set_trigger(self, source="ch1", level=0, slope="rise", coupling="dc", mode="normal"):
+        # edge trigger. Mode normal acquires on triggers only, auto also acquires without trigger
+        self.write_setting("trigger:main:type", "edge")
+        self.write_setting("trigger:main:edge:source", source)
+        self.write_setting("trigger:main:edge:coupling", coupling)
+        self.write_setting("trigger:main:edge:slope", slope)
+        self.write_setting("trigger:main:mode", mode)
+        self.write_setting("trigger:main:level", level)
+
+    def set_acquisition(self, mode="sample", averages=16):
+        # acquisition mode: sample, peakdetect or average (of 4, 16, 64 or 128 waveforms, in the oscilloscope)
+        self.write_setting("acquire:mode", mode)
+        if mode == "average":
+            self.write_setting("acquire:numavg", averages)
+
+    '''----- Read functions -----'''
+
+    def read_model(self):
+        val = self.visa.query("*idn?").strip("\n")
+        time.sleep(self.wait)
+        return val
+
+    def read_preamble(self, channel):
+        # return the waveform preamble of channel 1 or 2 (number of points and scaling of the curve), in one query.
+        # Preambles are kept until a setting is changed through the driver
+        if channel not in self.preambles:
+            val = self.visa.query("data:source ch{};:wfmpre?".format(channel)).strip("\n").split(";")
+            time.sleep(self.wait)
+            # BYT_Nr;BIT_Nr;ENCdg;BN_Fmt;BYT_Or;NR_Pt;WFID;PT_FMT;XINcr;PT_Off;XZEro;XUNit;YMUlt;YZEro;YOFf;YUNit
+            self.preambles[channel] = {"points": int(val[5]),
+                                       "x increment": float(val[8]),
+                                       "point offset": float(val[9]),
+                                       "x zero": float(val[10]),
+                                       "y multiplier": float(val[12]),
+                                       "y zero": float(val[13]),
+                                       "y offset": float(val[14])}
+        return self.preambles[channel]
+
+    def read_curve(self, channel):
+        # return the raw curve (digitizer levels) of channel 1 or 2, in one binary transfer
+        if self.registry.get("data:encdg") == "ascii":
+            return np.array(self.visa.query_ascii_values("data:source ch{};:curve?".format(channel)))
+        datatype = {1: "b", 2: "h"}[self.registry.get("data:width", 1)]
+        if self.registry.get("data:encdg") == "rpbinary":
+            datatype = datatype.upper()
+        return self.visa.query_binary_values("data:source ch{};:curve?".format(channel), datatype=datatype,
+                                             is_big_endian=True, container=np.array)
+
+    def scale_curve(self, channel, curve):
+        # convert a raw curve of channel 1 or 2 to volts
+        preamble = self.read_preamble(channel)
+        return (curve - preamble["y offset"]) * preamble["y multiplier"] + preamble["y zero"]
+
+    def read_time(self, channel=1):
+        # return the time axis (in s, 0 at the trigger) of the curves of channel 1 or 2
+        preamble = self.read_preamble(channel)
+        points = np.arange(self.registry.get("data:start", 1) - 1, self.registry.get("data:start", 1) - 1 + preamble["points"])
+        return preamble["x zero"] + preamble["x increment"] * (points - preamble["point offset"])
+
+    def read_waveform(self, channel):
+        # return the time axis (in s) and the curve (in V) of channel 1 or 2
+        return self.read_time(channel), self.scale_curve(channel, self.read_curve(channel))
+
+    def read_waveforms(self, channels=(1, 2)):
+        # return the time axis (in s) and the curves (in V) of 'channels', as a (channels, points) array
+        return self.read_time(channels[0]), np.array([self.scale_curve(x, self.read_curve(x)) for x in channels])
+
+    '''----- Operation functions -----'''
+
+    def reset(self):
+        # restore factory defaults and forget the registry
+        self.visa.write("*rst")
+        time.sleep(self.wait)
+        self.registry = {}
+        self.preambles = {}
+
+    def autoset(self):
+        # let the unit choose the vertical, horizontal and trigger settings. The registry is discarded
+        self.visa.write("autoset execute")
+        completion.wait_for_opc(self.visa)
+        self.registry = {key: val for key, val in self.registry.items() if key.startswith("data:")}
+        self.preambles = {}
+
+    def run(self):
+        # acquire continuously
+        self.write_setting("acquire:stopafter", "runstop")
+        self.visa.write("acquire:state run")
+        time.sleep(self.wait)
+
+    def stop(self):
+        self.visa.write("acquire:state stop")
+        time.sleep(self.wait)
+
+    def acquire_single(self, timeout=None):
+        # acquire a single sequence (one trigger, or the averages in average mode) and wait until it is done. Raise
+        # TimeoutError after 'timeout' (in s)
+        self.write_setting("acquire:stopafter", "sequence")
+        self.visa.write("acquire:state run")
+        completion.wait_for_opc(self.visa, timeout)
+
+    def acquire_average(self, n, channels=(1, 2), timeout=None):
+        # acquire 'n' single sequences and average the curves of 'channels' on the host. Unlike the average mode of the
+        # oscilloscope, any number of triggers can be averaged and the spread is returned. Return the time axis (in s),
+        # the mean and the standard deviation of the curves (in V) as (channels, points) arrays
+        total = None
+        for idx in range(n):
+            self.acquire_single(timeout)
+            curves = np.array([self.read_curve(x) for x in channels], dtype=np.float64)
+            if total is None:
+                total = np.zeros_like(curves)
+                squares = np.zeros_like(curves)
+            total += curves
+            squares += curves ** 2
+        mean = total / n
+        std = np.sqrt(np.maximum(squares / n - mean ** 2, 0))
+        multiplier = np.array([[self.read_preamble(x)["y multiplier"]] for x in channels])
+        return self.read_time(channels[0]), np.array([self.scale_curve(x, m) for x, m in zip(channels, mean)]), std * np.abs(multiplier)
+
+    def get_settings(self):
+        return {"osc unit": self.model,
+                "settings": dict(self.registry)}
@@ -0,0 +1,104 @@
+import threading
+import time
+import numpy as np
+from ring_buffer import RingBuffer
+
+
+class TemperatureLogger:
+    """ Log the temperatures of a controller on a background thread into a preallocated, timestamped ring buffer, e.g.
+
+        logger = TemperatureLogger(lambda: tc.read_temperature("all"), 4)       # Lakeshore 336: KRDG? 0, 4 sensors
+        logger = TemperatureLogger(lambda: tc.read_temperatures("ab"), 2)       # Mercury ITC: sensors a and b
+
+    Each row of the buffer is (timestamp, temperature 1, temperature 2, ...), the timestamp (in s since the epoch) being
+    the midpoint of the read. The measurement loop takes a snapshot whenever it needs one and never waits for the
+    controller. Commands sent to the same controller from another thread (e.g. a new setpoint) must hold 'lock'. Failed
+    reads are counted in 'errors' and the last one is kept in 'error' (see also 'health'). """
+
+    def __init__(
+            self,
+            reader,
+            n_sensors: int,
+            interval: float = 1.0,
+            buffer_size: int = 2 ** 16,
+            lock: threading.Lock = None
+    ):
+        self.reader = reader  # [callable] returns the temperatures of all the logged sensors (in K), in one transaction if possible
+        self.n_sensors = n_sensors  # [int] number of temperatures returned by the reader
+        self.interval = interval  # [float] logging period (in s)
+        self.buffer = RingBuffer(buffer_size, 1 + n_sensors, np.float64)
+        self.lock = lock if lock is not None else threading.Lock()  # serializes the access to the controller
+        self.thread = None
+        self.stopping = threading.Event()
+        self.error = None  # [Exception] last error raised by the reader, if any. Logging goes on after an error
+        self.errors = 0  # [int] number of failed reads
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self):
+        """ Start logging, discarding the rows of a previous run. """
+        if self.thread is not None:
+            return
+        self.buffer.clear()
+        self.error = None
+        self.errors = 0
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self.log, daemon=True)
+        self.thread.start()
+
+    def log(self):
+        """ Body of the logging thread: read on a fixed schedule (monotonic clock), skipping the periods missed if a read
+        takes longer than 'interval'. """
+        deadline = time.monotonic()
+        try:
+            while True:
+                try:
+                    with self.lock:
+                        t_start = time.time()
+                        temperatures = self.reader()
+                        t_stop = time.time()
+                    self.buffer.put(np.concatenate(([(t_start + t_stop) / 2], np.ravel(temperatures))))
+                except Exception as error:
+                    # any failure of the reader (bus error, timeout, short or malformed reply...) is recorded and the
+                    # logging goes on, so the thread never dies silently
+                    self.error = error
+                    self.errors += 1
+                deadline += self.interval
+                now = time.monotonic()
+                if deadline < now:
+                    deadline += np.ceil((now - deadline) / self.interval) * self.interval
+                if self.stopping.wait(max(0.0, deadline - time.monotonic())):
+                    break
+        finally:
+            self.buffer.close()
+
+    def stop(self):
+        """ Stop logging and wait for the thread to end. The rows logged can still be read. """
+        self.stopping.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def health(self):
+        """ Return (running, number of failed reads, last error), e.g. to check in the measurement loop that the logger
+        still records. """
+        return self.thread is not None and self.thread.is_alive(), self.errors, self.error
+
+    def latest(self):
+        """ Return the last row (timestamp, temperature 1, ...), or None if nothing was logged yet. """
+        rows = self.buffer.peek(1)
+        return tuple(rows[0].tolist()) if len(rows) else None
+
+    def snapshot(self, n=None, since=None):
+        """ Return a copy of the n most recent rows (all the rows if n is None) as (timestamps, temperatures), with
+        temperatures of shape (rows, n_sensors). If 'since' (in s since the epoch) is given, only the rows logged from
+        then on are returned. """
+        rows = self.buffer.peek(n)
+        if since is not None:
+            rows = rows[rows[:, 0] >= since]
+        return rows[:, 0], rows[:, 1:]
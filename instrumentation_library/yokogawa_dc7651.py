@@ -1,6 +1,7 @@
 import time
 import numpy as np
 from collections import defaultdict
+from instrument import QueuedSession
 
 
 class dc7651():
@@ -38,7 +39,9 @@ class dc7651():
                 scpi_r[key][subval] = subkey
 
     def __init__(self, visa, wait=0.01):
-        self.visa = visa
+        self.visa = QueuedSession(visa)
+        self.wait = wait
+        self.registry = {}  # Last written settings: redundant writes are skipped
         self.reset_unit()
         # self.model =
 
@@ -46,34 +49,48 @@ class dc7651():
 
     def set_function(self, function):
         # function can be either "i" or "v"
-        self.visa.write("F{}".format(self.scpi_w["function"][function]))
-        time.sleep(self.wait)
+        if self.registry.get("function") != function:
+            self.visa.write("F{}".format(self.scpi_w["function"][function]))
+            time.sleep(self.wait)
+            self.registry["function"] = function
 
     def set_range(self, function, source_range):
-        self.visa.write("R{}".format(self.scpi_w["range"][function][source_range]))
-        time.sleep(self.wait)
+        if self.registry.get("range") != (function, source_range):
+            self.visa.write("R{}".format(self.scpi_w["range"][function][source_range]))
+            time.sleep(self.wait)
+            self.registry["range"] = (function, source_range)
 
     def set_output_level(self, level):
-        self.visa.write("S{}".format(level))
-        time.sleep(self.wait)
+        if self.registry.get("level") != level:
+            self.visa.write("S{}".format(level))
+            time.sleep(self.wait)
+            self.registry["level"] = level
 
     def set_mode(self, mode):
-        self.visa.write("M{}".format(mode))
-        time.sleep(self.wait)
+        if self.registry.get("mode") != mode:
+            self.visa.write("M{}".format(self.scpi_w["mode"][mode]))
+            time.sleep(self.wait)
+            self.registry["mode"] = mode
 
     def set_voltage_compliance(self, level):
         # value in Volts
-        self.visa.write("LV{}".format(level))
-        time.sleep(self.wait)
+        if self.registry.get("voltage compliance") != level:
+            self.visa.write("LV{}".format(level))
+            time.sleep(self.wait)
+            self.registry["voltage compliance"] = level
 
     def set_current_compliance(self, level):
         # value in mA
-        self.visa.write("LA{}".format(level))
-        time.sleep(self.wait)
+        if self.registry.get("current compliance") != level:
+            self.visa.write("LA{}".format(level))
+            time.sleep(self.wait)
+            self.registry["current compliance"] = level
 
     def set_polarity(self, polarity):
-        self.visa.write("SG{}".format(polarity))
-        time.sleep(self.wait)
+        if self.registry.get("polarity") != polarity:
+            self.visa.write("SG{}".format(self.scpi_w["polarity"][polarity]))
+            time.sleep(self.wait)
+            self.registry["polarity"] = polarity
 
     ''' ----- Read functions ----- '''
 
@@ -96,11 +113,12 @@ class dc7651():
 
     def reset_unit(self):
         self.visa.write("RC")
+        self.registry = {}
 
     def configure(self, function="v", source_range=10e-3, voltage_compliance=1, current_compliance=1, polarity="+", mode="single"):
         # DC source configuration
-        self.set_function(self.scpi_w["function"][function])
-        self.set_range(self.scpi_w["range"][source_range])
+        self.set_function(function)
+        self.set_range(function, source_range)
         self.set_voltage_compliance(voltage_compliance)
         self.set_current_compliance(current_compliance)
         self.set_polarity(polarity)
@@ -122,7 +140,7 @@ class dc7651():
         for level in np.linspace(start, stop, n_step, endpoint=True):
             self.set_output_level(level)
             self.send_trigger()
-            if self.wait() < abs(start - stop) / n_step / rate:
+            if self.wait < abs(start - stop) / n_step / rate:
                 # wait an additional time to make the total time wait corresponding to the chosen wait
                 time.sleep(abs(start - stop) / n_step / rate - self.wait)
             else:
@@ -7,6 +7,7 @@ import os
 from datetime import datetime
 import matplotlib.gridspec as gs
 import matplotlib.colors
+from tektronix_tds2002 import tds2002
 
 # I/V amplifier
 iv_gain = 1e5 #
@@ -15,6 +16,7 @@ iv_gain = 1e5 #
 sec_div = 1e-6 # 500e-9
 ch1_volt_div = 1   # 100 mV/div
 ch2_volt_div = 2  # 100 mV/div
+n_average = 16  # number of triggers averaged on the host
 
 # wave generator
 frequency = 1  # Hz
@@ -33,8 +35,8 @@ rm = visa.ResourceManager()
 print(rm.list_resources())
 
 wfg = rm.open_resource('GPIB1::10::INSTR')
-osc = rm.open_resource('GPIB1::1::INSTR')
-osc.timeout = None
+osc = tds2002(visa=rm.open_resource('GPIB1::1::INSTR'), reset=False)
+osc.visa.timeout = None
 
 # Get all the points from oscilloscope
 Datastart = 1
@@ -47,98 +49,21 @@ wfg.write(":OUTP1 ON")
 wfg.write("*WAI")
 time.sleep(3)
 
-timeaxis = np.linspace(start=Datastart,stop=Datastop,num=Datastop,endpoint=True)
-
-#osc.write("*RST")
-osc.write("AUTOSet")
-
-osc.write("TRIGger:MAIn:EDGE:SOUrce CH1") # trigger on ch1
-osc.write("TRIGger:MAIn:EDGE:COUPling DC")
-osc.write("TRIGger:MAIn:EDGE:SLOpe RISE")  # rise or fall
-osc.write("TRIGger:MAIn:MODe AUTO") # NORMal or AUTO
-osc.write("TRIGger:MAIn:TYPe EDGE")
-osc.write("TRIGger:MAIn:LEVel {}".format(trigger_level))  # trigger to 50% of max min
-
-osc.write("CH1:BANdwidth OFF")     # OFF 60 MHz, ON 20 MHz
-osc.write("CH1:COUPling DC")
-osc.write("CH1:INVert OFF")
-osc.write("CH1:POSition 0")
-osc.write("CH1:SCAle {}".format(ch1_volt_div))
-#osc.write("CH1:PRObe 1")            # attenuation factor$
-#osc.write("CH1:VOLts 1")  # gain
-
-osc.write("CH2:BANdwidth OFF")     # OFF 60 MHz, ON 20 MHz
-osc.write("CH2:COUPling DC")
-osc.write("CH2:INVert OFF")
-osc.write("CH2:POSition 0")
-osc.write("CH2:SCAle {}".format(ch2_volt_div))
-#osc.write("CH2:PRObe 1")            # attenuation factor$
-#osc.write("CH2:VOLts 1")  # gain
-
-osc.write("HORizontal:MAIn:SECdiv {}".format(sec_div))
-osc.write("HORizontal:MAIn:POSition 0")
-
-osc.write("*WAI")
-
-osc.write("ACQuire:MODE SAMPLE")
-
-#osc.write("ACQuire:MODE Average")
-#osc.write("ACQuire:NUMAVg 64")   # 4 16 64 128
-#osc.write("ACQuire:STOPAfter SEQuence")
-
-#osc.write("DATa:WIDth 2")
-osc.write("DATa:START {}".format(Datastart))
-osc.write("DATa:STOP {}".format(Datastop))
-
-osc.write("*WAI")
-
-# osc.write("MEASUrement:MEAS1:SOUrce CH1")
-# osc.write("MEASUrement:MEAS2:SOUrce CH2")
-# osc.write("MEASUrement:MEAS1:TYPe RISe")
-# osc.write("MEASUrement:MEAS2:TYPe RISe")
-
-print(osc.query("*OPC?"))
-
-while int(osc.query("*OPC?")) == 0:
-    print(osc.query("*OPC?"))
-
-osc.write("DATa:SOUrce CH1")
-channel1_yrescale = float(osc.query("WFMPre:YMUl?"))
-channel1_yoff = float(osc.query("WFMPre:YOFf?"))
-channel1_yzero = float(osc.query("WFMPre:YZEro?"))
-channel1_xrescale = float(osc.query("WFMPre?").split(";")[8])
-channel1_xzero = float(osc.query("WFMPre:CH1:XZEro?"))
-channel1_xincr = float(osc.query("WFMPre:CH1:XINcr?"))
-channel1_xptoff = float(osc.query("WFMPre:CH1:PT_Off?"))
-channel1_data = osc.query("curve?")
-channel1_data = channel1_data.split(",")
-channel1_data = [float(x) for x in channel1_data]
-channel1_data = np.array(channel1_data)
-
-osc.write("DATa:SOUrce CH2")
-channel2_yrescale = float(osc.query("WFMPre:YMUl?"))
-channel2_yoff = float(osc.query("WFMPre:YOFf?"))
-channel2_yzero = float(osc.query("WFMPre:YZEro?"))
-channel2_xrescale = float(osc.query("WFMPre?").split(";")[8])
-channel2_xzero = float(osc.query("WFMPre:CH2:XZEro?"))
-channel2_xincr = float(osc.query("WFMPre:CH2:XINcr?"))
-channel2_xptoff = float(osc.query("WFMPre:CH2:PT_Off?"))
-# channel2_xrescale = float(osc.query("WFMPre:CH1:XMUlt?"))
-channel2_data = osc.query("curve?")
-channel2_data = channel2_data.split(",")
-channel2_data = [float(x) for x in channel2_data]
-channel2_data = np.array(channel2_data)
-
-channel1_data = channel1_data * channel1_yrescale
-#channel1_data = (channel1_data - channel1_yoff) * channel1_yrescale + channel1_yzero
-channel2_data = channel2_data * channel2_yrescale
-#channel1_data = (channel1_data - channel1_yoff) * channel1_yrescale + channel1_yzero
-
-#channel1_time = channel1_xrescale * timeaxis
-channel1_time = channel1_xincr * (timeaxis - channel1_xptoff) + channel1_xzero
-#channel2_time = channel2_xrescale * timeaxis
-channel2_time = channel2_xincr * (timeaxis - channel2_xptoff) + channel2_xzero
-#
+osc.autoset()
+
+osc.set_trigger(source="ch1", level=trigger_level, slope="rise", coupling="dc", mode="normal")  # trigger on ch1 rising edges only
+osc.set_channel(1, scale=ch1_volt_div, coupling="dc", bandwidth="off", invert="off", position=0)  # bandwidth OFF 60 MHz, ON 20 MHz
+osc.set_channel(2, scale=ch2_volt_div, coupling="dc", bandwidth="off", invert="off", position=0)
+osc.set_timebase(sec_div=sec_div, position=0)
+osc.set_acquisition("sample")
+osc.set_record(Datastart, Datastop)
+
+# acquire n_average triggers and average them on the host (binary transfer of both channels per trigger)
+channel_time, channel_data, channel_std = osc.acquire_average(n_average, channels=(1, 2))
+channel1_time = channel2_time = channel_time
+channel1_data, channel2_data = channel_data
+channel1_std, channel2_std = channel_std
+
 # channel1_risetime = float(osc.query("MEASUrement:MEAS1:VALue?"))
 # channel2_risetime = float(osc.query("MEASUrement:MEAS2:VALue?"))
 # print("Rise time ch1: {}".format(channel1_risetime))
@@ -153,8 +78,9 @@ with open(filename + str(".bin"), "wb") as file:
     pickle.dump({"chip": chip_id,
                  "device": device_id,
                  "datetime": now,
-                 "data": {"ch1_time": channel1_time, "ch2_time": channel2_time, "ch1_data": channel1_data, "ch2_data": channel2_data},
-                 "settings": ""}, file)
+                 "data": {"ch1_time": channel1_time, "ch2_time": channel2_time, "ch1_data": channel1_data, "ch2_data": channel2_data,
+                          "ch1_std": channel1_std, "ch2_std": channel2_std, "n_average": n_average},
+                 "settings": osc.get_settings()}, file)
 
 
 fig = plt.figure(figsize=[12.8, 9.6], dpi=100, facecolor=None, edgecolor=None, linewidth=0.0, frameon=None, subplotpars=None, tight_layout=None, constrained_layout=None)